@@ -0,0 +1,55 @@
+"""Benchmark streaming exports: rows per second and peak memory per format.
+
+Feeds synthetic post documents through the same chunked encoders used by
+GET /api/export/{collection} from an async generator standing in for a Motor
+cursor, discarding the output. Peak RSS should stay flat as the row count
+grows. Run from the backend directory:
+
+    python -m benchmarks.bench_export [rows] [format ...]
+"""
+import asyncio
+import resource
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from exports import ENCODERS, iter_chunks
+from server import POST_EXPORT_COLUMNS
+
+
+async def fake_cursor(n: int):
+    now = datetime.now(timezone.utc)
+    for i in range(n):
+        created = (now - timedelta(seconds=i)).isoformat()
+        yield {
+            "id": f"post-{i}", "admin_username": "admin", "product_id": f"product-{i % 5000}",
+            "product_asin": f"B{i % 5000:09d}", "product_title": f"Product {i % 5000} with a longer title",
+            "product_image": f"https://m.media-amazon.com/images/I/{i:08d}.jpg", "media_url": None,
+            "caption": "Check this out! " * 8, "hashtags": "#amazonfinds #deals #musthave",
+            "platform": "instagram" if i % 2 else "facebook", "status": "posted",
+            "platform_post_id": str(10 ** 14 + i), "short_code": f"{i:x}", "error_message": None,
+            "scheduled_at": created, "posted_at": created, "created_at": created,
+            "link_clicks": i % 17, "insights_clicks": i % 13, "insights_impressions": i % 1000,
+        }
+
+
+async def run(fmt: str, n: int):
+    started = time.perf_counter()
+    total_bytes = 0
+    async for data in ENCODERS[fmt](iter_chunks(fake_cursor(n)), POST_EXPORT_COLUMNS):
+        total_bytes += len(data)
+    elapsed = time.perf_counter() - started
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{fmt:<8} {n:,} rows in {elapsed:.2f} s: {n / elapsed:,.0f} rows/s, "
+          f"{total_bytes / 2 ** 20:,.1f} MiB out, peak RSS {peak_mb:,.0f} MiB")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    formats = sys.argv[2:] or list(ENCODERS)
+    for fmt in formats:
+        asyncio.run(run(fmt, n))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Benchmark bytes and CPU per 1,000 posts for the /api/posts response path.
+
+Compares the default path (ISO strings parsed to datetimes, then FastAPI's
+jsonable_encoder and JSONResponse) with the FAST_JSON path (orjson straight
+from the Mongo documents), each with all fields and with a dashboard-style
+``fields=`` projection, and reports raw and gzipped sizes. Run from the
+backend directory:
+
+    python -m benchmarks.bench_list_encoding [posts] [rounds]
+"""
+import gzip
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+DASHBOARD_FIELDS = ["product_title", "platform", "status", "created_at", "posted_at"]
+CAPTION_WORDS = "great deal amazing quality best seller limited offer shop now free shipping top rated".split()
+
+
+def make_posts(n: int):
+    now = datetime.now(timezone.utc)
+    posts = []
+    for i in range(n):
+        created = now - timedelta(minutes=i * 7)
+        caption = " ".join(random.choices(CAPTION_WORDS, k=60))
+        posts.append({
+            "id": str(uuid.uuid4()),
+            "admin_username": "admin",
+            "product_id": str(uuid.uuid4()),
+            "product_asin": f"B{i:09d}",
+            "product_title": f"Product {i} " + " ".join(random.choices(CAPTION_WORDS, k=8)),
+            "product_image": f"https://m.media-amazon.com/images/I/{i:08d}.jpg",
+            "media_url": f"https://example.com/api/media/{uuid.uuid4().hex}.jpg",
+            "caption": caption,
+            "hashtags": "#amazonfinds #deals #musthave #shopping #bestseller",
+            "platform": random.choice(["instagram", "facebook"]),
+            "status": "posted",
+            "platform_post_id": str(random.randrange(10 ** 15)),
+            "short_code": f"{i:06x}",
+            "error_message": None,
+            "scheduled_at": created.isoformat(),
+            "posted_at": created.isoformat(),
+            "created_at": created.isoformat(),
+        })
+    return posts
+
+
+def default_path(posts):
+    # What get_posts does without FAST_JSON
+    converted = []
+    for post in posts:
+        post = dict(post)
+        for key in ("scheduled_at", "posted_at", "created_at"):
+            if isinstance(post.get(key), str):
+                post[key] = datetime.fromisoformat(post[key])
+        converted.append(post)
+    return JSONResponse(jsonable_encoder(converted)).body
+
+
+def fast_path(posts):
+    return ORJSONResponse(posts).body
+
+
+def project(posts, fields):
+    keep = ["id"] + fields
+    return [{key: post[key] for key in keep if key in post} for post in posts]
+
+
+def measure(label: str, encode, posts, rounds: int):
+    started = time.process_time()
+    for _ in range(rounds):
+        body = encode(posts)
+    cpu_ms = (time.process_time() - started) / rounds * 1000
+    compressed = len(gzip.compress(body, compresslevel=9))
+    scale = 1000 / len(posts)
+    print(f"{label:<28} {cpu_ms * scale:8.2f} ms CPU  {len(body) * scale / 1024:8.1f} KiB  "
+          f"{compressed * scale / 1024:7.1f} KiB gzip   (per 1,000 posts)")
+
+
+def main():
+    n_posts = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    posts = make_posts(n_posts)
+    projected = project(posts, DASHBOARD_FIELDS)
+
+    measure("default, all fields", default_path, posts, rounds)
+    measure("default, fields=", default_path, projected, rounds)
+    measure("FAST_JSON, all fields", fast_path, posts, rounds)
+    measure("FAST_JSON, fields=", fast_path, projected, rounds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Benchmark per-item cost of building and storing Product models at 10k items.
+
+Compares, in microseconds per item:
+
+* upstream results: one ``Product(...)`` per RapidAPI item versus
+  ``validate_products`` (dict rows, ids and timestamps filled per batch, one
+  ``TypeAdapter`` call);
+* documents read back from Mongo: ``Product(**doc)`` after parsing the
+  timestamp, ``model_construct`` and one adapter call over the list;
+* writing: ``model_dump()`` plus a hand-converted timestamp per item versus
+  ``product_documents``.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_models [items] [rounds]
+"""
+import os
+import random
+import sys
+import time
+from datetime import datetime, timezone
+
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'bench')
+
+from server import (  # noqa: E402
+    PRODUCT_LIST_ADAPTER, Product, parse_price, product_documents, rapidapi_product_row, validate_products
+)
+
+WORDS = "wireless headphones kitchen knife water bottle yoga mat gaming mouse desk lamp charger".split()
+
+
+def make_items(n: int):
+    rng = random.Random(3)
+    return [
+        {
+            "asin": f"B{i:09d}",
+            "title": " ".join(rng.sample(WORDS, 5)),
+            "description": "A great product " * 4,
+            "price": {"raw": f"${rng.uniform(5, 300):.2f}"},
+            "image": f"https://m.media-amazon.com/images/I/{i:08d}.jpg",
+            "url": f"https://www.amazon.com/dp/B{i:09d}",
+            "rating": round(rng.uniform(2.5, 5.0), 1),
+            "reviews_count": rng.randrange(10000),
+            "category": "Electronics",
+        }
+        for i in range(n)
+    ]
+
+
+def per_item(items):
+    # What fetch_amazon_products did before batch validation
+    products = []
+    for item in items:
+        price = item.get('price', {}).get('raw', '')
+        products.append(Product(
+            asin=item.get('asin', ''),
+            title=item.get('title', ''),
+            description=item.get('description', ''),
+            price=price,
+            price_value=parse_price(price),
+            image_url=item.get('image', ''),
+            product_url=item.get('url', ''),
+            rating=item.get('rating', 0),
+            reviews_count=item.get('reviews_count', 0),
+            category=item.get('category', '')
+        ))
+    return products
+
+
+def batch(items):
+    return validate_products([rapidapi_product_row(item) for item in items])
+
+
+def validated_read(docs):
+    products = []
+    for doc in docs:
+        doc = dict(doc)
+        doc['fetched_at'] = datetime.fromisoformat(doc['fetched_at'])
+        products.append(Product(**doc))
+    return products
+
+
+def constructed_read(docs):
+    products = []
+    for doc in docs:
+        doc = dict(doc)
+        doc['fetched_at'] = datetime.fromisoformat(doc['fetched_at'])
+        products.append(Product.model_construct(**doc))
+    return products
+
+
+def adapter_read(docs):
+    return PRODUCT_LIST_ADAPTER.validate_python(docs)
+
+
+def manual_dump(products):
+    docs = []
+    for product in products:
+        doc = product.model_dump()
+        doc['fetched_at'] = doc['fetched_at'].isoformat()
+        docs.append(doc)
+    return docs
+
+
+def measure(label: str, fn, data, rounds: int) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        started = time.perf_counter()
+        fn(data)
+        best = min(best, time.perf_counter() - started)
+    micros = best / len(data) * 1e6
+    print(f"{label:<42} {micros:7.2f} us/item")
+    return micros
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    items = make_items(n)
+    products = batch(items)
+    for product in products:
+        product.fetched_at = datetime.now(timezone.utc)
+    docs = manual_dump(products)
+
+    print(f"{n:,} items, best of {rounds}")
+    before = measure("upstream: Product() per item", per_item, items, rounds)
+    after = measure("upstream: validate_products", batch, items, rounds)
+    print(f"{'speedup':<42} {before / after:7.2f}x")
+    before = measure("read back: Product(**doc)", validated_read, docs, rounds)
+    measure("read back: model_construct", constructed_read, docs, rounds)
+    after = measure("read back: one TypeAdapter call", adapter_read, docs, rounds)
+    print(f"{'speedup':<42} {before / after:7.2f}x")
+    before = measure("write: model_dump + isoformat", manual_dump, products, rounds)
+    after = measure("write: product_documents", product_documents, products, rounds)
+    print(f"{'speedup':<42} {before / after:7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Benchmark the short-link redirect route in-process on a single worker.
+
+Requests are driven straight through the ASGI app (middleware, routing and
+response), so the number is the server's own cost per redirect without
+socket or client overhead. Run from the backend directory:
+
+    MONGO_URL=mongodb://localhost:27017 DB_NAME=bench python -m benchmarks.bench_redirects [requests] [links]
+"""
+import asyncio
+import random
+import sys
+import time
+
+import server
+from redirects import CODE_OFFSET, encode_base62
+
+
+async def call(app, path: str) -> int:
+    """Issue one GET through the ASGI app and return the response status"""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": b"", "root_path": "", "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 0), "server": ("bench", 80),
+    }
+    status = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    await app(scope, receive, send)
+    return status[0]
+
+
+async def run(n_requests: int, n_links: int, concurrency: int = 50):
+    codes = [encode_base62(CODE_OFFSET + i) for i in range(n_links)]
+    for i, code in enumerate(codes):
+        server.short_links.add(code, f"https://www.amazon.com/dp/B{i:09d}?tag=bench-20", f"post-{i}")
+    queue = iter(random.choice(codes) for _ in range(n_requests))
+
+    async def worker():
+        for code in queue:
+            assert await call(server.app, f"/api/r/{code}") == 302
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    print(f"{n_requests:,} redirects over {n_links:,} links in {elapsed:.2f} s: "
+          f"{n_requests / elapsed:,.0f} req/s, {server.short_links.pending_clicks:,} clicks buffered")
+
+
+def main():
+    n_requests = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    n_links = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    asyncio.run(run(n_requests, n_links))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Benchmark the product search index on a synthetic catalog.
+
+Builds a ProductSearchIndex over N products (default one million) and times
+a mix of keyword, filter-only and combined queries, reporting the build time
+and per-query p50/p99 latency of the index lookup. Run from the backend
+directory:
+
+    python -m benchmarks.bench_search [products] [repeats]
+"""
+import random
+import sys
+import time
+
+import numpy as np
+
+from search import ProductSearchIndex
+
+WORDS = ("wireless bluetooth headphones noise cancelling kitchen knife stainless steel water bottle "
+         "insulated yoga mat gaming mouse keyboard mechanical led desk lamp phone charger fast "
+         "portable speaker waterproof camera tripod backpack laptop stand coffee grinder electric "
+         "toothbrush massage gun fitness tracker smart watch running shoes cotton sheets queen").split()
+CATEGORIES = ["Electronics", "Home & Kitchen", "Sports", "Toys", "Beauty", "Books", "Office", "Garden"]
+
+QUERIES = [
+    {"q": "wireless headphones"},
+    {"q": "stainless steel water bottle", "max_price": 30},
+    {"q": "gaming", "category": "Electronics", "min_rating": 4.0, "sort": "price"},
+    {"category": "Home & Kitchen", "min_price": 20, "max_price": 60},
+    {"min_rating": 4.5, "sort": "rating"},
+    {},
+    {"q": "portable speaker", "offset": 200},
+]
+
+
+def build(n: int) -> ProductSearchIndex:
+    rng = random.Random(7)
+    index = ProductSearchIndex()
+    docs = (
+        {
+            "asin": f"B{i:09d}",
+            "title": " ".join(rng.sample(WORDS, 6)),
+            "category": CATEGORIES[i % len(CATEGORIES)],
+            "price_value": round(rng.uniform(5, 300), 2),
+            "rating": round(rng.uniform(2.5, 5.0), 1),
+            "fetched_at": 1.7e9 + i,
+        }
+        for i in range(n)
+    )
+    index.add_documents(docs)
+    return index
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    start = time.perf_counter()
+    index = build(n)
+    print(f"indexed {n:,} products in {time.perf_counter() - start:.1f} s")
+
+    for query in QUERIES:
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            total, page = index.search(**query, limit=20)
+            timings.append((time.perf_counter() - start) * 1000)
+        print(f"{str(query):<75} {total:>9,} hits  p50 {np.percentile(timings, 50):6.2f} ms  "
+              f"p99 {np.percentile(timings, 99):6.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Benchmark product selection from stored documents to the selected ASINs.
+
+Times the full path ``select_products`` takes: building the catalog arrays
+from ``db.products`` documents (as ``load_catalog`` receives them from the
+cursor) on a cache miss, then scoring and top-k. A cache hit skips the build,
+which is the steady state between product writes.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_selection [n_products] [k]
+"""
+import asyncio
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from selection import CatalogCache, SelectionWeights, select_top_k
+
+
+def synthetic_documents(n: int, n_categories: int = 40, seed: int = 0) -> list:
+    """Projected product documents shaped like the stored ones"""
+    rng = np.random.default_rng(seed)
+    now = datetime.now(timezone.utc).timestamp()
+    price = rng.lognormal(mean=3.3, sigma=1.0, size=n)
+    has_value = rng.random(n) < 0.8
+    has_price = rng.random(n) >= 0.05
+    rating = rng.uniform(1, 5, size=n)
+    reviews = (rng.pareto(1.5, size=n) * 100).astype(int)
+    fetched_at = now - rng.uniform(0, 90 * 86400, size=n)
+    category = rng.integers(0, n_categories, size=n)
+    docs = []
+    for i in range(n):
+        doc = {
+            "asin": f"B{i:09d}",
+            "rating": round(float(rating[i]), 1),
+            "reviews_count": int(reviews[i]),
+            "category": f"category-{category[i]}",
+            "fetched_at": datetime.fromtimestamp(fetched_at[i], timezone.utc).isoformat(),
+        }
+        if has_price[i]:
+            doc["price"] = f"${price[i]:,.2f}"
+            if has_value[i]:
+                doc["price_value"] = round(float(price[i]), 2)
+        docs.append(doc)
+    return docs
+
+
+class _Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def batch_size(self, size):
+        return self
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self.docs:
+            yield doc
+
+
+class _Collection:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query, projection):
+        return _Cursor(self.docs)
+
+
+class _Database:
+    def __init__(self, docs):
+        self.products = _Collection(docs)
+
+
+def timed(runs: int, fn):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times), sorted(times)[len(times) // 2]
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    k = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    db = _Database(synthetic_documents(n))
+    weights = SelectionWeights()
+    cache = CatalogCache(ttl=3600)
+    version = [0]
+
+    def select(bump: bool):
+        if bump:
+            version[0] += 1
+        catalog = asyncio.run(cache.get(db, version[0], {"media_error": None}))
+        return select_top_k(catalog, k, weights)
+
+    select(True)  # warm up
+    cold = timed(3, lambda: select(True))
+    warm = timed(5, lambda: select(False))
+    for label, (best, median) in (("cache miss", cold), ("cache hit", warm)):
+        print(f"select n={n:,} k={k} ({label}): best {best * 1000:.1f} ms, median {median * 1000:.1f} ms")
+    if warm[1] >= 1.0:
+        print("FAIL: selection exceeded the 1 s budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Measure cold-start cost: import time and time to first served request.
+
+Prints the slowest modules from ``python -X importtime -c "import server"``,
+the wall time of importing the app, and the time from spawning uvicorn (with
+``STARTUP_MODE=lazy``) until ``GET /api/`` first answers, compared against
+TTFR_TARGET_SECONDS. Run from the backend directory:
+
+    MONGO_URL=mongodb://localhost:27017 DB_NAME=bench python -m benchmarks.bench_startup [top]
+"""
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+# Time-to-first-request target for a lazy start on a warm disk cache
+TTFR_TARGET_SECONDS = 1.5
+
+
+def import_profile(top: int):
+    """Return the total import time and the `top` slowest modules by cumulative time"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import server"],
+        capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = [part.strip() for part in line[len("import time:"):].split("|")]
+        rows.append((int(cumulative), module))
+    total = next(us for us, module in rows if module.strip() == "server")
+    return total, sorted(rows, reverse=True)[:top]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_to_first_request(timeout: float = 30.0) -> float:
+    port = free_port()
+    env = {**os.environ, "STARTUP_MODE": "lazy"}
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with status {process.returncode}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError(f"Server did not answer within {timeout:g}s")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    top = int(sys.argv[1]) if len(sys.argv) > 1 else 15
+    total, slowest = import_profile(top)
+    print(f"import server: {total / 1000:.0f} ms (cumulative, -X importtime)")
+    for cumulative, module in slowest:
+        print(f"  {cumulative / 1000:8.1f} ms  {module.strip()}")
+
+    ttfr = time_to_first_request()
+    verdict = "OK" if ttfr <= TTFR_TARGET_SECONDS else "OVER TARGET"
+    print(f"time to first request (lazy): {ttfr:.2f} s, target {TTFR_TARGET_SECONDS:g} s [{verdict}]")
+
+
+if __name__ == "__main__":
+    main()
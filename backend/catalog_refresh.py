@@ -0,0 +1,286 @@
+"""Staleness-prioritized incremental refresh of the product catalog.
+
+Every known ASIN gets a due time: its ``fetched_at`` plus a refresh
+interval that shrinks with importance (``REFRESH_BASE_HOURS`` divided by
+``1 + posted boost + click boost * log1p(link clicks)`` over the last
+``IMPORTANCE_WINDOW_DAYS`` of posts, never below ``REFRESH_MIN_HOURS``).
+Due times do not change as the clock moves, so a heap ordered by due time
+always yields the stalest-relative-to-importance ASINs first.
+
+Each tick pops due ASINs for at most ``budget`` upstream requests of
+``batch_size`` ASINs each, looks them up and writes back only the upstream
+fields, so RapidAPI usage per hour is capped by budget times ticks per hour
+however large the catalog grows. ASINs the lookup does not return are retried
+after a quarter of their interval. A lookup that fails outright (bad key,
+quota, rate limit) ends the tick: the ASINs go back in the queue as they were
+and the following ticks are skipped for ``REFRESH_BACKOFF_SECONDS``, doubling
+on each consecutive failure up to ``REFRESH_MAX_BACKOFF_SECONDS``. The queue
+is warmed from ``db.products`` and kept current by the posting job and bulk
+imports.
+"""
+import heapq
+import logging
+import math
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+REFRESH_BASE_HOURS = float(os.environ.get('REFRESH_BASE_HOURS', 72))
+REFRESH_MIN_HOURS = float(os.environ.get('REFRESH_MIN_HOURS', 6))
+POSTED_BOOST = 2.0
+CLICK_BOOST = 0.5
+IMPORTANCE_WINDOW_DAYS = 30
+RETRY_FRACTION = 0.25
+REFRESH_BACKOFF_SECONDS = float(os.environ.get('REFRESH_BACKOFF_SECONDS', 900))
+REFRESH_MAX_BACKOFF_SECONDS = float(os.environ.get('REFRESH_MAX_BACKOFF_SECONDS', 6 * 3600))
+# Fields a lookup may overwrite; ids, affiliate URLs and media stay as they are
+UPSTREAM_FIELDS = ("title", "description", "price", "price_value", "image_url", "rating",
+                   "reviews_count", "category", "fetched_at")
+
+
+def _epoch(value) -> Optional[float]:
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    return None
+
+
+class RefreshQueue:
+    """Heap of (due time, ASIN) with lazy deletion"""
+
+    def __init__(self, base_hours: float = REFRESH_BASE_HOURS, min_hours: float = REFRESH_MIN_HOURS):
+        self.base = base_hours * 3600
+        self.minimum = min_hours * 3600
+        self._lock = threading.Lock()
+        self._fetched: Dict[str, float] = {}
+        self._importance: Dict[str, float] = {}
+        self._due: Dict[str, float] = {}
+        self._heap: List[Tuple[float, str]] = []
+
+    def __len__(self) -> int:
+        return len(self._fetched)
+
+    def interval(self, asin: str) -> float:
+        return max(self.base / self._importance.get(asin, 1.0), self.minimum)
+
+    def _schedule(self, asin: str, due: float):
+        self._due[asin] = due
+        heapq.heappush(self._heap, (due, asin))
+
+    def touch(self, asin: str, fetched_at, now: Optional[float] = None):
+        """Record a fetch of asin and schedule its next refresh"""
+        fetched = _epoch(fetched_at)
+        if fetched is None:
+            fetched = now or time.time()
+        with self._lock:
+            self._fetched[asin] = fetched
+            self._schedule(asin, fetched + self.interval(asin))
+            self._compact()
+
+    def touch_many(self, docs: Iterable[Dict]):
+        now = time.time()
+        with self._lock:
+            for doc in docs:
+                asin = doc.get('asin')
+                if not asin:
+                    continue
+                fetched = _epoch(doc.get('fetched_at'))
+                self._fetched[asin] = now if fetched is None else fetched
+                self._schedule(asin, self._fetched[asin] + self.interval(asin))
+            self._compact()
+
+    def retry_later(self, asins: Iterable[str], now: Optional[float] = None):
+        """Requeue ASINs a lookup did not return, without marking them fresh"""
+        now = now or time.time()
+        with self._lock:
+            for asin in asins:
+                if asin in self._fetched:
+                    self._schedule(asin, now + self.interval(asin) * RETRY_FRACTION)
+
+    def requeue(self, asins: Iterable[str]):
+        """Put back ASINs that were taken but never looked up, at their usual due time"""
+        with self._lock:
+            for asin in asins:
+                if asin in self._fetched:
+                    self._schedule(asin, self._fetched[asin] + self.interval(asin))
+
+    def set_importance(self, scores: Dict[str, float]):
+        """Replace importance multipliers (>= 1) and reschedule the ASINs whose score changed"""
+        with self._lock:
+            changed = {asin for asin in set(self._importance) | set(scores)
+                       if self._importance.get(asin, 1.0) != scores.get(asin, 1.0)}
+            self._importance = {asin: score for asin, score in scores.items() if score != 1.0}
+            for asin in changed:
+                # In-flight ASINs are rescheduled when their lookup finishes
+                if asin in self._due and asin in self._fetched:
+                    self._schedule(asin, self._fetched[asin] + self.interval(asin))
+            self._compact()
+
+    def remove(self, asins: Iterable[str]):
+        with self._lock:
+            for asin in asins:
+                self._fetched.pop(asin, None)
+                self._importance.pop(asin, None)
+                self._due.pop(asin, None)
+
+    def pop_due(self, limit: int, now: Optional[float] = None) -> List[str]:
+        """Take up to limit ASINs that are due, most overdue first"""
+        now = now or time.time()
+        taken = []
+        with self._lock:
+            while self._heap and len(taken) < limit:
+                due, asin = self._heap[0]
+                if self._due.get(asin) != due:
+                    heapq.heappop(self._heap)
+                    continue
+                if due > now:
+                    break
+                heapq.heappop(self._heap)
+                del self._due[asin]
+                taken.append(asin)
+        return taken
+
+    def _compact(self):
+        # Superseded heap entries pile up as ASINs are rescheduled
+        if len(self._heap) > 2 * len(self._due) + 1024:
+            self._heap = [(due, asin) for asin, due in self._due.items()]
+            heapq.heapify(self._heap)
+
+    def stats(self, now: Optional[float] = None) -> Dict:
+        now = now or time.time()
+        with self._lock:
+            fetched = np.fromiter(self._fetched.values(), dtype=np.float64, count=len(self._fetched))
+            due = np.fromiter(self._due.values(), dtype=np.float64, count=len(self._due))
+            boosted = len(self._importance)
+        ages = (now - fetched) / 3600
+        return {
+            "products": len(fetched),
+            "due": int((due <= now).sum()),
+            "boosted": boosted,
+            "age_hours": {
+                f"p{q}": round(float(np.percentile(ages, q)), 1) for q in (50, 90, 99)
+            } if len(ages) else {},
+        }
+
+
+class CatalogRefresher:
+    """Runs refresh ticks against a RefreshQueue within a fixed request budget"""
+
+    def __init__(self, queue: Optional[RefreshQueue] = None):
+        self.queue = queue if queue is not None else RefreshQueue()
+        self.last_tick: Optional[Dict] = None
+        self.failures = 0
+        self.backoff_until = 0.0
+
+    async def warm(self, db, batch_size: int = 10000) -> int:
+        cursor = db.products.find({}, {"_id": 0, "asin": 1, "fetched_at": 1}).batch_size(batch_size)
+        batch = []
+        async for doc in cursor:
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                self.queue.touch_many(batch)
+                batch = []
+        self.queue.touch_many(batch)
+        await self.update_importance(db)
+        return len(self.queue)
+
+    async def update_importance(self, db) -> int:
+        """Boost ASINs posted or clicked within the importance window"""
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=IMPORTANCE_WINDOW_DAYS)).isoformat()
+        scores = {}
+        async for row in db.posts.aggregate([
+            {"$match": {"created_at": {"$gte": cutoff}, "product_asin": {"$ne": None}}},
+            {"$group": {"_id": "$product_asin", "clicks": {"$sum": {"$ifNull": ["$link_clicks", 0]}}}},
+        ]):
+            scores[row['_id']] = 1.0 + POSTED_BOOST + CLICK_BOOST * math.log1p(row['clicks'])
+        self.queue.set_importance(scores)
+        return len(scores)
+
+    async def tick(self, db, lookup: Callable[[List[str]], Awaitable[List]], budget: int,
+                   batch_size: int = 10, on_refresh: Optional[Callable[[List[Dict]], None]] = None) -> Dict:
+        """Refresh the stalest due products with at most budget lookup calls"""
+        from pymongo import UpdateOne
+        if time.time() < self.backoff_until:
+            logging.info("Catalog refresh skipped: backing off after %s failed ticks", self.failures)
+            return self.last_tick
+        started = time.perf_counter()
+        await self.update_importance(db)
+        asins = self.queue.pop_due(budget * batch_size)
+        refreshed: List[Dict] = []
+        missing: List[str] = []
+        requests = 0
+        error = None
+        try:
+            for start in range(0, len(asins), batch_size):
+                batch = asins[start:start + batch_size]
+                requests += 1
+                try:
+                    products = await lookup(batch)
+                except Exception as e:
+                    # Key, quota or upstream trouble: later batches would fail the same way
+                    error = str(e)
+                    break
+                found = {product.asin: product for product in products}
+                missing.extend(asin for asin in batch if asin not in found)
+                refreshed.extend(
+                    {**product.model_dump(include=set(UPSTREAM_FIELDS)), "asin": product.asin}
+                    for product in found.values() if product.asin in batch
+                )
+        finally:
+            # Whatever was not looked up (failed lookup, cancellation) goes back unchanged
+            looked_up = {doc['asin'] for doc in refreshed} | set(missing)
+            self.queue.retry_later(missing)
+            self.queue.requeue(asin for asin in asins if asin not in looked_up)
+
+        if error is None:
+            self.failures = 0
+            self.backoff_until = 0.0
+        else:
+            self.failures += 1
+            backoff = min(REFRESH_BACKOFF_SECONDS * 2 ** (self.failures - 1), REFRESH_MAX_BACKOFF_SECONDS)
+            self.backoff_until = time.time() + backoff
+            logging.warning("Catalog refresh lookup failed, pausing refreshes for %.0fs: %s", backoff, error)
+
+        if refreshed:
+            operations = []
+            for doc in refreshed:
+                doc['fetched_at'] = doc['fetched_at'].isoformat()
+                fields = {key: value for key, value in doc.items() if key != "asin"}
+                # A new image invalidates the cached media; unset it first so the job revalidates
+                operations.append(UpdateOne(
+                    {"asin": doc['asin'], "image_url": {"$ne": doc.get('image_url')}},
+                    {"$unset": {"media_hash": "", "media_error": ""}}
+                ))
+                operations.append(UpdateOne({"asin": doc['asin']}, {"$set": fields}))
+            await db.products.bulk_write(operations, ordered=True)
+            self.queue.touch_many(refreshed)
+            if on_refresh:
+                on_refresh(refreshed)
+
+        self.last_tick = {
+            "ran_at": datetime.now(timezone.utc).isoformat(),
+            "requests": requests,
+            "budget": budget,
+            "refreshed": len(refreshed),
+            "missing": len(missing),
+            "error": error,
+            "backoff_until": (
+                datetime.fromtimestamp(self.backoff_until, timezone.utc).isoformat() if self.backoff_until else None
+            ),
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+        logging.info("Catalog refresh: %s products in %s requests (%s not returned)",
+                     len(refreshed), requests, len(missing))
+        return self.last_tick
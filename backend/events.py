@@ -0,0 +1,138 @@
+"""In-process fan-out of job events to server-sent event subscribers.
+
+Background jobs publish lifecycle and progress events from whatever thread
+and event loop they run on; ``EventBroadcaster`` serializes each event once
+and hands the encoded frame to every matching subscriber on the server's
+event loop. Each subscriber has a small bounded buffer: a client that stops
+reading loses its oldest frames (and is told how many) instead of holding
+memory or slowing the publisher, so an open dashboard costs one queue slot
+per event rather than a poll per interval.
+
+``EventSource`` cannot send an Authorization header, and a JWT in the query
+string would end up in access logs. Browsers therefore first exchange their
+JWT for a ``StreamTickets`` ticket: a random, single-use token valid for
+``STREAM_TICKET_TTL`` seconds that only opens the event stream. Tickets live
+in process memory, like the subscriptions they open.
+"""
+import asyncio
+import itertools
+import json
+import secrets
+import threading
+import time
+from typing import Any, Dict, Optional, Set, Tuple
+
+SUBSCRIBER_BUFFER = 256
+KEEPALIVE_INTERVAL = 15.0
+STREAM_TICKET_TTL = 30.0
+
+
+def encode_event(event_id: Optional[int], event: str, data: Dict[str, Any]) -> bytes:
+    payload = json.dumps(data, separators=(",", ":"), default=str)
+    id_line = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{id_line}event: {event}\ndata: {payload}\n\n".encode()
+
+
+class Subscription:
+    """One client's bounded queue of encoded frames"""
+
+    def __init__(self, tenant: Optional[str], buffer_size: int):
+        self.tenant = tenant
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+        self.dropped = 0
+
+    def offer(self, frame: bytes):
+        if self.queue.full():
+            # Slow client: drop the oldest frame rather than block the publisher
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(frame)
+
+    async def next_frame(self, timeout: float = KEEPALIVE_INTERVAL) -> bytes:
+        """Next frame to send; a comment keepalive if nothing arrives within timeout"""
+        try:
+            frame = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return b": keepalive\n\n"
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            return encode_event(None, "stream.lagged", {"dropped": dropped}) + frame
+        return frame
+
+
+class EventBroadcaster:
+    """Thread-safe publisher feeding per-client subscriptions on one event loop"""
+
+    def __init__(self, buffer_size: int = SUBSCRIBER_BUFFER):
+        self.buffer_size = buffer_size
+        self._subscribers: Set[Subscription] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        """Deliver to subscribers on loop (the server's event loop)"""
+        self._loop = loop
+
+    def subscribe(self, tenant: Optional[str] = None) -> Subscription:
+        subscription = Subscription(tenant, self.buffer_size)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscribers.discard(subscription)
+
+    def publish(self, event: str, data: Dict[str, Any], tenant: Optional[str] = None):
+        """Send an event to subscribers of tenant (or to everyone when tenant is None)"""
+        loop = self._loop
+        if loop is None or loop.is_closed() or not self._subscribers:
+            return
+        with self._lock:
+            event_id = next(self._ids)
+        frame = encode_event(event_id, event, data)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._deliver(frame, tenant)
+        else:
+            try:
+                loop.call_soon_threadsafe(self._deliver, frame, tenant)
+            except RuntimeError:
+                pass  # server loop closed during shutdown
+
+    def _deliver(self, frame: bytes, tenant: Optional[str]):
+        for subscription in list(self._subscribers):
+            if tenant is None or subscription.tenant == tenant:
+                subscription.offer(frame)
+
+
+class StreamTickets:
+    """Short-lived, single-use tickets that authenticate one event stream"""
+
+    def __init__(self, ttl: float = STREAM_TICKET_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._tickets: Dict[str, Tuple[str, float]] = {}   # ticket -> (username, expiry)
+
+    def issue(self, username: str) -> str:
+        ticket = secrets.token_urlsafe(24)
+        now = time.monotonic()
+        with self._lock:
+            # Unredeemed tickets are dropped as new ones are issued
+            for stale in [key for key, (_, expiry) in self._tickets.items() if expiry <= now]:
+                del self._tickets[stale]
+            self._tickets[ticket] = (username, now + self.ttl)
+        return ticket
+
+    def redeem(self, ticket: str) -> Optional[str]:
+        """Username the ticket was issued to, or None if it is unknown, used or expired"""
+        with self._lock:
+            entry = self._tickets.pop(ticket, None)
+        if entry is None or entry[1] <= time.monotonic():
+            return None
+        return entry[0]
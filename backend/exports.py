@@ -0,0 +1,172 @@
+"""Streaming CSV / NDJSON / Parquet exports straight from Mongo cursors.
+
+Documents are pulled from a Motor cursor in fixed-size chunks and each chunk
+is encoded and yielded before the next one is read, so memory stays bounded
+by the chunk size no matter how many rows are exported. Columns come from
+the pydantic models, which keeps every chunk (and every Parquet row group)
+on the same schema even when older documents lack newer fields.
+"""
+import csv
+import io
+import logging
+import time
+import typing
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+CHUNK_ROWS = 2000
+FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+# Column type names shared by the CSV, NDJSON and Parquet encoders
+_SCALAR_TYPES = {str: "string", int: "int64", float: "float64", bool: "bool", datetime: "string"}
+# Column kind -> pyarrow type factory (pyarrow spells bool "bool_")
+_ARROW_TYPES = {"string": "string", "int64": "int64", "float64": "float64", "bool": "bool_"}
+
+
+def columns_for(model, extra: Optional[Dict[str, str]] = None) -> List[Tuple[str, str]]:
+    """(name, type) columns for a pydantic model; non-scalar fields export as strings"""
+    columns = []
+    for name, field in model.model_fields.items():
+        annotation = field.annotation
+        args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        if typing.get_origin(annotation) is typing.Union and len(args) == 1:
+            annotation = args[0]
+        columns.append((name, _SCALAR_TYPES.get(annotation, "string")))
+    columns.extend((extra or {}).items())
+    return columns
+
+
+def _coerce(value: Any, kind: str) -> Any:
+    if value is None:
+        return None
+    if kind == "string":
+        if isinstance(value, datetime):
+            return value.isoformat()
+        return value if isinstance(value, str) else str(value)
+    try:
+        if kind == "int64":
+            return int(value)
+        if kind == "float64":
+            return float(value)
+        if kind == "bool":
+            return bool(value)
+    except (TypeError, ValueError):
+        return None
+    return value
+
+
+def _rows(docs: List[Dict], columns: List[Tuple[str, str]]) -> List[Dict]:
+    return [{name: _coerce(doc.get(name), kind) for name, kind in columns} for doc in docs]
+
+
+async def iter_chunks(cursor, chunk_rows: int = CHUNK_ROWS) -> AsyncIterator[List[Dict]]:
+    chunk = []
+    async for doc in cursor:
+        chunk.append(doc)
+        if len(chunk) >= chunk_rows:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+async def _encode_csv(chunks, columns) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in columns])
+    async for docs in chunks:
+        writer.writerows(
+            ["" if value is None else value for value in row.values()] for row in _rows(docs, columns)
+        )
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+async def _encode_ndjson(chunks, columns) -> AsyncIterator[bytes]:
+    import orjson
+    async for docs in chunks:
+        yield b"".join(orjson.dumps(row, option=orjson.OPT_APPEND_NEWLINE) for row in _rows(docs, columns))
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands back what was written since the last drain"""
+
+    def __init__(self):
+        super().__init__()
+        self._parts: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data, self._parts = b"".join(self._parts), []
+        return data
+
+
+async def _encode_parquet(chunks, columns) -> AsyncIterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schema = pa.schema([(name, getattr(pa, _ARROW_TYPES[kind])()) for name, kind in columns])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        async for docs in chunks:
+            # One row group per chunk
+            writer.write_table(pa.Table.from_pylist(_rows(docs, columns), schema=schema))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+ENCODERS = {"csv": _encode_csv, "ndjson": _encode_ndjson, "parquet": _encode_parquet}
+
+
+def date_range_filter(field: str, start: Optional[str], end: Optional[str]) -> Dict:
+    """Filter on an ISO date/datetime string field; end is inclusive of the whole day"""
+    bounds = {}
+    if start:
+        bounds["$gte"] = start
+    if end:
+        # "2025-01-31" must also match "2025-01-31T23:59:59+00:00"
+        bounds["$lte"] = end + "\uffff" if len(end) == 10 else end
+    return {field: bounds} if bounds else {}
+
+
+async def stream_export(cursor, fmt: str, columns: List[Tuple[str, str]], label: str,
+                        chunk_rows: int = CHUNK_ROWS) -> AsyncIterator[bytes]:
+    """Encode a cursor's documents as fmt, logging throughput when done"""
+    started = time.perf_counter()
+    rows = 0
+
+    async def counted():
+        nonlocal rows
+        async for chunk in iter_chunks(cursor, chunk_rows):
+            rows += len(chunk)
+            yield chunk
+
+    async for data in ENCODERS[fmt](counted(), columns):
+        yield data
+    elapsed = time.perf_counter() - started
+    logging.info(
+        "Exported %s %s rows as %s in %.1fs (%.0f rows/s)",
+        rows, label, fmt, elapsed, rows / elapsed if elapsed else 0
+    )
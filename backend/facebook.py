@@ -0,0 +1,136 @@
+"""Facebook Page publishing on top of the Graph API batch endpoint.
+
+The batch endpoint accepts up to 50 operations per HTTP request, so page
+posts and token/page lookups for a whole queue of posts (and the per-post
+insights reads in insights.py) are packed into a few round trips. Every
+operation's result is mapped back to the caller's key (the ``Post.id``) so
+each post record can be updated individually. When a batch request fails as
+a whole its operations are marked ``retry`` rather than failed, so the
+callers leave them queued for the next run, but only when the failure is
+transient (a transport error, a 5xx or a 429); a rejected request such as an
+invalid or expired token (other 4xx) fails them.
+"""
+import asyncio
+import json
+import logging
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+from urllib.parse import urlencode
+
+import httpx
+
+from transport import http_client
+
+GRAPH_API_URL = "https://graph.facebook.com/v18.0"
+
+MAX_BATCH_SIZE = 50
+BATCH_CONCURRENCY = 4
+
+
+def is_transient(status_code: Optional[int]) -> bool:
+    """Whether a failed request is worth retrying (None: no response at all)"""
+    return status_code is None or status_code == 429 or status_code >= 500
+
+
+def _parse_entry(entry: Optional[Dict]) -> Dict[str, Any]:
+    """Turn one batch response entry into {"code", "body", "error", "retry"}"""
+    if entry is None:
+        # Graph API returns null for operations that did not complete in time; they may
+        # still have been applied, so they are not retried
+        return {"code": None, "body": None, "error": "Batch operation timed out", "retry": False}
+    code = entry.get('code')
+    try:
+        body = json.loads(entry.get('body') or 'null')
+    except ValueError:
+        body = entry.get('body')
+    error = None
+    if code != 200:
+        if isinstance(body, dict) and isinstance(body.get('error'), dict):
+            error = body['error'].get('message') or json.dumps(body['error'])
+        else:
+            error = f"HTTP {code}"
+    return {"code": code, "body": body, "error": error, "retry": False}
+
+
+async def graph_batch(client: httpx.AsyncClient, access_token: str,
+                      operations: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Run operations through the batch endpoint, 50 per request; results are in order"""
+    chunks = [operations[i:i + MAX_BATCH_SIZE] for i in range(0, len(operations), MAX_BATCH_SIZE)]
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def run_chunk(chunk):
+        try:
+            async with semaphore:
+                response = await client.post(GRAPH_API_URL, data={
+                    "access_token": access_token,
+                    "batch": json.dumps(list(chunk)),
+                    "include_headers": "false"
+                })
+        except httpx.HTTPError as e:
+            response, error_text = None, f"Batch request failed: {e}"
+        else:
+            error_text = response.text
+        if response is None or response.status_code != 200:
+            # The whole request failed and no operation ran: retry later unless it was rejected
+            code = response.status_code if response is not None else None
+            error = {"code": code, "body": None, "error": error_text, "retry": is_transient(code)}
+            return [dict(error) for _ in chunk]
+        entries = response.json()
+        return [_parse_entry(entry) for entry in entries]
+
+    results: List[Dict[str, Any]] = []
+    for chunk_results in await asyncio.gather(*(run_chunk(chunk) for chunk in chunks)):
+        results.extend(chunk_results)
+    return results
+
+
+async def get_page_access_token(client: httpx.AsyncClient, access_token: str, page_id: str) -> str:
+    """Exchange a user token for the page token when possible, else return the token as-is"""
+    result = (await graph_batch(client, access_token, [
+        {"method": "GET", "relative_url": f"{page_id}?fields=id,name,access_token"}
+    ]))[0]
+    if result['error'] or not isinstance(result['body'], dict):
+        logging.warning("Facebook page lookup failed: %s", result['error'])
+        return access_token
+    return result['body'].get('access_token') or access_token
+
+
+async def publish_page_posts(access_token: str, page_id: str,
+                             items: Sequence[Tuple[Hashable, str, str]],
+                             client: Optional[httpx.AsyncClient] = None) -> Dict[Hashable, Dict]:
+    """Publish (key, image_url, caption) photo posts to a page.
+
+    Returns {key: {"success", "post_id", "error", "retry"}} for every item; "retry" marks
+    items that were not attempted because the request itself failed.
+    """
+    if not items:
+        return {}
+    own_client = client is None
+    if own_client:
+        client = http_client(timeout=60.0)
+    try:
+        page_token = await get_page_access_token(client, access_token, page_id)
+        operations = [
+            {
+                "method": "POST",
+                "relative_url": f"{page_id}/photos",
+                "body": urlencode({"url": image_url, "caption": caption})
+            }
+            for _, image_url, caption in items
+        ]
+        results = await graph_batch(client, page_token, operations)
+    except Exception as e:
+        logging.error("Facebook posting error: %s", e)
+        return {key: {"success": False, "error": str(e), "retry": True} for key, _, _ in items}
+    finally:
+        if own_client:
+            await client.aclose()
+
+    outcomes = {}
+    for (key, _, _), result in zip(items, results):
+        if result['error']:
+            outcomes[key] = {"success": False, "error": result['error'], "retry": result['retry']}
+        else:
+            body = result['body'] or {}
+            outcomes[key] = {"success": True, "post_id": body.get('post_id') or body.get('id')}
+    return outcomes
+
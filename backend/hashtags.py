@@ -0,0 +1,244 @@
+"""Keyword-indexed hashtag engine.
+
+Product titles and categories are tokenized into a keyword index that maps
+each token to weighted hashtags. The index is stored as CSR-style NumPy arrays
+so a whole batch of products is scored with a handful of array operations.
+New products update the token counts incrementally; the arrays are only
+re-materialized (not recomputed from products) the next time they are needed.
+"""
+import re
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+BASE_HASHTAGS = ["#AmazonFinds", "#BestDeals", "#Shopping", "#ProductReview",
+                 "#AffiliateMarketing", "#OnlineShopping", "#DailyDeals",
+                 "#BestSellers", "#TrendingNow", "#MustHave"]
+
+# Seed keywords -> hashtags. Also used to learn which title words belong to a category.
+KEYWORD_HASHTAGS: Dict[str, List[str]] = {
+    "electronics": ["#Electronics", "#TechDeals", "#Gadgets"],
+    "headphones": ["#Headphones", "#AudioGear"],
+    "earbuds": ["#Earbuds", "#AudioGear"],
+    "speaker": ["#Speakers", "#AudioGear"],
+    "laptop": ["#Laptop", "#TechDeals"],
+    "phone": ["#PhoneAccessories", "#TechDeals"],
+    "camera": ["#Camera", "#Photography"],
+    "kitchen": ["#KitchenGadgets", "#HomeCooking"],
+    "cookware": ["#Cookware", "#HomeCooking"],
+    "coffee": ["#CoffeeLover", "#KitchenGadgets"],
+    "home": ["#HomeDecor", "#HomeEssentials"],
+    "furniture": ["#Furniture", "#HomeDecor"],
+    "garden": ["#Gardening", "#OutdoorLiving"],
+    "beauty": ["#Beauty", "#SelfCare"],
+    "skincare": ["#Skincare", "#SelfCare"],
+    "makeup": ["#Makeup", "#Beauty"],
+    "fashion": ["#Fashion", "#OOTD"],
+    "clothing": ["#Fashion", "#StyleInspo"],
+    "shoes": ["#Sneakers", "#Fashion"],
+    "jewelry": ["#Jewelry", "#Accessories"],
+    "toys": ["#Toys", "#KidsFun"],
+    "baby": ["#BabyEssentials", "#MomLife"],
+    "sports": ["#Sports", "#ActiveLife"],
+    "fitness": ["#Fitness", "#HomeGym"],
+    "outdoors": ["#Outdoors", "#Adventure"],
+    "books": ["#BookLover", "#Bookstagram"],
+    "pet": ["#PetSupplies", "#PetLovers"],
+    "dog": ["#DogLovers", "#PetSupplies"],
+    "cat": ["#CatLovers", "#PetSupplies"],
+    "gaming": ["#Gaming", "#GamerLife"],
+    "games": ["#Gaming", "#GamerLife"],
+    "office": ["#OfficeSupplies", "#WorkFromHome"],
+    "tools": ["#Tools", "#DIY"],
+    "automotive": ["#CarAccessories", "#Automotive"],
+    "health": ["#Health", "#Wellness"],
+}
+
+STOPWORDS = frozenset("""
+a an and are as at be by for from in into is it its of on or the to with without
+new pack set count size inch inches black white plus pro max mini ultra one two
+your you our this that compatible premium upgraded version
+""".split())
+
+TOKEN_RE = re.compile(r"[a-z]{3,20}")
+
+KEYWORD_WEIGHT = 2.0
+DIRECT_WEIGHT = 1.0
+CATEGORY_TOKEN_WEIGHT = 1.5
+MIN_LEARNED_WEIGHT = 0.05   # drop weak token/category associations
+MAX_TAGS_PER_TOKEN = 8
+SCORE_CELLS = 1 << 22       # cap on the dense score matrix built per chunk
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into unique, lowercase keyword tokens, preserving order"""
+    if not text:
+        return []
+    return list(dict.fromkeys(t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS))
+
+
+class HashtagIndex:
+    """Incrementally maintained token -> hashtag weight index with batch scoring"""
+
+    def __init__(self, keyword_hashtags: Dict[str, List[str]] = KEYWORD_HASHTAGS,
+                 base_hashtags: Sequence[str] = BASE_HASHTAGS, max_tags: int = 10):
+        self.max_tags = max_tags
+        self.base_hashtags = list(base_hashtags)
+        self._lock = threading.Lock()
+        self._tags: List[str] = []
+        self._tag_ids: Dict[str, int] = {}
+        self._token_ids: Dict[str, int] = {}
+        self._seed: List[Dict[int, float]] = []      # token -> {tag: weight}, fixed
+        self._cooc: List[Dict[int, int]] = []        # token -> {tag: co-occurrence count}, learned
+        self._doc_freq: List[int] = []
+        self._seen: set = set()
+        self._dirty = True
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._cols = np.zeros(0, dtype=np.int32)
+        self._vals = np.zeros(0, dtype=np.float32)
+
+        for keyword, tags in keyword_hashtags.items():
+            token_id = self._token_id(keyword)
+            for tag in tags:
+                self._seed[token_id][self._tag_id(tag)] = KEYWORD_WEIGHT
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def _tag_id(self, tag: str) -> int:
+        tag_id = self._tag_ids.get(tag)
+        if tag_id is None:
+            tag_id = self._tag_ids[tag] = len(self._tags)
+            self._tags.append(tag)
+        return tag_id
+
+    def _token_id(self, token: str) -> int:
+        token_id = self._token_ids.get(token)
+        if token_id is None:
+            token_id = self._token_ids[token] = len(self._seed)
+            self._seed.append({})
+            self._cooc.append({})
+            self._doc_freq.append(0)
+        return token_id
+
+    def add_products(self, products: Iterable[Tuple[str, str, Optional[str]]]) -> int:
+        """Learn from (key, title, category) tuples; already-indexed keys are skipped"""
+        added = 0
+        with self._lock:
+            for key, title, category in products:
+                if not key or key in self._seen:
+                    continue
+                self._seen.add(key)
+                added += 1
+
+                category_tokens = tokenize(category or "")
+                tokens = list(dict.fromkeys(tokenize(title) + category_tokens))
+                token_ids = [self._token_id(token) for token in tokens]
+                for token_id, token in zip(token_ids, tokens):
+                    self._doc_freq[token_id] += 1
+                    if not self._seed[token_id]:
+                        self._seed[token_id][self._tag_id("#" + token.capitalize())] = DIRECT_WEIGHT
+                category_tags = {tag_id for token in category_tokens
+                                 for tag_id in self._seed[self._token_ids[token]]}
+                for token_id in token_ids:
+                    cooc = self._cooc[token_id]
+                    for tag_id in category_tags:
+                        cooc[tag_id] = cooc.get(tag_id, 0) + 1
+            if added:
+                self._dirty = True
+        return added
+
+    def _compile(self):
+        """Materialize the CSR arrays from the token tables (caller holds the lock)"""
+        indptr = np.zeros(len(self._seed) + 1, dtype=np.int64)
+        cols: List[int] = []
+        vals: List[float] = []
+        for token_id, seed in enumerate(self._seed):
+            weights = dict(seed)
+            doc_freq = self._doc_freq[token_id]
+            for tag_id, count in self._cooc[token_id].items():
+                weight = count / doc_freq
+                if weight >= MIN_LEARNED_WEIGHT:
+                    weights[tag_id] = weights.get(tag_id, 0.0) + weight
+            if len(weights) > MAX_TAGS_PER_TOKEN:
+                weights = dict(sorted(weights.items(), key=lambda kv: -kv[1])[:MAX_TAGS_PER_TOKEN])
+            cols.extend(weights.keys())
+            vals.extend(weights.values())
+            indptr[token_id + 1] = len(cols)
+        self._indptr = indptr
+        self._cols = np.asarray(cols, dtype=np.int32)
+        self._vals = np.asarray(vals, dtype=np.float32)
+        self._dirty = False
+
+    def tag_batch(self, items: Sequence[Tuple[str, Optional[str]]]) -> List[List[str]]:
+        """Return the top hashtags for each (title, category) pair"""
+        rows: List[int] = []
+        token_ids: List[int] = []
+        token_weights: List[float] = []
+        with self._lock:
+            if self._dirty:
+                self._compile()
+            indptr, cols, vals, tags = self._indptr, self._cols, self._vals, list(self._tags)
+            lookup = self._token_ids
+            for row, (title, category) in enumerate(items):
+                for token in tokenize(title):
+                    token_id = lookup.get(token)
+                    if token_id is not None:
+                        rows.append(row)
+                        token_ids.append(token_id)
+                        token_weights.append(1.0)
+                for token in tokenize(category or ""):
+                    token_id = lookup.get(token)
+                    if token_id is not None:
+                        rows.append(row)
+                        token_ids.append(token_id)
+                        token_weights.append(CATEGORY_TOKEN_WEIGHT)
+
+        ranked: List[List[int]] = [[] for _ in items]
+        if token_ids:
+            tok = np.asarray(token_ids, dtype=np.int64)
+            starts = indptr[tok]
+            counts = indptr[tok + 1] - starts
+            total = int(counts.sum())
+            if total:
+                # Gather every (row, tag, weight) edge reachable from the batch's tokens
+                offsets = np.repeat(starts - (np.cumsum(counts) - counts), counts)
+                edge = offsets + np.arange(total)
+                edge_rows = np.repeat(np.asarray(rows, dtype=np.int64), counts)
+                edge_tags = cols[edge]
+                edge_weights = vals[edge] * np.repeat(np.asarray(token_weights, dtype=np.float32), counts)
+
+                # Score rows in chunks of a dense (rows x tags) matrix of bounded size
+                n_tags = len(tags)
+                k = min(self.max_tags, n_tags)
+                chunk = max(1, SCORE_CELLS // n_tags)
+                bounds = np.searchsorted(edge_rows, np.arange(0, len(items) + chunk, chunk))
+                for first in range(0, len(items), chunk):
+                    lo, hi = bounds[first // chunk], bounds[first // chunk + 1]
+                    n_rows = min(chunk, len(items) - first)
+                    scores = np.bincount((edge_rows[lo:hi] - first) * n_tags + edge_tags[lo:hi],
+                                         weights=edge_weights[lo:hi],
+                                         minlength=n_rows * n_tags).reshape(n_rows, n_tags)
+                    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                    top_scores = np.take_along_axis(scores, top, axis=1)
+                    order = np.lexsort((top, -top_scores), axis=1)
+                    top = np.take_along_axis(top, order, axis=1)
+                    top_scores = np.take_along_axis(top_scores, order, axis=1)
+                    for offset, (row_tags, row_scores) in enumerate(zip(top.tolist(), top_scores.tolist())):
+                        ranked[first + offset] = [t for t, score in zip(row_tags, row_scores) if score > 0]
+
+        results = []
+        for tag_ids in ranked:
+            chosen = [tags[tag_id] for tag_id in tag_ids]
+            for tag in self.base_hashtags:
+                if len(chosen) >= self.max_tags:
+                    break
+                if tag not in chosen:
+                    chosen.append(tag)
+            results.append(chosen)
+        return results
+
+    def tag(self, title: str, category: Optional[str] = "") -> List[str]:
+        """Return the top hashtags for a single product"""
+        return self.tag_batch([(title, category)])[0]
@@ -0,0 +1,144 @@
+"""Incremental clicks/impressions ingestion for published posts.
+
+Each pass only looks at posts that are still inside their metrics window and
+whose per-post watermark (``insights_next_at``) has expired. Metrics are read
+with Graph API batch requests, the change since the last reading is folded
+into today's analytics document with a single ``$inc``, and the new
+cumulative values and watermarks are written back with one bulk write. The
+cost of a pass therefore follows the number of recent posts, not all history.
+"""
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+from pymongo import UpdateOne
+
+from facebook import get_page_access_token, graph_batch
+from transport import http_client
+
+METRICS_WINDOW_DAYS = 7
+REFRESH_INTERVAL = timedelta(hours=6)
+MAX_POSTS_PER_PASS = 2000
+
+# platform -> (insights metrics, metric counted as clicks, metric counted as impressions)
+PLATFORM_METRICS: Dict[str, Tuple[str, Optional[str], str]] = {
+    "instagram": ("impressions", None, "impressions"),
+    "facebook": ("post_impressions,post_clicks", "post_clicks", "post_impressions"),
+}
+
+
+def _metric_values(body) -> Dict[str, int]:
+    values = {}
+    for metric in (body or {}).get('data', []):
+        points = metric.get('values') or []
+        value = points[-1].get('value') if points else metric.get('total_value', {}).get('value')
+        if isinstance(value, (int, float)):
+            values[metric.get('name')] = int(value)
+    return values
+
+
+async def _fetch_metrics(client: httpx.AsyncClient, access_token: str, platform: str,
+                         posts: List[Dict]) -> List[Optional[Dict[str, int]]]:
+    metrics, clicks_metric, impressions_metric = PLATFORM_METRICS[platform]
+    results = await graph_batch(client, access_token, [
+        {"method": "GET", "relative_url": f"{post['platform_post_id']}/insights?metric={metrics}"}
+        for post in posts
+    ])
+    readings = []
+    for post, result in zip(posts, results):
+        if result['error']:
+            logging.warning("Insights for %s post %s failed: %s", platform, post['id'], result['error'])
+            readings.append(None)
+            continue
+        values = _metric_values(result['body'])
+        readings.append({
+            "clicks": values.get(clicks_metric, 0) if clicks_metric else 0,
+            "impressions": values.get(impressions_metric, 0),
+        })
+    return readings
+
+
+async def collect_insights(db, config_doc: Dict, analytics_defaults: Dict,
+                           now: Optional[datetime] = None, posts_filter: Optional[Dict] = None) -> Dict[str, int]:
+    """Run one ingestion pass; returns the clicks/impressions added and posts read.
+
+    ``posts_filter`` narrows the pass to the posts published with ``config_doc``'s tokens.
+    """
+    now = now or datetime.now(timezone.utc)
+    window_start = (now - timedelta(days=METRICS_WINDOW_DAYS)).isoformat()
+    tokens = {
+        "instagram": config_doc.get('instagram_access_token'),
+        "facebook": config_doc.get('facebook_access_token'),
+    }
+    platforms = [platform for platform, token in tokens.items() if token]
+    totals = {"clicks": 0, "impressions": 0, "posts": 0}
+    if not platforms:
+        return totals
+
+    posts = await db.posts.find(
+        {
+            **(posts_filter or {}),
+            "status": "posted",
+            "platform": {"$in": platforms},
+            "platform_post_id": {"$ne": None},
+            "posted_at": {"$gte": window_start},
+            "$or": [
+                {"insights_next_at": {"$exists": False}},
+                {"insights_next_at": {"$lte": now.isoformat()}},
+            ],
+        },
+        {"_id": 0, "id": 1, "platform": 1, "platform_post_id": 1, "insights_clicks": 1, "insights_impressions": 1},
+    ).limit(MAX_POSTS_PER_PASS).to_list(MAX_POSTS_PER_PASS)
+    if not posts:
+        return totals
+
+    next_at = (now + REFRESH_INTERVAL).isoformat()
+    updates = []
+    async with http_client(timeout=60.0) as client:
+        for platform in platforms:
+            platform_posts = [post for post in posts if post['platform'] == platform]
+            if not platform_posts:
+                continue
+            access_token = tokens[platform]
+            if platform == "facebook" and config_doc.get('facebook_page_id'):
+                access_token = await get_page_access_token(client, access_token, config_doc['facebook_page_id'])
+            readings = await _fetch_metrics(client, access_token, platform, platform_posts)
+
+            for post, reading in zip(platform_posts, readings):
+                fields = {"insights_next_at": next_at}
+                if reading is not None:
+                    # Counters are cumulative upstream; only the growth since the last pass is new
+                    totals["clicks"] += max(reading["clicks"] - post.get('insights_clicks', 0), 0)
+                    totals["impressions"] += max(reading["impressions"] - post.get('insights_impressions', 0), 0)
+                    totals["posts"] += 1
+                    fields.update({
+                        "insights_clicks": max(reading["clicks"], post.get('insights_clicks', 0)),
+                        "insights_impressions": max(reading["impressions"], post.get('insights_impressions', 0)),
+                        "insights_fetched_at": now.isoformat(),
+                    })
+                updates.append(UpdateOne({"id": post['id']}, {"$set": fields}))
+
+    if updates:
+        await db.posts.bulk_write(updates, ordered=False)
+
+    if totals["clicks"] or totals["impressions"]:
+        today = now.strftime("%Y-%m-%d")
+        defaults = {
+            k: v for k, v in analytics_defaults.items()
+            if k not in ("clicks", "impressions", "date", "admin_username")
+        }
+        await db.analytics.update_one(
+            {"date": today, "admin_username": config_doc.get('admin_username')},
+            {
+                "$inc": {"clicks": totals["clicks"], "impressions": totals["impressions"]},
+                "$setOnInsert": defaults,
+            },
+            upsert=True
+        )
+
+    logging.info(
+        "Insights pass read %s posts: +%s clicks, +%s impressions",
+        totals['posts'], totals['clicks'], totals['impressions']
+    )
+    return totals
@@ -0,0 +1,154 @@
+"""Pipelined Instagram publishing via the Graph API.
+
+Publishing an image takes a container-create call, a wait until Instagram has
+processed the container, and a ``media_publish`` call. ``publish_batch``
+creates every container in a batch concurrently, polls all pending containers
+with one multi-id request per round (backing off while nothing changes) and
+publishes each container as soon as it reports ``FINISHED``. A batch therefore
+takes roughly one container-processing time instead of N sequential posts.
+"""
+import asyncio
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import httpx
+
+from transport import http_client
+
+GRAPH_API_URL = "https://graph.facebook.com/v18.0"
+
+CREATE_CONCURRENCY = 10
+POLL_INTERVAL = 1.0
+MAX_POLL_INTERVAL = 8.0
+POLL_BACKOFF = 1.5
+PROCESSING_TIMEOUT = 300.0
+# Graph API limit on ids per multi-id lookup
+MAX_IDS_PER_LOOKUP = 50
+
+
+async def _create_container(client: httpx.AsyncClient, semaphore: asyncio.Semaphore,
+                            access_token: str, user_id: str, image_url: str, caption: str) -> Dict:
+    async with semaphore:
+        response = await client.post(f"{GRAPH_API_URL}/{user_id}/media", data={
+            "image_url": image_url,
+            "caption": caption,
+            "access_token": access_token
+        })
+    if response.status_code != 200:
+        return {"success": False, "error": response.text}
+    creation_id = response.json().get('id')
+    if not creation_id:
+        return {"success": False, "error": "Container response did not include an id"}
+    return {"creation_id": creation_id}
+
+
+async def _publish_container(client: httpx.AsyncClient, semaphore: asyncio.Semaphore,
+                             access_token: str, user_id: str, creation_id: str) -> Dict:
+    async with semaphore:
+        response = await client.post(f"{GRAPH_API_URL}/{user_id}/media_publish", data={
+            "creation_id": creation_id,
+            "access_token": access_token
+        })
+    if response.status_code == 200:
+        return {"success": True, "post_id": response.json().get('id')}
+    return {"success": False, "error": response.text}
+
+
+async def _container_statuses(client: httpx.AsyncClient, access_token: str,
+                              creation_ids: Sequence[str]) -> Dict[str, str]:
+    """Fetch status_code for many containers with multi-id lookups"""
+    statuses: Dict[str, str] = {}
+    for start in range(0, len(creation_ids), MAX_IDS_PER_LOOKUP):
+        chunk = creation_ids[start:start + MAX_IDS_PER_LOOKUP]
+        try:
+            response = await client.get(f"{GRAPH_API_URL}/", params={
+                "ids": ",".join(chunk),
+                "fields": "status_code",
+                "access_token": access_token
+            })
+            if response.status_code != 200:
+                logging.warning("Instagram status poll failed: HTTP %s", response.status_code)
+                continue
+            data = response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            # Transient: these containers are simply polled again next round
+            logging.warning("Instagram status poll failed: %s", e)
+            continue
+        for creation_id, container in data.items():
+            statuses[creation_id] = container.get('status_code', '')
+    return statuses
+
+
+async def publish_batch(access_token: str, user_id: str, items: Sequence[Tuple[str, str]],
+                        timeout: float = PROCESSING_TIMEOUT,
+                        poll_interval: float = POLL_INTERVAL,
+                        client: Optional[httpx.AsyncClient] = None) -> List[Dict]:
+    """Publish (image_url, caption) pairs; returns one result dict per item, in order"""
+    results: List[Optional[Dict]] = [None] * len(items)
+    if not items:
+        return []
+
+    own_client = client is None
+    if own_client:
+        client = http_client(timeout=30.0)
+    semaphore = asyncio.Semaphore(CREATE_CONCURRENCY)
+    publishing: Dict[asyncio.Task, int] = {}
+    try:
+        created = await asyncio.gather(*(
+            _create_container(client, semaphore, access_token, user_id, image_url, caption)
+            for image_url, caption in items
+        ), return_exceptions=True)
+
+        pending: Dict[str, int] = {}
+        for index, outcome in enumerate(created):
+            if isinstance(outcome, Exception):
+                results[index] = {"success": False, "error": str(outcome)}
+            elif "creation_id" in outcome:
+                pending[outcome["creation_id"]] = index
+            else:
+                results[index] = outcome
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        interval = poll_interval
+        while pending and loop.time() < deadline:
+            await asyncio.sleep(interval)
+            statuses = await _container_statuses(client, access_token, list(pending))
+            progressed = False
+            for creation_id, status_code in statuses.items():
+                if creation_id not in pending:
+                    continue
+                if status_code == "FINISHED":
+                    index = pending.pop(creation_id)
+                    task = asyncio.create_task(
+                        _publish_container(client, semaphore, access_token, user_id, creation_id)
+                    )
+                    publishing[task] = index
+                    progressed = True
+                elif status_code in ("ERROR", "EXPIRED"):
+                    results[pending.pop(creation_id)] = {
+                        "success": False, "error": f"Container {creation_id} status {status_code}"
+                    }
+                    progressed = True
+            interval = poll_interval if progressed else min(interval * POLL_BACKOFF, MAX_POLL_INTERVAL)
+
+        for creation_id, index in pending.items():
+            results[index] = {"success": False, "error": f"Container {creation_id} was not ready in time"}
+    except Exception as e:
+        logging.error("Instagram batch publishing error: %s", e)
+        for index, result in enumerate(results):
+            if result is None and index not in publishing.values():
+                results[index] = {"success": False, "error": str(e)}
+    try:
+        # Publish calls already sent may have posted: always let them finish and report them
+        if publishing:
+            published = await asyncio.gather(*publishing, return_exceptions=True)
+            for task, outcome in zip(publishing, published):
+                if isinstance(outcome, Exception):
+                    outcome = {"success": False, "error": str(outcome)}
+                results[publishing[task]] = outcome
+    finally:
+        if own_client:
+            await client.aclose()
+
+    return results
@@ -0,0 +1,146 @@
+"""Single-flight execution and status tracking for background jobs.
+
+``JobRunner`` sits between the triggers (the scheduler and the run-now
+endpoints) and the worker thread pool. A trigger for a job that is already
+queued or running attaches to that run and gets its id back instead of
+starting a duplicate (a "run now" during a scheduled run must not spend the
+RapidAPI quota twice or post twice). Runs may be scoped to one tenant: a
+tenant's trigger attaches to that tenant's run or to an unscoped run of the
+same job (which covers every tenant), while an unscoped trigger only
+attaches to an unscoped run. The number of queued plus running runs
+across all jobs is capped at the executor's worker count, so no run waits
+behind a busy pool: a trigger that would need a new run beyond the cap
+raises ``JobQueueFull``. Recent runs are kept in a short history for the
+status endpoint.
+"""
+import logging
+import threading
+import uuid
+from collections import deque
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from logs import log_context
+
+# Matches the executor's worker count in server.py
+MAX_ACTIVE_RUNS = 3
+HISTORY_SIZE = 50
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class JobRun:
+    def __init__(self, job: str, trigger: str, tenant: Optional[str] = None):
+        self.id = str(uuid.uuid4())
+        self.job = job
+        self.trigger = trigger
+        self.tenant = tenant
+        self.state = QUEUED
+        self.attached = 0
+        self.error: Optional[str] = None
+        self.queued_at = datetime.now(timezone.utc)
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+
+    @property
+    def active(self) -> bool:
+        return self.state in (QUEUED, RUNNING)
+
+    def as_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "job": self.job,
+            "trigger": self.trigger,
+            "tenant": self.tenant,
+            "state": self.state,
+            "attached_triggers": self.attached,
+            "error": self.error,
+            "queued_at": self.queued_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class JobRunner:
+    """Submit named jobs to an executor, at most one active run per job and tenant"""
+
+    def __init__(self, executor, max_active: int = MAX_ACTIVE_RUNS, history_size: int = HISTORY_SIZE,
+                 profiler=None):
+        self.executor = executor
+        # Optional profiling.Profiler; armed jobs are profiled around their target
+        self.profiler = profiler
+        self.max_active = max_active
+        self._lock = threading.Lock()
+        self._active: Dict[Tuple[str, Optional[str]], JobRun] = {}
+        self._history: Deque[JobRun] = deque(maxlen=history_size)
+
+    def trigger(self, job: str, target: Callable[[str], None], trigger: str = "manual",
+                tenant: Optional[str] = None) -> Tuple[JobRun, bool]:
+        """Start job (target is called with the run id) or attach to an active run covering tenant.
+
+        ``tenant`` None means a run for every tenant. Returns the run and whether a new run was created.
+        """
+        with self._lock:
+            run = self._active.get((job, None)) or (self._active.get((job, tenant)) if tenant else None)
+            if run is not None:
+                run.attached += 1
+                return run, False
+            if len(self._active) >= self.max_active:
+                raise JobQueueFull(f"{len(self._active)} job runs already queued or running")
+            run = JobRun(job, trigger, tenant)
+            self._active[(job, tenant)] = run
+            self._history.append(run)
+        self._submit(run, target)
+        return run, True
+
+    def _submit(self, run: JobRun, target: Callable[[str], None]):
+        try:
+            self.executor.submit(self._execute, run, target)
+        except Exception:
+            # Executor shut down: don't leave a run that can never finish
+            self._finish(run, FAILED, "Executor unavailable")
+            raise
+
+    def _execute(self, run: JobRun, target: Callable[[str], None]):
+        with self._lock:
+            run.state = RUNNING
+            run.started_at = datetime.now(timezone.utc)
+        try:
+            # Records logged by the run (and tasks it starts) carry its id
+            with log_context(run_id=run.id, job=run.job), \
+                    (self.profiler.job(run.job, run.id) if self.profiler else nullcontext()):
+                target(run.id)
+        except Exception as e:
+            logging.error("Job %s run %s failed: %s", run.job, run.id, e)
+            self._finish(run, FAILED, str(e))
+        else:
+            self._finish(run, SUCCEEDED)
+
+    def _finish(self, run: JobRun, state: str, error: Optional[str] = None):
+        with self._lock:
+            run.state = state
+            run.error = error
+            run.finished_at = datetime.now(timezone.utc)
+            if self._active.get((run.job, run.tenant)) is run:
+                del self._active[(run.job, run.tenant)]
+
+    def get(self, run_id: str) -> Optional[JobRun]:
+        with self._lock:
+            return next((run for run in self._history if run.id == run_id), None)
+
+    def runs(self) -> List[JobRun]:
+        """Recent runs, newest first"""
+        with self._lock:
+            return list(reversed(self._history))
+
+    def active(self) -> List[JobRun]:
+        with self._lock:
+            return list(self._active.values())
@@ -0,0 +1,41 @@
+"""Deferred construction of heavy subsystems.
+
+``LazyResource`` stands in for an object (a database client, a scheduler, a
+password hasher...) and only builds it, importing whatever the factory
+imports, the first time an attribute is used or ``get()`` is called. This
+keeps ``import server`` cheap for cold starts and test processes.
+"""
+import threading
+from typing import Any, Callable, Optional
+
+
+class LazyResource:
+    """Proxy that creates the wrapped object on first use"""
+
+    def __init__(self, factory: Callable[[], Any], name: Optional[str] = None):
+        self._factory = factory
+        self._name = name or getattr(factory, "__name__", "resource")
+        self._instance = None
+        self._created = False
+        self._lock = threading.Lock()
+
+    @property
+    def initialized(self) -> bool:
+        return self._created
+
+    def get(self) -> Any:
+        """Return the wrapped object, creating it if needed"""
+        if not self._created:
+            with self._lock:
+                if not self._created:
+                    self._instance = self._factory()
+                    self._created = True
+        return self._instance
+
+    def __getattr__(self, name: str) -> Any:
+        # Only called for attributes the proxy itself does not define
+        return getattr(self.get(), name)
+
+    def __repr__(self) -> str:
+        state = "initialized" if self._created else "deferred"
+        return f"<LazyResource {self._name} ({state})>"
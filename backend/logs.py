@@ -0,0 +1,189 @@
+"""Queue-backed structured logging.
+
+``configure_logging`` replaces the root handlers with a ``QueueHandler``:
+callers (request handlers on the event loop, job threads) only truncate the
+message and put the record on a bounded queue, and a ``QueueListener``
+thread formats it and writes it out. When the queue is full records are
+dropped instead of blocking the caller, and the next record that fits
+reports how many were lost.
+
+Records are JSON objects (``LOG_FORMAT=text`` keeps a plain line format)
+carrying the fields bound with ``log_context``: the request id set by
+``RequestIdMiddleware``, the job run id set by ``JobRunner`` and the tenant
+set by ``FairScheduler``. Messages and tracebacks are capped at
+``LOG_MAX_MESSAGE_CHARS``. Warnings and errors are rate limited per call
+site: after ``LOG_RATE_LIMIT`` records in a minute the rest are dropped, and
+the next record let through reports how many were suppressed.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional, Tuple
+
+MAX_MESSAGE_CHARS = int(os.environ.get('LOG_MAX_MESSAGE_CHARS', 2000))
+QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+RATE_LIMIT = int(os.environ.get('LOG_RATE_LIMIT', 10))
+RATE_WINDOW_SECONDS = 60.0
+
+_fields: contextvars.ContextVar[Dict[str, str]] = contextvars.ContextVar("log_fields", default={})
+
+# Attributes every LogRecord has; anything else came from extra= and is logged as a field
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+@contextmanager
+def log_context(**fields: str):
+    """Attach fields to every record logged in this context (and tasks/threads it starts)"""
+    token = _fields.set({**_fields.get(), **fields})
+    try:
+        yield
+    finally:
+        _fields.reset(token)
+
+
+def truncate(text: str, limit: int = MAX_MESSAGE_CHARS) -> str:
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}... [{len(text) - limit} more chars]"
+
+
+class RateLimitFilter(logging.Filter):
+    """Let at most `limit` WARNING+ records per call site through per window"""
+
+    def __init__(self, limit: int = RATE_LIMIT, window: float = RATE_WINDOW_SECONDS):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self._lock = threading.Lock()
+        # call site -> [window start, records let through, records suppressed]
+        self._sites: Dict[Tuple[str, int], list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING or self.limit <= 0:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            site = self._sites.setdefault((record.pathname, record.lineno), [now, 0, 0])
+            if now - site[0] >= self.window:
+                if site[2]:
+                    record.suppressed = site[2]
+                site[:] = [now, 0, 0]
+            if site[1] >= self.limit:
+                site[2] += 1
+                return False
+            site[1] += 1
+            return True
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that never blocks: it truncates in the caller and drops when full"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = logging.makeLogRecord(vars(record))
+        record.msg = truncate(record.getMessage())
+        record.args = None
+        if record.exc_info:
+            record.exc_text = truncate(logging.Formatter().formatException(record.exc_info))
+            record.exc_info = None
+        for name, value in _fields.get().items():
+            setattr(record, name, value)
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        with self._lock:
+            dropped, self.dropped = self.dropped, 0
+        if dropped:
+            # The first record that fits reports what was lost before it
+            record.dropped = dropped
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += dropped + 1
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for name, value in vars(record).items():
+            if name not in _RECORD_ATTRS:
+                entry[name] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+_handler: Optional[DroppingQueueHandler] = None
+_listener: Optional[QueueListener] = None
+
+
+def configure_logging(level: Optional[str] = None, fmt: Optional[str] = None):
+    """Route the root logger through the queue; safe to call more than once"""
+    global _handler, _listener
+    level = (level or os.environ.get('LOG_LEVEL', 'INFO')).upper()
+    fmt = (fmt or os.environ.get('LOG_FORMAT', 'json')).lower()
+    root = logging.getLogger()
+    root.setLevel(level)
+    if _listener is not None:
+        return
+    sink = logging.StreamHandler(sys.stderr)
+    if fmt == "json":
+        sink.setFormatter(JsonFormatter())
+    else:
+        sink.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    _handler = DroppingQueueHandler(queue.Queue(QUEUE_SIZE))
+    _handler.addFilter(RateLimitFilter())
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_handler)
+    _listener = QueueListener(_handler.queue, sink, respect_handler_level=True)
+    _listener.start()
+    # Flush what is still queued when the process exits
+    atexit.register(_listener.stop)
+
+
+class RequestIdMiddleware:
+    """Bind a request id (the client's X-Request-ID or a new one) to the request's logs"""
+
+    def __init__(self, app, header: str = "x-request-id"):
+        self.app = app
+        self.header = header
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_id = next(
+            (value.decode("latin-1")[:64] for name, value in scope["headers"] if name == self.header.encode()),
+            None
+        ) or uuid.uuid4().hex
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (self.header.encode(), request_id.encode("latin-1"))
+                ]
+            await send(message)
+
+        with log_context(request_id=request_id):
+            await self.app(scope, receive, send_with_id)
@@ -0,0 +1,217 @@
+"""Product image validation and content-addressed media cache.
+
+Images are downloaded concurrently while products are ingested, checked for
+size, format and dimensions, normalized to a JPEG that Instagram accepts and
+stored under their SHA-256. A small per-URL pointer file means an image that
+was already processed is never downloaded again. The cache directory is
+served from a static route so publishers can hand a known-good URL to the
+platform APIs.
+
+Every URL gets a ``MediaResult``, whatever goes wrong with it. Failures that
+may clear up on their own (timeouts, connection errors, upstream 5xx/429,
+local I/O trouble) are marked ``transient`` so callers can retry them on a
+later run instead of recording the image as unusable.
+"""
+import asyncio
+import hashlib
+import io
+import logging
+import os
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+import httpx
+from PIL import Image, UnidentifiedImageError
+
+from transport import http_client
+
+MAX_DOWNLOAD_BYTES = 8 * 1024 * 1024
+MIN_DIMENSION = 320
+MAX_DIMENSION = 1440
+# Instagram feed images must fall between 4:5 portrait and 1.91:1 landscape
+MIN_ASPECT = 4 / 5
+MAX_ASPECT = 1.91
+ACCEPTED_FORMATS = {"JPEG", "PNG", "WEBP", "GIF"}
+JPEG_QUALITY = 90
+
+Image.MAX_IMAGE_PIXELS = 40_000_000
+
+
+class MediaError(Exception):
+    """Raised when an upstream image cannot be used"""
+
+    def __init__(self, message: str, transient: bool = False):
+        super().__init__(message)
+        self.transient = transient
+
+
+class MediaResult:
+    def __init__(self, source_url: str, media_hash: Optional[str] = None, error: Optional[str] = None,
+                 transient: bool = False):
+        self.source_url = source_url
+        self.media_hash = media_hash
+        self.error = error
+        self.transient = transient   # the error may not recur; retry rather than record it
+
+    @property
+    def ok(self) -> bool:
+        return self.media_hash is not None
+
+
+def normalize_image(data: bytes) -> bytes:
+    """Validate raw image bytes and return a publishable JPEG"""
+    try:
+        image = Image.open(io.BytesIO(data))
+        image_format = image.format
+        image.load()
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        raise MediaError(f"Unreadable image: {e}")
+
+    if image_format not in ACCEPTED_FORMATS:
+        raise MediaError(f"Unsupported image format: {image_format}")
+    width, height = image.size
+    if min(width, height) < MIN_DIMENSION:
+        raise MediaError(f"Image too small: {width}x{height}")
+
+    if image.mode != "RGB":
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        rgba = image.convert("RGBA")
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        image = background
+
+    # Pad (product shots are usually on white) to bring the aspect ratio into range
+    aspect = width / height
+    if aspect < MIN_ASPECT or aspect > MAX_ASPECT:
+        if aspect < MIN_ASPECT:
+            canvas_size = (round(height * MIN_ASPECT), height)
+        else:
+            canvas_size = (width, round(width / MAX_ASPECT))
+        canvas = Image.new("RGB", canvas_size, (255, 255, 255))
+        canvas.paste(image, ((canvas_size[0] - width) // 2, (canvas_size[1] - height) // 2))
+        image = canvas
+
+    if max(image.size) > MAX_DIMENSION:
+        image.thumbnail((MAX_DIMENSION, MAX_DIMENSION), Image.LANCZOS)
+
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+    return output.getvalue()
+
+
+class MediaCache:
+    """Content-addressed store of normalized product images"""
+
+    def __init__(self, root: Path, public_base_url: Optional[str] = None, concurrency: int = 8):
+        self.root = Path(root)
+        self.public_base_url = public_base_url.rstrip('/') if public_base_url else None
+        self.concurrency = concurrency
+        (self.root / "by-url").mkdir(parents=True, exist_ok=True)
+
+    def path_for(self, media_hash: str) -> Path:
+        return self.root / media_hash[:2] / f"{media_hash}.jpg"
+
+    def relative_path(self, media_hash: str) -> str:
+        return f"{media_hash[:2]}/{media_hash}.jpg"
+
+    def public_url(self, media_hash: Optional[str]) -> Optional[str]:
+        """URL the platforms should fetch, or None if no public base URL is configured"""
+        if not media_hash or not self.public_base_url:
+            return None
+        return f"{self.public_base_url}/{self.relative_path(media_hash)}"
+
+    def _pointer(self, url: str) -> Path:
+        return self.root / "by-url" / hashlib.sha256(url.encode()).hexdigest()
+
+    def lookup(self, url: str) -> Optional[str]:
+        """Return the media hash already stored for a source URL, if any"""
+        try:
+            media_hash = self._pointer(url).read_text().strip()
+        except OSError:
+            return None
+        return media_hash if self.path_for(media_hash).exists() else None
+
+    def _store(self, url: str, jpeg: bytes) -> str:
+        media_hash = hashlib.sha256(jpeg).hexdigest()
+        path = self.path_for(media_hash)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".tmp")
+            tmp.write_bytes(jpeg)
+            os.replace(tmp, path)
+        pointer = self._pointer(url)
+        tmp = pointer.with_suffix(".tmp")
+        tmp.write_text(media_hash)
+        os.replace(tmp, pointer)
+        return media_hash
+
+    async def _download(self, client: httpx.AsyncClient, url: str) -> bytes:
+        async with client.stream("GET", url) as response:
+            if response.status_code != 200:
+                raise MediaError(
+                    f"Image download failed with HTTP {response.status_code}",
+                    transient=response.status_code == 429 or response.status_code >= 500
+                )
+            length = response.headers.get("content-length")
+            if length and length.isdigit() and int(length) > MAX_DOWNLOAD_BYTES:
+                raise MediaError(f"Image too large: {length} bytes")
+            chunks = []
+            received = 0
+            async for chunk in response.aiter_bytes():
+                received += len(chunk)
+                if received > MAX_DOWNLOAD_BYTES:
+                    raise MediaError(f"Image too large: over {MAX_DOWNLOAD_BYTES} bytes")
+                chunks.append(chunk)
+            return b"".join(chunks)
+
+    async def fetch(self, client: httpx.AsyncClient, url: Optional[str]) -> MediaResult:
+        """Return the cached media for url, downloading and normalizing it if needed"""
+        if not url:
+            return MediaResult(url or "", error="Missing image URL")
+        media_hash = self.lookup(url)
+        if media_hash:
+            return MediaResult(url, media_hash)
+        try:
+            parsed = httpx.URL(url)
+        except (httpx.InvalidURL, ValueError):
+            parsed = None
+        if parsed is None or parsed.scheme not in ("http", "https") or not parsed.host:
+            return MediaResult(url, error=f"Invalid image URL: {url}")
+        try:
+            data = await self._download(client, url)
+            jpeg = await asyncio.to_thread(normalize_image, data)
+            media_hash = await asyncio.to_thread(self._store, url, jpeg)
+            return MediaResult(url, media_hash)
+        except MediaError as e:
+            return MediaResult(url, error=str(e), transient=e.transient)
+        except httpx.HTTPError as e:
+            return MediaResult(url, error=f"Image download failed: {e}", transient=True)
+        except Exception as e:
+            # One bad URL must not fail the batch; unknown failures are retried next time
+            logging.warning("Image %s could not be processed: %r", url, e)
+            return MediaResult(url, error=f"Image processing failed: {e}", transient=True)
+
+    async def fetch_many(self, urls: Iterable[Optional[str]]) -> Dict[str, MediaResult]:
+        """Fetch several images concurrently; results are keyed by source URL"""
+        unique = list(dict.fromkeys(url for url in urls if url))
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async with http_client(timeout=30.0, follow_redirects=True) as client:
+            async def bounded(url):
+                async with semaphore:
+                    return await self.fetch(client, url)
+            outcomes = await asyncio.gather(*(bounded(url) for url in unique), return_exceptions=True)
+
+        results = []
+        for url, outcome in zip(unique, outcomes):
+            if isinstance(outcome, asyncio.CancelledError):
+                raise outcome
+            if isinstance(outcome, BaseException):
+                outcome = MediaResult(url, error=f"Image processing failed: {outcome}", transient=True)
+            results.append(outcome)
+        failed = [r for r in results if not r.ok]
+        if failed:
+            logging.warning(
+                "%s of %s product images rejected (%s transient)",
+                len(failed), len(results), sum(1 for r in failed if r.transient)
+            )
+        return {result.source_url: result for result in results}
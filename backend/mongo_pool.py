@@ -0,0 +1,149 @@
+"""Mongo connection pool settings, read routing and pool utilization.
+
+Pool sizes and the wait-queue timeout come from the environment so a
+deployment can size the pool to its Mongo tier:
+
+* ``MONGO_MAX_POOL_SIZE`` (default 100) and ``MONGO_MIN_POOL_SIZE`` (0);
+* ``MONGO_WAIT_QUEUE_TIMEOUT_MS`` (default 2000): how long an operation may
+  wait for a free connection before failing instead of queueing forever.
+
+Dashboard reads (lists, analytics, exports) go through a database handle
+whose read preference is ``MONGO_REPORTING_READ_PREFERENCE`` (default
+``primary``; ``secondaryPreferred`` moves them off the primary at the cost
+of replication lag, bounded by ``MONGO_REPORTING_MAX_STALENESS_S``; a
+dashboard poll that lands inside that lag can keep the pre-write body under
+the new ETag until the next change).
+
+``PoolMonitor`` is registered on the client as a pool event listener and
+counts connections per server; pymongo calls it from its own threads, so
+every update takes a lock.
+"""
+import os
+import threading
+from typing import Dict
+
+from pymongo.monitoring import ConnectionCheckOutFailedReason, ConnectionPoolListener
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+
+READ_PREFERENCES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+
+def pool_options() -> Dict[str, int]:
+    """MongoClient pool keyword arguments from the MONGO_* environment variables"""
+    return {
+        "maxPoolSize": int(os.environ.get('MONGO_MAX_POOL_SIZE', 100)),
+        "minPoolSize": int(os.environ.get('MONGO_MIN_POOL_SIZE', 0)),
+        "waitQueueTimeoutMS": int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', 2000)),
+    }
+
+
+def reporting_read_preference():
+    name = os.environ.get('MONGO_REPORTING_READ_PREFERENCE', 'primary')
+    if name not in READ_PREFERENCES:
+        raise ValueError(f"Unknown read preference: {name}")
+    if name == "primary":
+        return Primary()
+    max_staleness = int(os.environ.get('MONGO_REPORTING_MAX_STALENESS_S', -1))
+    return READ_PREFERENCES[name](max_staleness=max_staleness)
+
+
+class _PoolStats:
+    def __init__(self, options: Dict[str, int]):
+        self.max_size = options["maxPoolSize"]
+        self.min_size = options["minPoolSize"]
+        self.open = 0
+        self.in_use = 0
+        self.waiting = 0
+        self.peak_in_use = 0
+        self.peak_waiting = 0
+        self.checkouts = 0
+        self.wait_timeouts = 0
+        self.checkout_errors = 0
+        self.cleared = 0
+
+    def as_dict(self) -> Dict:
+        stats = dict(vars(self))
+        stats["utilization"] = round(self.in_use / self.max_size, 3) if self.max_size else None
+        return stats
+
+
+class PoolMonitor(ConnectionPoolListener):
+    """Live connection counts per server, fed by pymongo pool events"""
+
+    def __init__(self, options: Dict[str, int]):
+        self.options = options
+        self._lock = threading.Lock()
+        self._pools: Dict[str, _PoolStats] = {}
+
+    def _stats(self, address) -> _PoolStats:
+        key = f"{address[0]}:{address[1]}"
+        stats = self._pools.get(key)
+        if stats is None:
+            stats = self._pools[key] = _PoolStats(self.options)
+        return stats
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {address: stats.as_dict() for address, stats in self._pools.items()}
+
+    def pool_created(self, event):
+        with self._lock:
+            # event.options only lists non-default settings
+            self._pools[f"{event.address[0]}:{event.address[1]}"] = _PoolStats({**self.options, **event.options})
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self._stats(event.address).cleared += 1
+
+    def pool_closed(self, event):
+        with self._lock:
+            self._pools.pop(f"{event.address[0]}:{event.address[1]}", None)
+
+    def connection_created(self, event):
+        with self._lock:
+            self._stats(event.address).open += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            stats = self._stats(event.address)
+            stats.open = max(stats.open - 1, 0)
+
+    def connection_check_out_started(self, event):
+        with self._lock:
+            stats = self._stats(event.address)
+            stats.waiting += 1
+            stats.peak_waiting = max(stats.peak_waiting, stats.waiting)
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            stats = self._stats(event.address)
+            stats.waiting = max(stats.waiting - 1, 0)
+            if event.reason == ConnectionCheckOutFailedReason.TIMEOUT:
+                stats.wait_timeouts += 1
+            else:
+                stats.checkout_errors += 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            stats = self._stats(event.address)
+            stats.waiting = max(stats.waiting - 1, 0)
+            stats.in_use += 1
+            stats.checkouts += 1
+            stats.peak_in_use = max(stats.peak_in_use, stats.in_use)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            stats = self._stats(event.address)
+            stats.in_use = max(stats.in_use - 1, 0)
@@ -0,0 +1,108 @@
+"""In-memory posting history for per-ASIN, per-platform cooldowns.
+
+Holds the last time each (tenant, platform, ASIN) was posted so selection can
+skip recently posted products with dictionary lookups instead of querying
+``db.posts`` for every candidate. Warmed from ``posts`` at startup and
+updated by the job on every publish.
+"""
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+# Posts in these states count towards the cooldown; failed posts may be retried
+COOLDOWN_STATUSES = ["posted", "pending"]
+HISTORY_WINDOW_DAYS = 90
+
+
+def _timestamp(value) -> Optional[float]:
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    return None
+
+
+class PostHistory:
+    """Last-posted timestamps keyed by (tenant, platform, asin)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_posted: Dict[Tuple[Optional[str], str, str], float] = {}
+
+    def __len__(self) -> int:
+        return len(self._last_posted)
+
+    def record(self, asin: str, platform: str, posted_at=None, tenant: Optional[str] = None):
+        """Remember that asin was posted on platform at posted_at (default: now)"""
+        if not asin:
+            return
+        ts = _timestamp(posted_at) if posted_at is not None else None
+        if ts is None:
+            ts = datetime.now(timezone.utc).timestamp()
+        key = (tenant, platform, asin)
+        with self._lock:
+            if ts > self._last_posted.get(key, 0.0):
+                self._last_posted[key] = ts
+
+    def last_posted(self, asin: str, platform: str, tenant: Optional[str] = None) -> Optional[float]:
+        return self._last_posted.get((tenant, platform, asin))
+
+    def in_cooldown(self, asin: str, platform: str, days: float, now: Optional[float] = None,
+                    tenant: Optional[str] = None) -> bool:
+        """Was asin posted on platform within the last `days` days?"""
+        ts = self._last_posted.get((tenant, platform, asin))
+        if ts is None:
+            return False
+        if now is None:
+            now = datetime.now(timezone.utc).timestamp()
+        return now - ts < days * 86400
+
+    def cooldown_mask(self, asins: Iterable[str], platform: str, days: float,
+                      now: Optional[float] = None, tenant: Optional[str] = None) -> np.ndarray:
+        """Boolean mask over asins, True where the product is still cooling down"""
+        if now is None:
+            now = datetime.now(timezone.utc).timestamp()
+        cutoff = now - days * 86400
+        last_posted = self._last_posted
+        return np.fromiter(
+            (last_posted.get((tenant, platform, asin), 0.0) > cutoff for asin in asins),
+            dtype=bool,
+        )
+
+    async def warm(self, db, days: int = HISTORY_WINDOW_DAYS) -> int:
+        """Load recent posts from db.posts; returns the number of posts read"""
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+        cursor = db.posts.find(
+            {"created_at": {"$gte": cutoff}, "status": {"$in": COOLDOWN_STATUSES}},
+            {"_id": 0, "product_asin": 1, "product_id": 1, "platform": 1, "posted_at": 1, "created_at": 1,
+             "admin_username": 1},
+        )
+        count = 0
+        legacy = []
+        async for post in cursor:
+            count += 1
+            posted_at = post.get('posted_at') or post.get('created_at')
+            platform = post.get('platform', 'instagram')
+            tenant = post.get('admin_username')
+            if post.get('product_asin'):
+                self.record(post['product_asin'], platform, posted_at, tenant)
+            elif post.get('product_id'):
+                legacy.append((post['product_id'], platform, posted_at, tenant))
+
+        # Posts written before product_asin existed only carry the product id
+        if legacy:
+            ids = list({product_id for product_id, _, _, _ in legacy})
+            asin_by_id = {}
+            async for product in db.products.find({"id": {"$in": ids}}, {"_id": 0, "id": 1, "asin": 1}):
+                asin_by_id[product['id']] = product['asin']
+            for product_id, platform, posted_at, tenant in legacy:
+                if product_id in asin_by_id:
+                    self.record(asin_by_id[product_id], platform, posted_at, tenant)
+        return count
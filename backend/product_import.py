@@ -0,0 +1,191 @@
+"""Bulk product import from streamed CSV or JSON Lines uploads.
+
+The request body is consumed chunk by chunk: bytes are decoded
+incrementally, split into complete records (a CSV record may span lines
+inside quotes), validated against the ``Product`` model and upserted by ASIN
+with unordered bulk writes of ``BATCH_ROWS`` rows. Rows only ``$set`` the
+fields they carry, so ``on_batch`` is handed the stored documents read back
+after each write rather than the parsed rows. The next body chunk is
+only read once the current batch is written, so memory use depends on the
+batch size, not on the size of the file.
+"""
+import codecs
+import csv
+import json
+import logging
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from selection import parse_price
+
+BATCH_ROWS = 1000
+MAX_REPORTED_ERRORS = 20
+
+
+async def iter_line_batches(byte_chunks: AsyncIterator[bytes]) -> AsyncIterator[List[str]]:
+    """Complete lines (with their newline) for each chunk of the body"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    pending = ""
+    async for chunk in byte_chunks:
+        pending += decoder.decode(chunk)
+        if "\n" not in pending:
+            continue
+        complete, pending = pending.rsplit("\n", 1)
+        yield [line + "\n" for line in complete.split("\n")]
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield [pending]
+
+
+async def iter_csv_rows(byte_chunks: AsyncIterator[bytes]) -> AsyncIterator[List[Tuple[int, Dict]]]:
+    """(row number, row dict) batches from a CSV body with a header line"""
+    header: Optional[List[str]] = None
+    carry = ""
+    row_number = 0
+    async for lines in iter_line_batches(byte_chunks):
+        records = []
+        for line in lines:
+            carry += line
+            # Balanced quotes mean the record is complete; escaped quotes come in pairs
+            if carry.count('"') % 2 == 0:
+                records.append(carry)
+                carry = ""
+        batch = []
+        for row in csv.reader(records):
+            if header is None:
+                header = [name.strip() for name in row]
+                continue
+            if not any(field.strip() for field in row):
+                continue
+            row_number += 1
+            batch.append((row_number, dict(zip(header, row))))
+        if batch:
+            yield batch
+    if carry.strip():
+        row_number += 1
+        yield [(row_number, {"_error": "Unterminated quoted field"})]
+
+
+async def iter_jsonl_rows(byte_chunks: AsyncIterator[bytes]) -> AsyncIterator[List[Tuple[int, Dict]]]:
+    """(line number, object) batches from a JSON Lines body"""
+    line_number = 0
+    async for lines in iter_line_batches(byte_chunks):
+        batch = []
+        for line in lines:
+            line_number += 1
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                row = {"_error": f"Invalid JSON: {e}"}
+            if not isinstance(row, dict):
+                row = {"_error": "Expected a JSON object"}
+            batch.append((line_number, row))
+        if batch:
+            yield batch
+
+
+ROW_PARSERS = {"csv": iter_csv_rows, "jsonl": iter_jsonl_rows}
+
+
+def _clean(row: Dict) -> Dict:
+    """Drop blank CSV cells so model defaults apply, and fill derivable fields"""
+    row = {key: value for key, value in row.items() if key and value not in ("", None)}
+    asin = row.get('asin')
+    if asin and not row.get('product_url'):
+        row['product_url'] = f"https://www.amazon.com/dp/{asin}"
+    if 'price_value' not in row and row.get('price') is not None:
+        row['price_value'] = parse_price(row['price'])
+    if isinstance(row.get('price'), (int, float)):
+        row['price'] = f"${row['price']:.2f}"
+    return row
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.rejected = 0
+        self.inserted = 0
+        self.updated = 0
+        self.errors: List[Dict] = []
+        self.started = time.perf_counter()
+
+    def reject(self, row_number: int, error: str):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row_number, "error": error})
+
+    def as_dict(self) -> Dict:
+        elapsed = time.perf_counter() - self.started
+        return {
+            "rows": self.rows,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "seconds": round(elapsed, 3),
+            "rows_per_second": round(self.rows / elapsed) if elapsed else 0,
+        }
+
+
+async def import_products(db, byte_chunks: AsyncIterator[bytes], fmt: str, model,
+                          on_batch: Optional[Callable[[List[Dict]], Awaitable[None]]] = None,
+                          batch_rows: int = BATCH_ROWS, tenant: Optional[str] = None) -> ImportReport:
+    """Validate and upsert products from a streamed upload for tenant; on_batch sees each batch as stored"""
+    from pymongo import UpdateOne
+    report = ImportReport()
+    fields = set(model.model_fields) - {"id", "fetched_at"}
+    pending: List = []
+
+    async def write(products: List):
+        now = datetime.now(timezone.utc).isoformat()
+        result = await db.products.bulk_write([
+            UpdateOne(
+                {"asin": product.asin},
+                {
+                    "$set": {**product.model_dump(include=product.model_fields_set & fields), "fetched_at": now},
+                    "$setOnInsert": {"id": str(uuid.uuid4())},
+                    "$addToSet": {"tenants": tenant},
+                },
+                upsert=True
+            )
+            for product in products
+        ], ordered=False)
+        report.inserted += result.upserted_count
+        report.updated += result.matched_count
+        if on_batch:
+            # Merged with what was already stored, with the id and fetched_at actually written
+            await on_batch(await db.products.find(
+                {"asin": {"$in": [product.asin for product in products]}}, {"_id": 0}
+            ).to_list(len(products)))
+
+    async for rows in ROW_PARSERS[fmt](byte_chunks):
+        for row_number, row in rows:
+            report.rows += 1
+            if "_error" in row:
+                report.reject(row_number, row["_error"])
+                continue
+            try:
+                product = model.model_validate(_clean(row))
+            except ValidationError as e:
+                error = e.errors()[0]
+                report.reject(row_number, f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}")
+                continue
+            pending.append(product)
+            if len(pending) >= batch_rows:
+                await write(pending)
+                pending = []
+    if pending:
+        await write(pending)
+
+    summary = report.as_dict()
+    logging.info(
+        "Imported %s product rows (%s new, %s updated, %s rejected) at %s rows/s",
+        summary['rows'], summary['inserted'], summary['updated'], summary['rejected'], summary['rows_per_second']
+    )
+    return report
@@ -0,0 +1,288 @@
+"""On-demand sampling profiler for requests and job runs.
+
+A sampler thread wakes every ``interval`` seconds while at least one capture
+is active and records the current stack of each capture:
+
+* a request capture follows the request's asyncio task on the event loop.
+  While the task is running the loop thread's Python stack is recorded;
+  while it is suspended the chain of coroutines it is awaiting is recorded
+  and ends in an ``[await ...]`` frame, so time spent waiting on Mongo or an
+  upstream API shows up as well (a wall-clock profile);
+* a job capture records the stack of the worker thread running the job.
+
+Profiles are kept as zlib-compressed "folded stacks" (``frame;frame;frame
+count`` per line), the input format of flamegraph.pl, inferno and
+speedscope. The last ``history`` profiles are kept in memory.
+
+Captures are started by arming a route path for its next N requests, arming
+a job for its next N runs, or setting a slow-request threshold: each request
+then schedules a timer at half the threshold that starts sampling it, and the
+profile is kept only if the request ends up slower than the threshold (it
+covers the part of the request after the timer fired). With nothing armed
+and no threshold the middleware does a single attribute check per request
+and no sampler thread runs.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+import uuid
+import zlib
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Deque, Dict, List, Optional
+
+SAMPLE_INTERVAL = float(os.environ.get('PROFILE_INTERVAL_MS', 5)) / 1000
+PROFILE_HISTORY = 20
+MAX_STACK_DEPTH = 96
+# Samples per capture; a runaway capture stops recording beyond this
+MAX_SAMPLES = 200_000
+SLOW_CAPTURE_LEAD = 0.5
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _thread_stack(frame) -> List[str]:
+    stack = []
+    while frame is not None and len(stack) < MAX_STACK_DEPTH:
+        stack.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def _await_stack(task: asyncio.Task) -> List[str]:
+    """Coroutine chain a suspended task is waiting in, outermost first"""
+    stack = []
+    awaitable = task.get_coro()
+    while awaitable is not None and len(stack) < MAX_STACK_DEPTH:
+        frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+        if frame is None:
+            stack.append(f"[await {type(awaitable).__name__}]")
+            break
+        stack.append(_frame_label(frame.f_code))
+        awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None)
+    return stack
+
+
+class Capture:
+    """Samples collected for one request or job run"""
+
+    def __init__(self, kind: str, label: str, reason: str, thread_id: int,
+                 loop: Optional[asyncio.AbstractEventLoop] = None, task: Optional[asyncio.Task] = None):
+        self.kind = kind
+        self.label = label
+        self.reason = reason
+        self.thread_id = thread_id
+        self.loop = loop
+        self.task = task
+        self.samples: Counter = Counter()
+        self.total = 0
+        self.started = time.perf_counter()
+
+    def sample(self, frames: Dict[int, object]):
+        if self.total >= MAX_SAMPLES:
+            return
+        if self.task is not None:
+            if self.task.done():
+                return
+            # current_task with an explicit loop only reads the loop's running task, so it is
+            # safe to call from the sampler thread
+            if asyncio.current_task(self.loop) is self.task:
+                stack = _thread_stack(frames.get(self.thread_id))
+            else:
+                stack = _await_stack(self.task)
+        else:
+            stack = _thread_stack(frames.get(self.thread_id))
+        if stack:
+            self.samples[";".join(stack)] += 1
+            self.total += 1
+
+
+class Profile:
+    """A finished capture, stored compressed"""
+
+    def __init__(self, capture: Capture, duration: float, interval: float, extra: Optional[Dict] = None):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = capture.kind
+        self.label = capture.label
+        self.reason = capture.reason
+        self.duration_ms = round(duration * 1000, 1)
+        self.samples = capture.total
+        self.interval_ms = interval * 1000
+        self.extra = extra or {}
+        self.created_at = datetime.now(timezone.utc)
+        folded = "".join(f"{stack} {count}\n" for stack, count in capture.samples.most_common())
+        self._data = zlib.compress(folded.encode(), 6)
+
+    def folded(self) -> bytes:
+        return zlib.decompress(self._data)
+
+    def as_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "label": self.label,
+            "reason": self.reason,
+            "duration_ms": self.duration_ms,
+            "samples": self.samples,
+            "interval_ms": self.interval_ms,
+            "stored_bytes": len(self._data),
+            "created_at": self.created_at.isoformat(),
+            **self.extra,
+        }
+
+
+class Profiler:
+    """Arming state, the sampler thread and the stored profiles"""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL, history: int = PROFILE_HISTORY,
+                 slow_request_ms: float = 0):
+        self.interval = interval
+        self.slow_request_ms = slow_request_ms
+        self._lock = threading.Lock()
+        self._captures: List[Capture] = []
+        self._armed_paths: Dict[str, int] = {}
+        self._armed_jobs: Dict[str, int] = {}
+        self._profiles: Deque[Profile] = deque(maxlen=history)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def watching_requests(self) -> bool:
+        return bool(self._armed_paths) or self.slow_request_ms > 0
+
+    def arm_path(self, path: str, count: int):
+        with self._lock:
+            if count > 0:
+                self._armed_paths[path] = count
+            else:
+                self._armed_paths.pop(path, None)
+
+    def arm_job(self, job: str, count: int):
+        with self._lock:
+            if count > 0:
+                self._armed_jobs[job] = count
+            else:
+                self._armed_jobs.pop(job, None)
+
+    def _take(self, armed: Dict[str, int], key: str) -> bool:
+        with self._lock:
+            remaining = armed.get(key, 0)
+            if not remaining:
+                return False
+            if remaining == 1:
+                del armed[key]
+            else:
+                armed[key] = remaining - 1
+            return True
+
+    def start(self, capture: Capture) -> Capture:
+        with self._lock:
+            self._captures.append(capture)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+                self._thread.start()
+        return capture
+
+    def stop(self, capture: Capture, keep: bool = True, **extra) -> Optional[Profile]:
+        with self._lock:
+            if capture in self._captures:
+                self._captures.remove(capture)
+        if not keep:
+            return None
+        profile = Profile(capture, time.perf_counter() - capture.started, self.interval, extra)
+        with self._lock:
+            self._profiles.append(profile)
+        return profile
+
+    def _run(self):
+        while True:
+            with self._lock:
+                captures = list(self._captures)
+                if not captures:
+                    # Exit when idle; the next capture starts a new thread
+                    self._thread = None
+                    return
+            frames = sys._current_frames()
+            for capture in captures:
+                capture.sample(frames)
+            del frames
+            time.sleep(self.interval)
+
+    @contextmanager
+    def job(self, job: str, run_id: str):
+        """Profile the enclosed job run if the job is armed"""
+        if not self._armed_jobs or not self._take(self._armed_jobs, job):
+            yield
+            return
+        capture = self.start(Capture("job", job, "armed", threading.get_ident()))
+        try:
+            yield
+        finally:
+            self.stop(capture, run_id=run_id)
+
+    def get(self, profile_id: str) -> Optional[Profile]:
+        with self._lock:
+            return next((p for p in self._profiles if p.id == profile_id), None)
+
+    def status(self) -> Dict:
+        with self._lock:
+            return {
+                "interval_ms": self.interval * 1000,
+                "slow_request_ms": self.slow_request_ms,
+                "armed_paths": dict(self._armed_paths),
+                "armed_jobs": dict(self._armed_jobs),
+                "active_captures": len(self._captures),
+                "profiles": [profile.as_dict() for profile in reversed(self._profiles)],
+            }
+
+
+class ProfilingMiddleware:
+    """Starts request captures for armed paths and slow requests"""
+
+    def __init__(self, app, profiler: Profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        profiler = self.profiler
+        if scope["type"] != "http" or not profiler.watching_requests:
+            await self.app(scope, receive, send)
+            return
+        path = scope["path"]
+        task = asyncio.current_task()
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        captures: List[Capture] = []
+        timer = None
+        if profiler._armed_paths and profiler._take(profiler._armed_paths, path):
+            captures.append(profiler.start(Capture("request", path, "armed", threading.get_ident(), loop, task)))
+        elif profiler.slow_request_ms > 0:
+            threshold = profiler.slow_request_ms / 1000
+            timer = loop.call_later(
+                threshold * SLOW_CAPTURE_LEAD,
+                lambda: captures.append(
+                    profiler.start(Capture("request", path, "slow", threading.get_ident(), loop, task))
+                )
+            )
+        status_code = []
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status_code.append(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            if timer is not None:
+                timer.cancel()
+            elapsed = time.perf_counter() - started
+            for capture in captures:
+                keep = capture.reason == "armed" or elapsed * 1000 >= profiler.slow_request_ms
+                profiler.stop(capture, keep, method=scope["method"], status=status_code[0] if status_code else None,
+                              request_ms=round(elapsed * 1000, 1))
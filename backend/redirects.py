@@ -0,0 +1,195 @@
+"""Tracked affiliate short links with write-behind click counting.
+
+Every post gets a compact base62 code that redirects to the product's
+affiliate URL. Codes are resolved from an in-memory table (warmed from
+``db.short_links`` at startup) and clicks are counted in memory; a
+background task flushes the counters to Mongo as batched ``$inc`` writes, so
+a redirect never waits on the database. Clicks are added to the analytics
+of the tenant that created the link. Codes missing from memory are
+looked up in Mongo once and, if unknown there too, remembered in a bounded
+negative cache for ``MISS_TTL`` seconds, so requests for made-up codes on
+this public route do not each cost a query.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+BASE62_ALPHABET = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+FLUSH_INTERVAL = 5.0
+# Start codes at 62**3 so every code is at least four characters
+CODE_OFFSET = 62 ** 3
+MAX_CODE_LENGTH = 11
+MISS_CACHE_SIZE = 10000
+# Bounds how long a code created by another worker can look unknown here
+MISS_TTL = 60.0
+
+
+def encode_base62(number: int) -> str:
+    if number < 0:
+        raise ValueError("Cannot encode negative numbers")
+    if number == 0:
+        return BASE62_ALPHABET[0]
+    digits = []
+    while number:
+        number, remainder = divmod(number, 62)
+        digits.append(BASE62_ALPHABET[remainder])
+    return "".join(reversed(digits))
+
+
+def decode_base62(code: str) -> int:
+    number = 0
+    for char in code:
+        number = number * 62 + BASE62_ALPHABET.index(char)
+    return number
+
+
+class ShortLinks:
+    """Code -> target lookup table plus buffered click counters"""
+
+    def __init__(self, flush_interval: float = FLUSH_INTERVAL, on_flush: Optional[Callable[[int], None]] = None):
+        self.flush_interval = flush_interval
+        self.on_flush = on_flush   # called with the click count after each successful flush
+        self._targets: Dict[str, Tuple[str, Optional[str], Optional[str]]] = {}   # code -> (url, post_id, tenant)
+        self._clicks: Dict[str, int] = {}
+        self._misses: "OrderedDict[str, float]" = OrderedDict()   # unknown code -> expiry
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._targets)
+
+    def add(self, code: str, target_url: str, post_id: Optional[str] = None, tenant: Optional[str] = None):
+        self._targets[code] = (target_url, post_id, tenant)
+
+    def resolve(self, code: str) -> Optional[str]:
+        """Return the target URL for a code held in memory"""
+        target = self._targets.get(code)
+        return target[0] if target else None
+
+    def record_click(self, code: str):
+        self._clicks[code] = self._clicks.get(code, 0) + 1
+
+    @property
+    def pending_clicks(self) -> int:
+        return sum(self._clicks.values())
+
+    async def warm(self, db) -> int:
+        projection = {"_id": 0, "code": 1, "target_url": 1, "post_id": 1, "admin_username": 1}
+        async for link in db.short_links.find({}, projection):
+            self.add(link['code'], link['target_url'], link.get('post_id'), link.get('admin_username'))
+        return len(self._targets)
+
+    async def load(self, db, code: str) -> Optional[str]:
+        """Resolve a code missing from memory (e.g. created by another worker)"""
+        if len(code) > MAX_CODE_LENGTH or not all(char in BASE62_ALPHABET for char in code):
+            return None
+        expiry = self._misses.get(code)
+        if expiry is not None:
+            if expiry > time.monotonic():
+                return None
+            del self._misses[code]
+        link = await db.short_links.find_one(
+            {"code": code}, {"_id": 0, "target_url": 1, "post_id": 1, "admin_username": 1}
+        )
+        if not link:
+            self._misses[code] = time.monotonic() + MISS_TTL
+            if len(self._misses) > MISS_CACHE_SIZE:
+                self._misses.popitem(last=False)
+            return None
+        self.add(code, link['target_url'], link.get('post_id'), link.get('admin_username'))
+        return link['target_url']
+
+    async def create_many(self, db, links: List[Tuple[str, Optional[str], Optional[str]]],
+                          tenant: Optional[str] = None) -> List[str]:
+        """Create tenant's codes for (target_url, product_asin, post_id) tuples with one counter round trip"""
+        from pymongo import ReturnDocument
+        if not links:
+            return []
+        counter = await db.counters.find_one_and_update(
+            {"_id": "short_links"},
+            {"$inc": {"seq": len(links)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        first = counter['seq'] - len(links) + 1
+        now = datetime.now(timezone.utc).isoformat()
+        codes = [encode_base62(CODE_OFFSET + first + i) for i in range(len(links))]
+        await db.short_links.insert_many([
+            {
+                "code": code,
+                "target_url": target_url,
+                "product_asin": product_asin,
+                "post_id": post_id,
+                "admin_username": tenant,
+                "clicks": 0,
+                "created_at": now
+            }
+            for code, (target_url, product_asin, post_id) in zip(codes, links)
+        ])
+        for code, (target_url, _, post_id) in zip(codes, links):
+            self.add(code, target_url, post_id, tenant)
+            self._misses.pop(code, None)
+        return codes
+
+    async def flush(self, db, analytics_defaults: Callable[[str, Optional[str]], Dict]) -> int:
+        """Write buffered clicks to Mongo; returns the number of clicks flushed"""
+        if not self._clicks:
+            return 0
+        from pymongo import UpdateOne
+        clicks, self._clicks = self._clicks, {}
+        total = sum(clicks.values())
+
+        link_updates = [UpdateOne({"code": code}, {"$inc": {"clicks": count}}) for code, count in clicks.items()]
+        post_clicks: Dict[str, int] = {}
+        tenant_clicks: Dict[Optional[str], int] = {}
+        for code, count in clicks.items():
+            _, post_id, tenant = self._targets.get(code, (None, None, None))
+            if post_id:
+                post_clicks[post_id] = post_clicks.get(post_id, 0) + count
+            tenant_clicks[tenant] = tenant_clicks.get(tenant, 0) + count
+        today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        try:
+            await db.short_links.bulk_write(link_updates, ordered=False)
+            if post_clicks:
+                await db.posts.bulk_write([
+                    UpdateOne({"id": post_id}, {"$inc": {"link_clicks": count}})
+                    for post_id, count in post_clicks.items()
+                ], ordered=False)
+            for tenant, count in tenant_clicks.items():
+                defaults = {k: v for k, v in analytics_defaults(today, tenant).items() if k != "link_clicks"}
+                await db.analytics.update_one(
+                    {"date": today, "admin_username": tenant},
+                    {"$inc": {"link_clicks": count}, "$setOnInsert": defaults},
+                    upsert=True
+                )
+        except Exception as e:
+            # Keep the counts so the next flush retries them
+            for code, count in clicks.items():
+                self._clicks[code] = self._clicks.get(code, 0) + count
+            logging.error("Click flush failed: %s", e)
+            return 0
+        if self.on_flush:
+            self.on_flush(total)
+        return total
+
+    async def _flush_loop(self, db, analytics_defaults: Callable[[str, Optional[str]], Dict]):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush(db, analytics_defaults)
+
+    def start(self, db, analytics_defaults: Callable[[str, Optional[str]], Dict]):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop(db, analytics_defaults))
+
+    async def stop(self, db, analytics_defaults: Callable[[str, Optional[str]], Dict]):
+        """Cancel the flusher and write any remaining clicks"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush(db, analytics_defaults)
@@ -0,0 +1,278 @@
+"""Tiered retention: move cold posts and products into compressed archives.
+
+Each ``RetentionPolicy`` names a collection, the documents it covers and how
+many days they stay hot. The archiver reads cold documents oldest first in
+batches, writes each batch to zstd-compressed NDJSON files partitioned by
+document date (``<archive>/<collection>/<YYYY-MM-DD>/<batch>.ndjson.zst``,
+readable with ``zstd -dc``), and only then deletes them from Mongo. Counts
+of archived posts by status and platform are kept in ``db.archive_stats``, in
+total (``_id`` is the collection) and per tenant (``collection`` and
+``tenant`` fields), so the analytics overview can keep reporting all-time
+totals. A product is counted once per ASIN: ``db.archived_products`` holds
+the ASINs that live only in the archive, and writers call
+``forget_products`` when an ASIN is stored again, which takes it back out of
+the counts.
+
+Restore archived documents with::
+
+    python -m retention restore posts 2024-01-01 2024-01-31
+
+Restored documents carry ``restored_at`` and are not archived again until
+``RESTORE_HOLD_DAYS`` after the restore.
+"""
+import asyncio
+import logging
+import os
+import sys
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+ARCHIVE_BATCH = 5000
+RESTORED_DIR = "restored"
+RESTORE_HOLD_DAYS = int(os.environ.get('RESTORE_HOLD_DAYS', 30))
+# archive_runs documents expire on their own; ran_at is a BSON date for the TTL index
+RUN_LOG_TTL_SECONDS = 90 * 86400
+
+
+class RetentionPolicy:
+    def __init__(self, collection: str, date_field: str, hot_days: int, query: Optional[Dict] = None,
+                 name: Optional[str] = None):
+        self.collection = collection
+        self.date_field = date_field
+        self.hot_days = hot_days
+        self.query = query or {}
+        self.name = name or collection
+
+    def as_dict(self) -> Dict:
+        return {"name": self.name, "collection": self.collection, "hot_days": self.hot_days}
+
+
+def default_policies() -> List[RetentionPolicy]:
+    """Hot windows, overridable through RETENTION_*_DAYS environment variables"""
+    return [
+        RetentionPolicy("posts", "created_at", int(os.environ.get('RETENTION_FAILED_POSTS_DAYS', 30)),
+                        {"status": "failed"}, name="failed_posts"),
+        RetentionPolicy("posts", "created_at", int(os.environ.get('RETENTION_POSTS_DAYS', 180)),
+                        {"status": "posted"}, name="posts"),
+        RetentionPolicy("products", "fetched_at", int(os.environ.get('RETENTION_PRODUCTS_DAYS', 90)),
+                        name="products"),
+    ]
+
+
+def _stats_increment(collection: str, docs: List[Dict], sign: int = 1) -> Dict[str, int]:
+    increment = {"total": sign * len(docs)}
+    if collection == "posts":
+        for doc in docs:
+            for field in ("status", "platform"):
+                key = f"{field}.{doc.get(field) or 'unknown'}"
+                increment[key] = increment.get(key, 0) + sign
+    return increment
+
+
+def _owners(collection: str, doc: Dict) -> List[Optional[str]]:
+    # Products are shared and belong to every tenant that fetched them
+    if collection == "products":
+        return doc.get("tenants") or [None]
+    return [doc.get("admin_username")]
+
+
+async def _update_stats(db, collection: str, docs: List[Dict], sign: int = 1):
+    """Add (or with sign -1, remove) docs in the collection's archive counts, overall and per tenant"""
+    await db.archive_stats.update_one(
+        {"_id": collection}, {"$inc": _stats_increment(collection, docs, sign)}, upsert=True
+    )
+    by_tenant: Dict[Optional[str], List[Dict]] = {}
+    for doc in docs:
+        for tenant in _owners(collection, doc):
+            by_tenant.setdefault(tenant, []).append(doc)
+    for tenant, tenant_docs in by_tenant.items():
+        await db.archive_stats.update_one(
+            {"collection": collection, "tenant": tenant},
+            {"$inc": _stats_increment(collection, tenant_docs, sign)},
+            upsert=True
+        )
+
+
+def _write_partition(path: Path, docs: List[Dict]):
+    """Write docs as zstd NDJSON atomically"""
+    import orjson
+    import pyarrow as pa
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with pa.CompressedOutputStream(str(tmp), "zstd") as stream:
+        stream.write(b"".join(orjson.dumps(doc, option=orjson.OPT_APPEND_NEWLINE, default=str) for doc in docs))
+    os.replace(tmp, path)
+
+
+def _read_partition(path: Path) -> List[Dict]:
+    import orjson
+    import pyarrow as pa
+    with pa.CompressedInputStream(str(path), "zstd") as stream:
+        data = stream.read()
+    return [orjson.loads(line) for line in data.splitlines() if line.strip()]
+
+
+class Archiver:
+    """Moves cold documents from Mongo into date-partitioned archive files"""
+
+    def __init__(self, root: Path, policies: Optional[List[RetentionPolicy]] = None,
+                 batch_size: int = ARCHIVE_BATCH):
+        self.root = Path(root)
+        self.policies = policies if policies is not None else default_policies()
+        self.batch_size = batch_size
+
+    async def ensure_indexes(self, db):
+        for policy in self.policies:
+            await db.get_collection(policy.collection).create_index(policy.date_field)
+        await db.archive_runs.create_index("ran_at", expireAfterSeconds=RUN_LOG_TTL_SECONDS)
+
+    async def archive_policy(self, db, policy: RetentionPolicy, now: Optional[datetime] = None) -> List[Dict]:
+        """Archive every cold document for policy; returns the archived documents' keys"""
+        now = now or datetime.now(timezone.utc)
+        cutoff = (now - timedelta(days=policy.hot_days)).isoformat()
+        hold_cutoff = (now - timedelta(days=RESTORE_HOLD_DAYS)).isoformat()
+        collection = db.get_collection(policy.collection)
+        query = {
+            **policy.query,
+            policy.date_field: {"$lt": cutoff},
+            # Restored on purpose: keep them hot for the hold period
+            "$or": [{"restored_at": None}, {"restored_at": {"$lt": hold_cutoff}}],
+        }
+        archived = []
+        while True:
+            cursor = collection.find(query).sort(policy.date_field, 1).limit(self.batch_size)
+            docs = await cursor.to_list(self.batch_size)
+            if not docs:
+                break
+            batch_id = f"{now.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+            partitions: Dict[str, List[Dict]] = {}
+            for doc in docs:
+                day = str(doc.get(policy.date_field))[:10]
+                partitions.setdefault(day, []).append({k: v for k, v in doc.items() if k != "_id"})
+            await asyncio.to_thread(self._write_partitions, policy.collection, batch_id, partitions)
+
+            # Files are durable before anything is removed from Mongo
+            await collection.delete_many({"_id": {"$in": [doc["_id"] for doc in docs]}})
+            counted = docs
+            if policy.collection == "products":
+                counted = await self._record_archived_products(db, docs)
+            if counted:
+                await _update_stats(db, policy.collection, counted)
+            archived.extend({"id": doc.get("id"), "asin": doc.get("asin")} for doc in docs)
+            if len(docs) < self.batch_size:
+                break
+        return archived
+
+    async def _record_archived_products(self, db, docs: List[Dict]) -> List[Dict]:
+        """Remember archived ASINs; returns the docs whose ASIN was not already archived"""
+        from pymongo import UpdateOne
+        result = await db.archived_products.bulk_write([
+            UpdateOne({"_id": doc.get("asin")}, {"$setOnInsert": {"tenants": doc.get("tenants")}}, upsert=True)
+            for doc in docs
+        ], ordered=True)
+        return [docs[index] for index in result.upserted_ids]
+
+    async def forget_products(self, db, asins) -> int:
+        """Take ASINs that are back in db.products out of the archive counts; returns how many were"""
+        asins = list(asins)
+        if not asins:
+            return 0
+        keys = await db.archived_products.find({"_id": {"$in": asins}}).to_list(None)
+        forgotten = []
+        for key in keys:
+            # One delete per key, so concurrent writers never both subtract the same ASIN
+            if await db.archived_products.find_one_and_delete({"_id": key["_id"]}):
+                forgotten.append(key)
+        if forgotten:
+            await _update_stats(db, "products", forgotten, sign=-1)
+        return len(forgotten)
+
+    def _write_partitions(self, collection: str, batch_id: str, partitions: Dict[str, List[Dict]]):
+        for day, docs in partitions.items():
+            _write_partition(self.root / collection / day / f"{batch_id}.ndjson.zst", docs)
+
+    async def run(self, db, now: Optional[datetime] = None) -> Dict[str, List[Dict]]:
+        """Apply every policy; returns archived keys per collection"""
+        archived: Dict[str, List[Dict]] = {}
+        counts = {}
+        for policy in self.policies:
+            keys = await self.archive_policy(db, policy, now)
+            archived.setdefault(policy.collection, []).extend(keys)
+            counts[policy.name] = len(keys)
+        await db.archive_runs.insert_one({"ran_at": datetime.now(timezone.utc), "archived": counts})
+        logging.info("Retention pass archived %s", counts)
+        return archived
+
+    def partitions(self, collection: str, start: Optional[str] = None, end: Optional[str] = None) -> List[Path]:
+        directory = self.root / collection
+        if not directory.is_dir():
+            return []
+        days = sorted(
+            path for path in directory.iterdir()
+            if path.is_dir() and path.name != RESTORED_DIR
+            and (start is None or path.name >= start) and (end is None or path.name <= end)
+        )
+        return [file for day in days for file in sorted(day.glob("*.ndjson.zst"))]
+
+    async def restore(self, db, collection: str, start: Optional[str] = None, end: Optional[str] = None) -> int:
+        """Put archived documents from [start, end] back into Mongo; returns documents restored"""
+        from pymongo import UpdateOne
+        key = "id" if collection == "posts" else "asin"
+        restored_at = datetime.now(timezone.utc).isoformat()
+        restored = 0
+        for path in self.partitions(collection, start, end):
+            docs = await asyncio.to_thread(_read_partition, path)
+            if docs:
+                result = await db.get_collection(collection).bulk_write(
+                    [
+                        UpdateOne({key: doc.get(key)}, {"$setOnInsert": {**doc, "restored_at": restored_at}},
+                                  upsert=True)
+                        for doc in docs
+                    ],
+                    ordered=False
+                )
+                # Documents already present (re-fetched since, or archived twice after a crash) are
+                # left untouched and not re-counted
+                inserted = [docs[index] for index in result.upserted_ids]
+                if collection == "products":
+                    await self.forget_products(db, [doc.get("asin") for doc in inserted])
+                elif inserted:
+                    await _update_stats(db, collection, inserted, sign=-1)
+                restored += len(inserted)
+            target = self.root / collection / RESTORED_DIR / path.parent.name / path.name
+            target.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(path, target)
+        logging.info("Restored %s %s documents from archive", restored, collection)
+        return restored
+
+    def usage(self) -> Dict[str, Dict[str, int]]:
+        """Archive files and bytes per collection"""
+        usage = {}
+        for policy in self.policies:
+            files = self.partitions(policy.collection)
+            usage[policy.collection] = {"files": len(files), "bytes": sum(path.stat().st_size for path in files)}
+        return usage
+
+
+async def _restore_main(collection: str, start: Optional[str], end: Optional[str]):
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+    root_dir = Path(__file__).parent
+    load_dotenv(root_dir / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    archiver = Archiver(Path(os.environ.get('ARCHIVE_DIR', root_dir / 'archive')))
+    try:
+        count = await archiver.restore(client[os.environ['DB_NAME']], collection, start, end)
+    finally:
+        client.close()
+    print(f"Restored {count} {collection} documents")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] != "restore" or sys.argv[2] not in ("posts", "products"):
+        print("usage: python -m retention restore posts|products [start YYYY-MM-DD] [end YYYY-MM-DD]")
+        sys.exit(2)
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_restore_main(sys.argv[2], *(sys.argv[3:5] + [None, None])[:2]))
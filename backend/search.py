@@ -0,0 +1,288 @@
+"""In-process product search index.
+
+Keeps one row per ASIN with numeric columns (price, rating, fetched_at,
+category code) in growable NumPy arrays and a token -> sorted row-id
+postings list for titles. Keyword queries intersect postings starting from
+the rarest token; category, rating and price filters are vectorized masks
+over the candidate rows; pages come from a partial sort. Only the ASINs of
+the requested page are returned, so the caller hydrates at most ``limit``
+documents from Mongo. Rows are added by the posting job and bulk imports as
+products are written and warmed from ``db.products`` at startup.
+"""
+import math
+import re
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from selection import parse_price
+
+SEARCH_PROJECTION = {
+    "_id": 0, "asin": 1, "title": 1, "category": 1, "price": 1, "price_value": 1, "rating": 1, "fetched_at": 1,
+}
+SORTS = ("newest", "price", "-price", "rating")
+# Unlike hashtag keywords, short tokens ("tv", "4k") and words like "pro" or "black" are searchable
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Split text into unique, lowercase search tokens, preserving order"""
+    if not text:
+        return []
+    return list(dict.fromkeys(TOKEN_RE.findall(text.lower())))
+
+
+def _timestamp(value) -> float:
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return math.nan
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    return math.nan
+
+
+class _Column:
+    """Append-only NumPy array with amortized doubling"""
+
+    def __init__(self, dtype, fill=0):
+        self.data = np.full(1024, fill, dtype=dtype)
+        self.fill = fill
+        self.size = 0
+
+    def _reserve(self, size: int):
+        if size > len(self.data):
+            grown = np.full(max(size, len(self.data) * 2), self.fill, dtype=self.data.dtype)
+            grown[:self.size] = self.data[:self.size]
+            self.data = grown
+
+    def append(self, value):
+        self._reserve(self.size + 1)
+        self.data[self.size] = value
+        self.size += 1
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self.data.dtype)
+        self._reserve(self.size + len(values))
+        self.data[self.size:self.size + len(values)] = values
+        self.size += len(values)
+
+    def view(self) -> np.ndarray:
+        return self.data[:self.size]
+
+
+class ProductSearchIndex:
+    """Title keyword + numeric range index over the product catalog"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rows: Dict[str, int] = {}
+        self._asins: List[str] = []
+        self._titles: List[str] = []
+        self._price = _Column(np.float32, np.nan)
+        self._rating = _Column(np.float32, np.nan)
+        self._fetched_at = _Column(np.float64, np.nan)
+        self._category = _Column(np.int32, -1)
+        self._alive = _Column(np.bool_, False)
+        self._categories: Dict[str, int] = {}
+        self._postings: Dict[str, _Column] = {}
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _category_code(self, category: Optional[str]) -> int:
+        key = (category or "").strip().lower()
+        return self._categories.setdefault(key, len(self._categories))
+
+    def add(self, asin: str, title: str, category: Optional[str] = None, price: Optional[float] = None,
+            rating: Optional[float] = None, fetched_at=None):
+        """Insert or update one product"""
+        if not asin:
+            return
+        title = title or ""
+        price = math.nan if price is None else price
+        rating = math.nan if rating is None else rating
+        fetched = _timestamp(fetched_at) if fetched_at is not None else datetime.now(timezone.utc).timestamp()
+        with self._lock:
+            row = self._rows.get(asin)
+            if row is None:
+                row = len(self._asins)
+                self._rows[asin] = row
+                self._asins.append(asin)
+                self._titles.append(title)
+                self._price.append(price)
+                self._rating.append(rating)
+                self._fetched_at.append(fetched)
+                self._category.append(self._category_code(category))
+                self._alive.append(True)
+                for token in tokenize(title):
+                    self._postings.setdefault(token, _Column(np.int32)).append(row)
+                return
+            if title != self._titles[row]:
+                self._retitle(row, title)
+            self._price.data[row] = price
+            self._rating.data[row] = rating
+            self._fetched_at.data[row] = fetched
+            self._category.data[row] = self._category_code(category)
+            self._alive.data[row] = True
+
+    def _retitle(self, row: int, title: str):
+        # Rare: rebuild the affected postings so they stay sorted
+        old, new = set(tokenize(self._titles[row])), set(tokenize(title))
+        for token in old - new:
+            postings = self._postings[token]
+            kept = postings.view()[postings.view() != row]
+            postings.data[:len(kept)] = kept
+            postings.size = len(kept)
+        for token in new - old:
+            postings = self._postings.setdefault(token, _Column(np.int32))
+            postings.append(row)
+            ids = postings.view()
+            ids.sort()
+        self._titles[row] = title
+
+    def add_documents(self, docs: Iterable[Dict]):
+        """Insert or update products from documents; new rows are appended in bulk"""
+        new = {}
+        for doc in docs:
+            asin = doc.get('asin')
+            if not asin:
+                continue
+            price = doc.get('price_value')
+            if price is None:
+                price = parse_price(doc.get('price'))
+            if asin in self._rows:
+                self.add(asin, doc.get('title'), doc.get('category'), price, doc.get('rating'), doc.get('fetched_at'))
+            else:
+                new[asin] = (doc.get('title') or "", doc.get('category'), price, doc.get('rating'), doc.get('fetched_at'))
+        if new:
+            self._append_rows(new)
+
+    def _append_rows(self, new: Dict[str, Tuple]):
+        now = datetime.now(timezone.utc).timestamp()
+        with self._lock:
+            # Another writer may have added some of these since add_documents looked
+            raced = {asin: new.pop(asin) for asin in [asin for asin in new if asin in self._rows]}
+            first = len(self._asins)
+            token_rows: Dict[str, List[int]] = {}
+            for row, (asin, (title, _, _, _, _)) in enumerate(new.items(), start=first):
+                self._rows[asin] = row
+                self._asins.append(asin)
+                self._titles.append(title)
+                for token in tokenize(title):
+                    token_rows.setdefault(token, []).append(row)
+            values = list(new.values())
+            self._price.extend([math.nan if v[2] is None else v[2] for v in values])
+            self._rating.extend([math.nan if v[3] is None else v[3] for v in values])
+            self._fetched_at.extend([now if v[4] is None else _timestamp(v[4]) for v in values])
+            self._category.extend([self._category_code(v[1]) for v in values])
+            self._alive.extend(np.ones(len(values), dtype=np.bool_))
+            for token, rows in token_rows.items():
+                self._postings.setdefault(token, _Column(np.int32)).extend(rows)
+        for asin, (title, category, price, rating, fetched_at) in raced.items():
+            self.add(asin, title, category, price, rating, fetched_at)
+
+    def remove(self, asins: Iterable[str]):
+        """Hide products from results (e.g. after archival)"""
+        with self._lock:
+            for asin in asins:
+                row = self._rows.get(asin)
+                if row is not None:
+                    self._alive.data[row] = False
+
+    async def warm(self, db, batch_size: int = 10000) -> int:
+        cursor = db.products.find({}, SEARCH_PROJECTION).batch_size(batch_size)
+        batch = []
+        async for doc in cursor:
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                self.add_documents(batch)
+                batch = []
+        self.add_documents(batch)
+        return len(self)
+
+    def _keyword_rows(self, tokens: List[str]) -> np.ndarray:
+        postings = [self._postings.get(token) for token in tokens]
+        if any(p is None for p in postings):
+            return np.empty(0, dtype=np.int32)
+        postings.sort(key=lambda p: p.size)
+        rows = postings[0].view()
+        for other in postings[1:]:
+            ids = other.view()
+            if not len(rows):
+                break
+            positions = np.minimum(np.searchsorted(ids, rows), len(ids) - 1)
+            rows = rows[ids[positions] == rows]
+        return rows
+
+    def search(self, q: Optional[str] = None, category: Optional[str] = None,
+               min_rating: Optional[float] = None, min_price: Optional[float] = None,
+               max_price: Optional[float] = None, sort: str = "newest",
+               offset: int = 0, limit: int = 20) -> Tuple[int, List[str]]:
+        """Return (total matches, ASINs of the requested page)"""
+        with self._lock:
+            tokens = tokenize(q)
+            if q and q.strip() and not tokens:
+                # Only punctuation: nothing can match, rather than no keyword filter
+                return 0, []
+            if tokens:
+                rows = self._keyword_rows(tokens)
+                alive = self._alive.data[rows]
+            else:
+                rows = None
+                alive = self._alive.view()
+
+            mask = alive.copy()
+            if category:
+                code = self._categories.get(category.strip().lower())
+                if code is None:
+                    return 0, []
+                mask &= self._column(self._category, rows) == code
+            if min_rating is not None:
+                mask &= self._column(self._rating, rows) >= min_rating
+            if min_price is not None or max_price is not None:
+                price = self._column(self._price, rows)
+                with np.errstate(invalid="ignore"):
+                    if min_price is not None:
+                        mask &= price >= min_price
+                    if max_price is not None:
+                        mask &= price <= max_price
+            matches = np.flatnonzero(mask) if rows is None else rows[mask]
+            total = len(matches)
+            if offset >= total or limit <= 0:
+                return total, []
+
+            keys = self._sort_keys(sort, matches)
+            end = min(offset + limit, total)
+            if end < total:
+                # Keep every row tied with the end-th key, then break ties by row id, so
+                # consecutive pages agree on the order instead of partitioning ties arbitrarily
+                kth = np.partition(keys, end - 1)[end - 1]
+                top = np.flatnonzero(keys <= kth)
+                top = top[np.lexsort((matches[top], keys[top]))][:end]
+            else:
+                top = np.lexsort((matches, keys))
+            return total, [self._asins[row] for row in matches[top[offset:end]]]
+
+    @staticmethod
+    def _column(column: _Column, rows: Optional[np.ndarray]) -> np.ndarray:
+        return column.view() if rows is None else column.data[rows]
+
+    def _sort_keys(self, sort: str, rows: np.ndarray) -> np.ndarray:
+        """Ascending keys; missing values sort last"""
+        if sort == "price":
+            keys = self._price.data[rows].astype(np.float64)
+        elif sort == "-price":
+            keys = -self._price.data[rows].astype(np.float64)
+        elif sort == "rating":
+            keys = -self._rating.data[rows].astype(np.float64)
+        else:
+            keys = -self._fetched_at.data[rows]
+        return np.nan_to_num(keys, nan=np.inf)
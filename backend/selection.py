@@ -0,0 +1,280 @@
+"""Vectorized product scoring and top-k selection over the stored catalog.
+
+The catalog is loaded from a compact projection of ``db.products`` into
+column arrays, scored in a single NumPy pass and reduced to the top-k with
+``argpartition``, so selection cost stays linear in catalog size.
+
+Building the arrays dominates (about a second per million products), so the
+last loaded catalog is kept by ``CatalogCache`` and reused until the caller's
+``products`` data version changes or ``CATALOG_CACHE_TTL`` seconds pass; the
+TTL bounds how long writes made by other processes go unseen. Cached arrays
+are shared between callers and must be treated as read-only; a posting run
+loads the catalog once and gives each tenant ``merged`` with the products it
+has just fetched.
+
+Products carry the tenants whose searches (or imports) brought them in, in
+``tenants``; ``candidates`` limits a tenant's selection to those. Products
+stored before tenants were recorded belong to the ``None`` tenant.
+"""
+import math
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+from pydantic import BaseModel
+
+CATALOG_CACHE_TTL = float(os.environ.get('CATALOG_CACHE_TTL', 300))
+
+PRICE_RE = re.compile(r"\d[\d,]*(?:\.\d+)?")
+
+CATALOG_PROJECTION = {
+    "_id": 0, "asin": 1, "rating": 1, "reviews_count": 1,
+    "price": 1, "price_value": 1, "category": 1, "fetched_at": 1, "tenants": 1,
+}
+
+
+class SelectionWeights(BaseModel):
+    rating: float = 1.0
+    reviews: float = 1.0
+    price: float = 0.5
+    recency: float = 0.5
+    diversity: float = 0.25        # penalty per higher-ranked product in the same category
+    target_price: float = 30.0
+    price_tolerance: float = 1.0   # width of the price preference, in natural-log units
+    recency_half_life_days: float = 14.0
+
+
+def parse_price(raw: Optional[str]) -> Optional[float]:
+    """Parse a display price such as "$1,299.99" into a float"""
+    if raw is None:
+        return None
+    if isinstance(raw, (int, float)):
+        return float(raw)
+    match = PRICE_RE.search(raw)
+    if not match:
+        return None
+    try:
+        return float(match.group().replace(",", ""))
+    except ValueError:
+        return None
+
+
+def _timestamp(value) -> float:
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    if isinstance(value, str):
+        try:
+            return _timestamp(datetime.fromisoformat(value))
+        except ValueError:
+            return math.nan
+    return math.nan
+
+
+class Catalog:
+    """Column arrays for every candidate product"""
+
+    def __init__(self, asins: List[str], rating: np.ndarray, reviews: np.ndarray,
+                 price: np.ndarray, fetched_at: np.ndarray, category: np.ndarray,
+                 categories: List[str], owners: Optional[Dict[Optional[str], np.ndarray]] = None):
+        self.asins = asins
+        self.rating = rating
+        self.reviews = reviews
+        self.price = price
+        self.fetched_at = fetched_at    # epoch seconds, NaN if unknown
+        self.category = category        # int codes into ``categories``
+        self.categories = categories
+        self.owners = owners or {}      # tenant -> row indices of its products
+        self._rows: Optional[Dict[str, int]] = None
+
+    def __len__(self) -> int:
+        return len(self.asins)
+
+    def candidates(self, tenant: Optional[str]) -> np.ndarray:
+        """Boolean mask of the products tenant may select"""
+        mask = np.zeros(len(self), dtype=bool)
+        rows = self.owners.get(tenant)
+        if rows is not None:
+            mask[rows] = True
+        return mask
+
+    def merged(self, docs, tenant: Optional[str]) -> "Catalog":
+        """A copy with docs added for tenant; rows of ASINs already present are updated in place"""
+        extra = Catalog.from_documents(docs)
+        if not len(extra):
+            return self
+        if self._rows is None:
+            self._rows = {asin: row for row, asin in enumerate(self.asins)}
+        codes = {name: code for code, name in enumerate(self.categories)}
+        categories = list(self.categories)
+        for name in extra.categories:
+            if name not in codes:
+                codes[name] = len(categories)
+                categories.append(name)
+        category = np.asarray([codes[name] for name in extra.categories], dtype=np.int32)[extra.category]
+
+        rows = np.empty(len(extra), dtype=np.int64)
+        asins = self.asins
+        new_rows = []
+        for index, asin in enumerate(extra.asins):
+            row = self._rows.get(asin)
+            if row is None:
+                row = len(self) + len(new_rows)
+                new_rows.append(index)
+            rows[index] = row
+        if new_rows:
+            asins = asins + [extra.asins[index] for index in new_rows]
+
+        def column(base: np.ndarray, values: np.ndarray) -> np.ndarray:
+            out = np.concatenate([base, values[new_rows]])
+            out[rows] = values
+            return out
+
+        owners = dict(self.owners)
+        owners[tenant] = np.concatenate([owners.get(tenant, np.empty(0, dtype=np.int64)), rows])
+        return Catalog(
+            asins,
+            column(self.rating, extra.rating),
+            column(self.reviews, extra.reviews),
+            column(self.price, extra.price),
+            column(self.fetched_at, extra.fetched_at),
+            column(self.category, category),
+            categories,
+            owners,
+        )
+
+    @classmethod
+    def from_documents(cls, docs) -> "Catalog":
+        asins, rating, reviews, price, fetched_at, category = [], [], [], [], [], []
+        category_codes: Dict[str, int] = {}
+        owners: Dict[Optional[str], List[int]] = {}
+        for doc in docs:
+            asin = doc.get('asin')
+            if not asin:
+                continue
+            for tenant in doc.get('tenants') or (None,):
+                owners.setdefault(tenant, []).append(len(asins))
+            asins.append(asin)
+            rating.append(doc.get('rating') or 0.0)
+            reviews.append(doc.get('reviews_count') or 0)
+            value = doc.get('price_value')
+            if value is None:
+                value = parse_price(doc.get('price'))
+            price.append(math.nan if value is None else value)
+            fetched_at.append(_timestamp(doc.get('fetched_at')))
+            category.append(category_codes.setdefault(doc.get('category') or "", len(category_codes)))
+        return cls(
+            asins,
+            np.asarray(rating, dtype=np.float32),
+            np.asarray(reviews, dtype=np.float32),
+            np.asarray(price, dtype=np.float32),
+            np.asarray(fetched_at, dtype=np.float64),
+            np.asarray(category, dtype=np.int32),
+            list(category_codes),
+            {tenant: np.asarray(rows, dtype=np.int64) for tenant, rows in owners.items()},
+        )
+
+
+async def load_catalog(db, query: Optional[dict] = None, batch_size: int = 10000) -> Catalog:
+    """Load the candidate catalog from db.products using a compact projection"""
+    cursor = db.products.find(query or {}, CATALOG_PROJECTION).batch_size(batch_size)
+    return Catalog.from_documents([doc async for doc in cursor])
+
+
+class CatalogCache:
+    """Last loaded catalog, reused until the products version changes or it ages out"""
+
+    def __init__(self, ttl: float = CATALOG_CACHE_TTL):
+        self.ttl = ttl
+        self.loads = 0
+        self._lock = threading.Lock()
+        self._key = None
+        self._loaded_at = 0.0
+        self._catalog: Optional[Catalog] = None
+
+    async def get(self, db, version, query: Optional[dict] = None) -> Catalog:
+        """Catalog for query as of data version ``version``, loading it if the cached one is stale"""
+        key = (version, repr(sorted((query or {}).items())))
+        with self._lock:
+            if self._key == key and time.monotonic() - self._loaded_at < self.ttl:
+                return self._catalog
+        # The version is read before loading, so a write during the load forces the next reload
+        loaded_at = time.monotonic()
+        catalog = await load_catalog(db, query)
+        with self._lock:
+            self.loads += 1
+            if loaded_at >= self._loaded_at:
+                self._key, self._loaded_at, self._catalog = key, loaded_at, catalog
+        return catalog
+
+    def invalidate(self):
+        with self._lock:
+            self._key = None
+            self._catalog = None
+
+
+def score_catalog(catalog: Catalog, weights: SelectionWeights, now: Optional[float] = None) -> np.ndarray:
+    """Score every product; higher is better. Diversity is applied in select_top_k"""
+    if now is None:
+        now = datetime.now(timezone.utc).timestamp()
+
+    rating = np.clip(catalog.rating, 0, 5) / 5.0
+
+    reviews = np.log1p(np.maximum(catalog.reviews, 0))
+    top_reviews = reviews.max() if len(reviews) else 0.0
+    if top_reviews > 0:
+        reviews /= top_reviews
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        distance = np.log(catalog.price / weights.target_price) / max(weights.price_tolerance, 1e-6)
+    price = np.nan_to_num(np.exp(-0.5 * distance * distance), nan=0.0)
+
+    age_days = np.maximum(now - catalog.fetched_at, 0) / 86400.0
+    recency = np.exp2(-age_days / max(weights.recency_half_life_days, 1e-6))
+    recency = np.nan_to_num(recency, nan=0.0)
+
+    return (weights.rating * rating
+            + weights.reviews * reviews
+            + weights.price * price
+            + weights.recency * recency).astype(np.float32)
+
+
+def select_top_k(catalog: Catalog, k: int, weights: Optional[SelectionWeights] = None,
+                 exclude: Optional[np.ndarray] = None, now: Optional[float] = None) -> List[str]:
+    """Return the ASINs of the k best products, best first.
+
+    Category diversity is applied in the same pass: each product loses
+    ``weights.diversity`` for every better-scored product in its category.
+    ``exclude`` is an optional boolean mask of products that must not be picked.
+    """
+    n = len(catalog)
+    if k <= 0 or n == 0:
+        return []
+    weights = weights or SelectionWeights()
+    scores = score_catalog(catalog, weights, now)
+
+    if weights.diversity:
+        # Rank each product within its category (0 = best) and penalize by rank
+        order = np.lexsort((-scores, catalog.category))
+        sorted_category = catalog.category[order]
+        group_start = np.searchsorted(sorted_category, sorted_category, side="left")
+        rank = np.empty(n, dtype=np.float32)
+        rank[order] = np.arange(n) - group_start
+        scores = scores - weights.diversity * rank
+
+    if exclude is not None:
+        scores = np.where(exclude, -np.inf, scores)
+        available = int(n - np.count_nonzero(exclude))
+        k = min(k, available)
+        if k <= 0:
+            return []
+
+    k = min(k, n)
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top], kind="stable")]
+    return [catalog.asins[i] for i in top]
@@ -1,39 +1,165 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Request, Response, status
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.staticfiles import StaticFiles
 import os
 import logging
+import time
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict
+from pydantic import BaseModel, Field, ConfigDict, TypeAdapter, ValidationError
 from typing import List, Optional, Dict, Any
 import uuid
 from datetime import datetime, timezone, timedelta
 import jwt
-from passlib.context import CryptContext
-import httpx
-from apscheduler.schedulers.background import BackgroundScheduler
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
+from catalog_refresh import CatalogRefresher
+from events import EventBroadcaster, StreamTickets
+from exports import FORMATS as EXPORT_FORMATS, columns_for, date_range_filter, stream_export
+from contextlib import contextmanager
+from functools import partial
+from hashtags import HashtagIndex
+from jobs import MAX_ACTIVE_RUNS, JobQueueFull, JobRunner
+from lazy import LazyResource
+from logs import RequestIdMiddleware, configure_logging
+from post_history import PostHistory
+from profiling import Profiler, ProfilingMiddleware
+from product_import import ROW_PARSERS as IMPORT_FORMATS, import_products
+from redirects import ShortLinks
+from retention import Archiver
+from search import SORTS as SEARCH_SORTS, ProductSearchIndex
+from selection import Catalog, CatalogCache, SelectionWeights, parse_price, select_top_k
+from tenants import FairScheduler, SharedFetchCache
+from versions import DataVersions, etag_matches
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# "eager" warms caches in startup_event before serving; "lazy" serves immediately and
+# warms in the background. Heavy clients are created on first use in both modes.
+STARTUP_MODE = os.environ.get('STARTUP_MODE', 'eager').lower()
+
+def _create_mongo_client():
+    from motor.motor_asyncio import AsyncIOMotorClient
+    return AsyncIOMotorClient(os.environ['MONGO_URL'], event_listeners=[pool_monitor.get()], **pool_monitor.options)
+
+def _create_reporting_db():
+    from mongo_pool import reporting_read_preference
+    return client.get().get_database(os.environ['DB_NAME'], read_preference=reporting_read_preference())
+
+def _create_pool_monitor():
+    from mongo_pool import PoolMonitor, pool_options
+    return PoolMonitor(pool_options())
+
+def _create_pwd_context():
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+def _create_scheduler():
+    from apscheduler.schedulers.background import BackgroundScheduler
+    jobstores = {}
+    if SCHEDULER_JOBSTORE == "mongo":
+        from apscheduler.jobstores.mongodb import MongoDBJobStore
+        # Shares the Motor client's underlying pymongo client and connection pool
+        jobstores["default"] = MongoDBJobStore(
+            database=os.environ['DB_NAME'], collection="scheduler_jobs", client=client.get().delegate
+        )
+    return BackgroundScheduler(jobstores=jobstores, job_defaults=scheduler_job_defaults())
+
+def _create_media_cache():
+    from media import MediaCache
+    return MediaCache(
+        MEDIA_CACHE_DIR,
+        public_base_url=f"{PUBLIC_BASE_URL}/api/media" if PUBLIC_BASE_URL else None
+    )
+
+# MongoDB connection (created on first use)
+pool_monitor = LazyResource(_create_pool_monitor, "pool_monitor")
+client = LazyResource(_create_mongo_client, "mongo_client")
+db = LazyResource(lambda: client.get()[os.environ['DB_NAME']], "db")
+# Dashboard reads (lists, analytics, exports); may be routed to secondaries
+reporting_db = LazyResource(_create_reporting_db, "reporting_db")
+
+# Per-endpoint Mongo time budgets in milliseconds, overridable as QUERY_BUDGET_<NAME>_MS;
+# an overrun answers 503 instead of holding a pooled connection
+QUERY_BUDGETS_MS = {
+    name: int(os.environ.get(f'QUERY_BUDGET_{name.upper()}_MS', default))
+    for name, default in (("list", 2000), ("search", 1000), ("analytics", 3000), ("export", 300000))
+}
+QUERY_RETRY_AFTER_SECONDS = 2
 
 # Security
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = LazyResource(_create_pwd_context, "pwd_context")
 security = HTTPBearer()
 SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'your-secret-key-change-in-production')
 ALGORITHM = "HS256"
 
-# Scheduler
-scheduler = BackgroundScheduler()
-executor = ThreadPoolExecutor(max_workers=3)
+# Scheduler. Jobs and their next run times live in db.scheduler_jobs so restarts resume the
+# schedule; "memory" restores the old reset-on-restart behaviour. Only one process may run
+# the scheduler against a given job store.
+SCHEDULER_JOBSTORE = os.environ.get('SCHEDULER_JOBSTORE', 'mongo').lower()
+# A tick missed by more than this (e.g. while deployed) is skipped; with coalescing,
+# any number of missed ticks inside the grace window collapse into one catch-up run
+SCHEDULER_MISFIRE_GRACE_SECONDS = int(os.environ.get('SCHEDULER_MISFIRE_GRACE_SECONDS', 3600))
+SCHEDULER_COALESCE = os.environ.get('SCHEDULER_COALESCE', 'true').lower() in ('1', 'true', 'yes')
+scheduler = LazyResource(_create_scheduler, "scheduler")
+executor = LazyResource(lambda: ThreadPoolExecutor(max_workers=MAX_ACTIVE_RUNS), "executor")
+# Admin-triggered and slow-request sampling profiles (see profiling.py); a slow-request
+# threshold of 0 disables automatic capture
+profiler = Profiler(slow_request_ms=float(os.environ.get('PROFILE_SLOW_REQUEST_MS', 0)))
+# Single-flight front of the executor shared by scheduled and manual triggers
+job_runner = JobRunner(executor, profiler=profiler)
+
+# Hashtag keyword index, warmed from db.products at startup and fed by each job run
+hashtag_index = HashtagIndex()
+
+# Keyword/price/rating search over products, kept in sync with every product write
+product_search = ProductSearchIndex()
+
+# Recent (platform, asin) posts used to enforce per-product cooldowns
+post_history = PostHistory()
+
+# Stalest-first refresh of known products. Each tick spends at most
+# REFRESH_REQUESTS_PER_TICK RapidAPI lookups of RAPIDAPI_LOOKUP_BATCH ASINs each, so upstream
+# calls per hour stay flat as the catalog grows (see catalog_refresh.py)
+REFRESH_REQUESTS_PER_TICK = int(os.environ.get('REFRESH_REQUESTS_PER_TICK', 20))
+REFRESH_INTERVAL_MINUTES = int(os.environ.get('REFRESH_INTERVAL_MINUTES', 15))
+RAPIDAPI_LOOKUP_BATCH = int(os.environ.get('RAPIDAPI_LOOKUP_BATCH', 10))
+catalog_refresher = CatalogRefresher()
+
+# Serialize list endpoints with orjson straight from the Mongo documents instead of
+# converting them for FastAPI's generic encoder
+FAST_JSON = os.environ.get('FAST_JSON', 'false').lower() in ('1', 'true', 'yes')
+# Responses smaller than this are not worth gzipping
+GZIP_MINIMUM_SIZE = 1024
+
+# Public origin of this backend, used for media and short-link URLs handed to platforms
+PUBLIC_BASE_URL = os.environ.get('PUBLIC_BASE_URL', '').rstrip('/')
+
+# Validated product images, served from /api/media
+MEDIA_CACHE_DIR = Path(os.environ.get('MEDIA_CACHE_DIR', ROOT_DIR / 'media_cache'))
+media_cache = LazyResource(_create_media_cache, "media_cache")
+
+# Change counters behind the dashboard endpoints' ETags; bumped after every write
+data_versions = DataVersions()
+
+# Selection arrays for the stored catalog, rebuilt only after product writes (see selection.py)
+catalog_cache = CatalogCache()
+
+# Job lifecycle/progress events streamed to dashboards from /api/events, which browsers
+# open with a single-use ticket rather than their JWT
+events = EventBroadcaster()
+stream_tickets = StreamTickets()
+
+# Cold posts/products are moved to compressed files here by the retention job
+ARCHIVE_DIR = Path(os.environ.get('ARCHIVE_DIR', ROOT_DIR / 'archive'))
+archiver = Archiver(ARCHIVE_DIR)
+
+# Tracked affiliate short links served from /api/r/{code}
+short_links = ShortLinks(on_flush=lambda clicks: data_versions.bump("posts", "analytics"))
 
 # Create the main app
 app = FastAPI()
@@ -66,6 +192,7 @@ class Token(BaseModel):
 class IntegrationConfig(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    admin_username: Optional[str] = None
     rapidapi_key: Optional[str] = None
     rapidapi_host: Optional[str] = "amazon23.p.rapidapi.com"
     amazon_affiliate_tag: Optional[str] = None
@@ -80,10 +207,14 @@ class IntegrationConfig(BaseModel):
 class SchedulerConfig(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    admin_username: Optional[str] = None
     is_active: bool = False
     posts_per_day: int = 3
     post_times: List[str] = ["09:00", "14:00", "19:00"]
     platforms: List[str] = ["instagram"]
+    search_queries: List[str] = ["best sellers"]
+    cooldown_days: int = 7
+    selection_weights: SelectionWeights = Field(default_factory=SelectionWeights)
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class Product(BaseModel):
@@ -93,25 +224,33 @@ class Product(BaseModel):
     title: str
     description: Optional[str] = None
     price: Optional[str] = None
+    price_value: Optional[float] = None
     image_url: Optional[str] = None
     product_url: str
     affiliate_url: Optional[str] = None
     rating: Optional[float] = None
     reviews_count: Optional[int] = None
     category: Optional[str] = None
+    media_hash: Optional[str] = None
+    media_error: Optional[str] = None
     fetched_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class Post(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    admin_username: Optional[str] = None
     product_id: str
+    product_asin: Optional[str] = None
     product_title: str
     product_image: str
+    media_url: Optional[str] = None
+    affiliate_url: Optional[str] = None
     caption: str
     hashtags: str
     platform: str
     status: str = "pending"  # pending, posted, failed
     platform_post_id: Optional[str] = None
+    short_code: Optional[str] = None
     error_message: Optional[str] = None
     scheduled_at: datetime
     posted_at: Optional[datetime] = None
@@ -120,6 +259,7 @@ class Post(BaseModel):
 class Analytics(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    admin_username: Optional[str] = None
     date: str
     total_posts: int = 0
     instagram_posts: int = 0
@@ -129,10 +269,73 @@ class Analytics(BaseModel):
     failed_posts: int = 0
     clicks: int = 0
     impressions: int = 0
+    link_clicks: int = 0
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 # ============= Helper Functions =============
 
+# Validates a whole upstream result set in one call instead of one model per item
+PRODUCT_LIST_ADAPTER = TypeAdapter(List[Product])
+
+# Fields clients may request with fields= on the list endpoints
+PRODUCT_FIELDS = set(Product.model_fields)
+POST_FIELDS = set(Post.model_fields) | {"link_clicks", "insights_clicks", "insights_impressions"}
+
+# Export columns: model fields plus counters maintained by the collectors
+# Affiliate URLs are per tenant and exported with the posts
+PRODUCT_EXPORT_COLUMNS = [column for column in columns_for(Product) if column[0] != "affiliate_url"]
+POST_EXPORT_COLUMNS = columns_for(
+    Post, {"link_clicks": "int64", "insights_clicks": "int64", "insights_impressions": "int64"}
+)
+ANALYTICS_EXPORT_COLUMNS = columns_for(Analytics)
+
+# collection -> (columns, date field used by start/end)
+EXPORTS = {
+    "posts": (POST_EXPORT_COLUMNS, "created_at"),
+    "products": (PRODUCT_EXPORT_COLUMNS, "fetched_at"),
+    "analytics": (ANALYTICS_EXPORT_COLUMNS, "date"),
+}
+
+# Where each collection records its tenant; a product belongs to every tenant that fetched or imported it
+TENANT_FIELDS = {"posts": "admin_username", "analytics": "admin_username", "products": "tenants"}
+
+def tenant_filter(collection: str, username: Optional[str]) -> Dict[str, Any]:
+    """Query matching one tenant's documents in collection"""
+    return {TENANT_FIELDS[collection]: username}
+
+def to_document(model: BaseModel) -> Dict[str, Any]:
+    """Dump a model for Mongo, storing top-level datetimes as ISO strings"""
+    doc = model.model_dump()
+    for key, value in doc.items():
+        if isinstance(value, datetime):
+            doc[key] = value.isoformat()
+    return doc
+
+def product_documents(products: List[Product]) -> List[Dict[str, Any]]:
+    """Dump products for Mongo in one adapter call"""
+    docs = PRODUCT_LIST_ADAPTER.dump_python(products)
+    for doc in docs:
+        doc['fetched_at'] = doc['fetched_at'].isoformat()
+    return docs
+
+def new_ids(count: int) -> List[str]:
+    """Random (version 4) UUID strings from a single urandom call"""
+    raw = os.urandom(16 * count)
+    return [str(uuid.UUID(bytes=raw[i:i + 16], version=4)) for i in range(0, 16 * count, 16)]
+
+def list_projection(fields: Optional[str], allowed: set) -> Dict[str, int]:
+    """Build a Mongo projection from a comma-separated fields= parameter"""
+    projection = {"_id": 0}
+    if not fields:
+        return projection
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = sorted(set(requested) - allowed)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    projection["id"] = 1
+    projection.update({field: 1 for field in requested})
+    return projection
+
 def create_access_token(data: dict, expires_delta: timedelta = timedelta(days=7)):
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + expires_delta
@@ -141,8 +344,11 @@ def create_access_token(data: dict, expires_delta: timedelta = timedelta(days=7)
     return encoded_jwt
 
 async def get_current_admin(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    return decode_admin_token(credentials.credentials)
+
+def decode_admin_token(token: str) -> str:
+    """Return the admin username from a JWT, raising 401 if it is invalid"""
     try:
-        token = credentials.credentials
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
@@ -153,169 +359,361 @@ async def get_current_admin(credentials: HTTPAuthorizationCredentials = Depends(
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-async def fetch_amazon_products(rapidapi_key: str, rapidapi_host: str):
-    """Fetch top selling products from Amazon via RapidAPI"""
+def etag_headers(etag: str) -> Dict[str, str]:
+    # no-cache lets browsers keep the body but revalidate it on every poll
+    return {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+def conditional_get(*collections: str, daily: bool = False):
+    """Dependency that answers 304 before any query when the client's ETag is current"""
+    async def check(request: Request, response: Response, username: str = Depends(get_current_admin)) -> str:
+        # Responses are scoped to the caller's tenant
+        variant = f"{username}|{request.url.query}"
+        if daily:
+            variant += datetime.now(timezone.utc).strftime("|%Y-%m-%d")
+        etag = data_versions.etag(collections, variant)
+        if etag_matches(request.headers.get("if-none-match", ""), etag):
+            raise HTTPException(status_code=304, headers=etag_headers(etag))
+        response.headers.update(etag_headers(etag))
+        return etag
+    return Depends(check)
+
+@contextmanager
+def query_budget(name: str):
+    """Bound every Mongo call in the block by the endpoint's budget; overruns become a 503"""
+    import pymongo
+    from pymongo.errors import PyMongoError
+    # Motor runs operations in threads with a copy of our context, so the deadline follows them
+    with pymongo.timeout(QUERY_BUDGETS_MS[name] / 1000):
+        try:
+            yield
+        except PyMongoError as e:
+            if not e.timeout:
+                raise
+            logging.warning("Mongo budget '%s' exceeded: %s", name, e)
+            raise HTTPException(
+                status_code=503,
+                detail="Database busy, try again shortly",
+                headers={"Retry-After": str(QUERY_RETRY_AFTER_SECONDS)}
+            )
+
+def rapidapi_product_row(item: dict) -> dict:
+    """Map a RapidAPI search result onto Product fields"""
+    price = (item.get('price') or {}).get('raw', '')
+    return {
+        "asin": item.get('asin', ''),
+        "title": item.get('title', ''),
+        "description": item.get('description', ''),
+        "price": price,
+        "price_value": parse_price(price),
+        "image_url": item.get('image', ''),
+        "product_url": item.get('url', ''),
+        "rating": item.get('rating', 0),
+        "reviews_count": item.get('reviews_count', 0),
+        "category": item.get('category', '')
+    }
+
+def validate_products(rows: List[dict]) -> List[Product]:
+    """Validate upstream rows with one adapter call; invalid rows are dropped, not the batch"""
+    # Filled here once per batch; the per-row uuid4()/now() default factories cost more
+    # than validating every field
+    now = datetime.now(timezone.utc)
+    for row, product_id in zip(rows, new_ids(len(rows))):
+        row.setdefault('id', product_id)
+        row.setdefault('fetched_at', now)
     try:
-        url = f"https://{rapidapi_host}/product-search"
-        headers = {
-            "X-RapidAPI-Key": rapidapi_key,
-            "X-RapidAPI-Host": rapidapi_host
-        }
-        params = {
-            "query": "best sellers",
-            "page": "1"
-        }
-        
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.get(url, headers=headers, params=params)
-            
-            if response.status_code == 200:
-                data = response.json()
-                products = []
-                
-                results = data.get('results', [])
-                for item in results[:10]:  # Get top 10
-                    product = Product(
-                        asin=item.get('asin', ''),
-                        title=item.get('title', ''),
-                        description=item.get('description', ''),
-                        price=item.get('price', {}).get('raw', ''),
-                        image_url=item.get('image', ''),
-                        product_url=item.get('url', ''),
-                        rating=item.get('rating', 0),
-                        reviews_count=item.get('reviews_count', 0),
-                        category=item.get('category', '')
-                    )
-                    products.append(product)
-                
-                return products
-            else:
-                logging.error(f"RapidAPI error: {response.status_code} - {response.text}")
-                return []
-    except Exception as e:
-        logging.error(f"Error fetching Amazon products: {str(e)}")
-        return []
+        return PRODUCT_LIST_ADAPTER.validate_python(rows)
+    except ValidationError as e:
+        invalid = {error['loc'][0] for error in e.errors()}
+        logging.warning("Dropped %s invalid products from upstream results: %s", len(invalid), e)
+        return PRODUCT_LIST_ADAPTER.validate_python([row for i, row in enumerate(rows) if i not in invalid])
+
+class RapidAPIError(Exception):
+    """Non-200 response from RapidAPI (bad key, quota, rate limit, upstream failure)"""
+
+    def __init__(self, status_code: int, text: str):
+        super().__init__(f"RapidAPI error: {status_code} - {text[:500]}")
+        self.status_code = status_code
+
+async def fetch_amazon_products(rapidapi_key: str, rapidapi_host: str, query: str = "best sellers"):
+    """Fetch top selling products from Amazon via RapidAPI; raises on any failure"""
+    from transport import http_client
+    url = f"https://{rapidapi_host}/product-search"
+    headers = {
+        "X-RapidAPI-Key": rapidapi_key,
+        "X-RapidAPI-Host": rapidapi_host
+    }
+    params = {
+        "query": query,
+        "page": "1"
+    }
+    
+    async with http_client(timeout=30.0) as client:
+        response = await client.get(url, headers=headers, params=params)
+    if response.status_code != 200:
+        raise RapidAPIError(response.status_code, response.text)
+    results = response.json().get('results', [])
+    return validate_products([rapidapi_product_row(item) for item in results[:10]])  # Get top 10
+
+async def lookup_amazon_products(rapidapi_key: str, rapidapi_host: str, asins: List[str]) -> List[Product]:
+    """Fetch current details for several ASINs in one RapidAPI request; raises on any failure"""
+    from transport import http_client
+    url = f"https://{rapidapi_host}/product-details"
+    headers = {
+        "X-RapidAPI-Key": rapidapi_key,
+        "X-RapidAPI-Host": rapidapi_host
+    }
+    # Comma-separated ASINs; with RAPIDAPI_LOOKUP_BATCH=1 this is a plain single lookup
+    params = {"asin": ",".join(asins)}
+    
+    async with http_client(timeout=30.0) as client:
+        response = await client.get(url, headers=headers, params=params)
+    if response.status_code != 200:
+        raise RapidAPIError(response.status_code, response.text)
+    results = response.json().get('results', [])
+    return validate_products([rapidapi_product_row(item) for item in results])
 
 async def post_to_instagram(access_token: str, user_id: str, image_url: str, caption: str):
     """Post to Instagram using Graph API"""
-    try:
-        # Step 1: Create container
-        container_url = f"https://graph.facebook.com/v18.0/{user_id}/media"
-        container_params = {
-            "image_url": image_url,
-            "caption": caption,
-            "access_token": access_token
-        }
-        
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            container_response = await client.post(container_url, data=container_params)
-            
-            if container_response.status_code != 200:
-                return {"success": False, "error": container_response.text}
-            
-            container_data = container_response.json()
-            creation_id = container_data.get('id')
-            
-            # Step 2: Publish container
-            publish_url = f"https://graph.facebook.com/v18.0/{user_id}/media_publish"
-            publish_params = {
-                "creation_id": creation_id,
-                "access_token": access_token
-            }
-            
-            publish_response = await client.post(publish_url, data=publish_params)
-            
-            if publish_response.status_code == 200:
-                publish_data = publish_response.json()
-                return {"success": True, "post_id": publish_data.get('id')}
-            else:
-                return {"success": False, "error": publish_response.text}
-                
-    except Exception as e:
-        logging.error(f"Instagram posting error: {str(e)}")
-        return {"success": False, "error": str(e)}
+    from instagram import publish_batch as instagram_publish_batch
+    results = await instagram_publish_batch(access_token, user_id, [(image_url, caption)])
+    return results[0]
 
 def generate_hashtags(title: str, category: str = "") -> str:
     """Generate relevant hashtags based on product title and category"""
-    base_hashtags = ["#AmazonFinds", "#BestDeals", "#Shopping", "#ProductReview", 
-                     "#AffiliateMarketing", "#OnlineShopping", "#DailyDeals", 
-                     "#BestSellers", "#TrendingNow", "#MustHave"]
-    return " ".join(base_hashtags[:10])
+    return " ".join(hashtag_index.tag(title, category))
 
-async def process_and_post_products():
-    """Background job to fetch products and create scheduled posts"""
-    try:
-        # Get integration config
-        config_doc = await db.integration_configs.find_one({}, {"_id": 0})
+def generate_hashtags_batch(items: List[tuple]) -> List[str]:
+    """Generate hashtags for many (title, category) pairs in one scoring pass"""
+    return [" ".join(tags) for tags in hashtag_index.tag_batch(items)]
+
+async def warm_hashtag_index(batch_size: int = 5000):
+    """Load known products into the hashtag index without re-reading indexed ASINs"""
+    cursor = db.products.find({}, {"_id": 0, "asin": 1, "title": 1, "category": 1}).batch_size(batch_size)
+    batch = []
+    async for doc in cursor:
+        batch.append((doc.get('asin'), doc.get('title', ''), doc.get('category')))
+        if len(batch) >= batch_size:
+            hashtag_index.add_products(batch)
+            batch = []
+    hashtag_index.add_products(batch)
+    logging.info("Hashtag index warmed with %s products", len(hashtag_index))
+
+async def load_active_tenants(only: Optional[str] = None) -> List[tuple]:
+    """Return (tenant, integration config, scheduler config) for every active scheduler, or only one tenant's"""
+    query = {"is_active": True}
+    if only is not None:
+        query["admin_username"] = only
+    scheduler_docs = await db.scheduler_configs.find(query, {"_id": 0}).to_list(None)
+    if not scheduler_docs:
+        return []
+    
+    # Configs written before multi-tenancy have no admin_username; they form the None tenant
+    tenant_names = [doc.get('admin_username') for doc in scheduler_docs]
+    config_docs = await db.integration_configs.find(
+        {"admin_username": {"$in": tenant_names}}, {"_id": 0}
+    ).to_list(None)
+    configs_by_tenant = {doc.get('admin_username'): doc for doc in config_docs}
+    
+    tenants = []
+    for scheduler_doc in scheduler_docs:
+        tenant = scheduler_doc.get('admin_username')
+        config_doc = configs_by_tenant.get(tenant)
         if not config_doc:
-            logging.warning("No integration config found")
-            return
-        
-        # Get scheduler config
-        scheduler_doc = await db.scheduler_configs.find_one({}, {"_id": 0})
-        if not scheduler_doc or not scheduler_doc.get('is_active'):
+            logging.warning("No integration config found for tenant %r", tenant)
+            continue
+        tenants.append((tenant, config_doc, scheduler_doc))
+    return tenants
+
+def publish_job_event(event: str, job_id: Optional[str], tenant: Optional[str] = None, **data):
+    """Stream a job event to the tenant's dashboards (all dashboards when tenant is None)"""
+    events.publish(event, {"job_id": job_id, "tenant": tenant, **data}, tenant=tenant)
+
+def post_summary(post_dict: dict) -> dict:
+    return {key: post_dict.get(key) for key in (
+        "id", "platform", "status", "product_asin", "product_title", "short_code", "error_message", "created_at"
+    )}
+
+async def process_and_post_products(job_id: Optional[str] = None, tenant: Optional[str] = None):
+    """Background job to fetch products and create scheduled posts for every active tenant (or just tenant)"""
+    job_id = job_id or str(uuid.uuid4())
+    started = time.monotonic()
+    publish_job_event("job.started", job_id, tenant, job="posting")
+    try:
+        tenants = await load_active_tenants(only=tenant)
+        if tenant is None:
+            # Tenants with a run of their own in flight are left to it
+            busy = {run.tenant for run in job_runner.active() if run.job == "posting" and run.tenant is not None}
+            tenants = [entry for entry in tenants if entry[0] not in busy]
+        if not tenants:
             logging.info("Scheduler is not active")
+            publish_job_event("job.finished", job_id, tenant, tenants=0, duration=time.monotonic() - started)
             return
         
+        # Loaded once and shared read-only; each tenant adds the products it fetches to its own copy
+        catalog = await catalog_cache.get(db, data_versions.get("products"), {"media_error": None})
+        
+        # Tenants run concurrently and fairly; identical RapidAPI searches are fetched once
+        fetch_cache = SharedFetchCache()
+        runner = FairScheduler()
+        for name, config_doc, scheduler_doc in tenants:
+            runner.submit(
+                name,
+                partial(process_tenant_products, config_doc, scheduler_doc, fetch_cache, catalog, job_id),
+                name="fetch-and-post"
+            )
+        await runner.run()
+        logging.info(
+            "Processed %s tenants (%s product searches, %s shared)",
+            len(tenants), fetch_cache.misses, fetch_cache.hits
+        )
+        publish_job_event(
+            "job.finished", job_id, tenant, tenants=len(tenants), duration=time.monotonic() - started
+        )
+    except Exception as e:
+        publish_job_event("job.failed", job_id, tenant, error=str(e))
+        raise
+
+async def fetch_tenant_products(config_doc: dict, scheduler_doc: dict, fetch_cache: SharedFetchCache) -> List[Product]:
+    """Run a tenant's product searches through the shared cache; returns private copies"""
+    rapidapi_key = config_doc.get('rapidapi_key')
+    rapidapi_host = config_doc.get('rapidapi_host', 'amazon23.p.rapidapi.com')
+    queries = scheduler_doc.get('search_queries') or ["best sellers"]
+    
+    # Failures are not shared: a search another tenant's key failed is retried with this one
+    results = await asyncio.gather(*(
+        fetch_cache.get(
+            (rapidapi_host, query),
+            partial(fetch_amazon_products, rapidapi_key, rapidapi_host, query)
+        )
+        for query in queries
+    ), return_exceptions=True)
+    
+    products = {}
+    for query, result in zip(queries, results):
+        if isinstance(result, BaseException):
+            if isinstance(result, asyncio.CancelledError):
+                raise result
+            logging.error("Error fetching Amazon products for %r: %s", query, result)
+            continue
+        for product in result:
+            products.setdefault(product.asin, product.model_copy())
+    return list(products.values())
+
+def affiliate_url(product_url: str, affiliate_tag: Optional[str]) -> str:
+    """Add a tenant's affiliate tag to a product URL"""
+    if affiliate_tag:
+        return f"{product_url}?tag={affiliate_tag}"
+    return product_url
+
+async def process_tenant_products(config_doc: dict, scheduler_doc: dict, fetch_cache: SharedFetchCache,
+                                  catalog: Catalog, job_id: Optional[str] = None):
+    """Fetch products and create scheduled posts for one tenant"""
+    from instagram import publish_batch as instagram_publish_batch
+    tenant = config_doc.get('admin_username')
+    progress = partial(publish_job_event, "job.progress", job_id, tenant)
+    try:
         # Fetch products from Amazon
         rapidapi_key = config_doc.get('rapidapi_key')
-        rapidapi_host = config_doc.get('rapidapi_host', 'amazon23.p.rapidapi.com')
         
         if not rapidapi_key:
-            logging.warning("RapidAPI key not configured")
+            logging.warning("RapidAPI key not configured for tenant %r", tenant)
             return
         
-        products = await fetch_amazon_products(rapidapi_key, rapidapi_host)
+        products = await fetch_tenant_products(config_doc, scheduler_doc, fetch_cache)
         
         if not products:
-            logging.warning("No products fetched")
+            logging.warning("No products fetched for tenant %r", tenant)
+            progress(stage="fetch", products=0)
             return
+        progress(stage="fetch", products=len(products))
         
-        # Save products to database
-        for product in products:
-            # Add affiliate tag to product URL
-            affiliate_tag = config_doc.get('amazon_affiliate_tag', '')
-            if affiliate_tag:
-                product.affiliate_url = f"{product.product_url}?tag={affiliate_tag}"
-            else:
-                product.affiliate_url = product.product_url
-            
-            product_dict = product.model_dump()
-            product_dict['fetched_at'] = product_dict['fetched_at'].isoformat()
-            await db.products.update_one(
-                {"asin": product.asin},
-                {"$set": product_dict},
+        # Validate and cache product images before anything is published
+        await attach_media(products)
+        progress(stage="media", ready=sum(1 for product in products if product.media_hash))
+        
+        # Save products to database. Products are shared between tenants, so the tenant's
+        # affiliate URL goes on its posts and the product only records who fetched it
+        from pymongo import UpdateOne
+        affiliate_tag = config_doc.get('amazon_affiliate_tag', '')
+        product_docs = product_documents(products)
+        await db.products.bulk_write([
+            UpdateOne(
+                {"asin": doc['asin']},
+                {
+                    "$set": {key: value for key, value in doc.items() if key != "affiliate_url"},
+                    "$addToSet": {"tenants": tenant}
+                },
                 upsert=True
             )
+            for doc in product_docs
+        ], ordered=False)
+        await archiver.forget_products(db, [doc['asin'] for doc in product_docs])
+        data_versions.bump("products")
+        product_search.add_documents(product_docs)
+        catalog_refresher.queue.touch_many(product_docs)
+        
+        hashtag_index.add_products((p.asin, p.title, p.category) for p in products)
         
         # Post to Instagram
         instagram_token = config_doc.get('instagram_access_token')
         instagram_user_id = config_doc.get('instagram_user_id')
         
         posts_per_day = scheduler_doc.get('posts_per_day', 3)
-        selected_products = products[:posts_per_day]
+        cooldown_days = scheduler_doc.get('cooldown_days', 7)
+        selected_products = await select_products(
+            posts_per_day,
+            SelectionWeights(**(scheduler_doc.get('selection_weights') or {})),
+            platform="instagram",
+            cooldown_days=cooldown_days,
+            tenant=tenant,
+            catalog=catalog.merged([doc for doc in product_docs if doc.get('media_error') is None], tenant)
+        ) or [
+            product for product in products
+            if product.media_hash
+            and not post_history.in_cooldown(product.asin, "instagram", cooldown_days, tenant=tenant)
+        ][:posts_per_day]
+        progress(stage="select", selected=len(selected_products))
+        product_hashtags = generate_hashtags_batch(
+            [(product.title, product.category or "") for product in selected_products]
+        )
         
-        for product in selected_products:
-            caption = f"{product.title}\n\n"
-            if product.description:
-                caption += f"{product.description[:100]}...\n\n"
-            caption += f"Link in bio! 🛒\n\n"
-            
-            hashtags = generate_hashtags(product.title, product.category or "")
-            caption += hashtags
-            
-            if instagram_token and instagram_user_id:
-                result = await post_to_instagram(
-                    instagram_token,
-                    instagram_user_id,
-                    product.image_url,
-                    caption
-                )
-                
+        captions = [
+            build_caption(product, hashtags)
+            for product, hashtags in zip(selected_products, product_hashtags)
+        ]
+        post_ids = [str(uuid.uuid4()) for _ in selected_products]
+        affiliate_urls = [affiliate_url(product.product_url, affiliate_tag) for product in selected_products]
+        short_codes = await short_links.create_many(db, [
+            (url, product.asin, post_id)
+            for product, url, post_id in zip(selected_products, affiliate_urls, post_ids)
+        ], tenant=tenant)
+        
+        if instagram_token and instagram_user_id:
+            # Containers for the whole batch are created, polled and published concurrently
+            results = await instagram_publish_batch(
+                instagram_token,
+                instagram_user_id,
+                [
+                    (media_cache.public_url(product.media_hash) or product.image_url, caption)
+                    for product, caption in zip(selected_products, captions)
+                ]
+            )
+        else:
+            results = [None] * len(selected_products)
+        
+        for product, hashtags, caption, result, post_id, short_code, url in zip(
+            selected_products, product_hashtags, captions, results, post_ids, short_codes, affiliate_urls
+        ):
+            if result is not None:
                 post = Post(
+                    id=post_id,
+                    admin_username=tenant,
+                    short_code=short_code,
                     product_id=product.id,
+                    product_asin=product.asin,
                     product_title=product.title,
                     product_image=product.image_url,
+                    affiliate_url=url,
                     caption=caption,
                     hashtags=hashtags,
                     platform="instagram",
@@ -327,9 +725,14 @@ async def process_and_post_products():
                 )
             else:
                 post = Post(
+                    id=post_id,
+                    admin_username=tenant,
+                    short_code=short_code,
                     product_id=product.id,
+                    product_asin=product.asin,
                     product_title=product.title,
                     product_image=product.image_url,
+                    affiliate_url=url,
                     caption=caption,
                     hashtags=hashtags,
                     platform="instagram",
@@ -337,47 +740,400 @@ async def process_and_post_products():
                     scheduled_at=datetime.now(timezone.utc)
                 )
             
-            post_dict = post.model_dump()
-            post_dict['scheduled_at'] = post_dict['scheduled_at'].isoformat()
-            if post_dict.get('posted_at'):
-                post_dict['posted_at'] = post_dict['posted_at'].isoformat()
-            post_dict['created_at'] = post_dict['created_at'].isoformat()
+            post_dict = to_document(post)
             
             await db.posts.insert_one(post_dict)
+            data_versions.bump("posts")
+            publish_job_event("post.created", job_id, tenant, post=post_summary(post_dict))
+            if post.status != "failed":
+                post_history.record(product.asin, post.platform, post.posted_at or post.created_at, tenant)
+        
+        # Queue Facebook page posts and drain the queue in Graph API batches
+        facebook_posts = []
+        if "facebook" in scheduler_doc.get('platforms', []):
+            eligible = [
+                (product, hashtags)
+                for product, hashtags in zip(selected_products, product_hashtags)
+                if not post_history.in_cooldown(product.asin, "facebook", cooldown_days, tenant=tenant)
+            ]
+            facebook_post_ids = [str(uuid.uuid4()) for _ in eligible]
+            facebook_urls = [affiliate_url(product.product_url, affiliate_tag) for product, _ in eligible]
+            facebook_codes = await short_links.create_many(db, [
+                (url, product.asin, post_id)
+                for (product, _), url, post_id in zip(eligible, facebook_urls, facebook_post_ids)
+            ], tenant=tenant)
+            for (product, hashtags), post_id, short_code, url in zip(
+                eligible, facebook_post_ids, facebook_codes, facebook_urls
+            ):
+                post = Post(
+                    id=post_id,
+                    admin_username=tenant,
+                    short_code=short_code,
+                    product_id=product.id,
+                    product_asin=product.asin,
+                    product_title=product.title,
+                    product_image=product.image_url,
+                    media_url=media_cache.public_url(product.media_hash),
+                    affiliate_url=url,
+                    caption=build_caption(product, hashtags, short_link_url(short_code)),
+                    hashtags=hashtags,
+                    platform="facebook",
+                    status="pending",
+                    scheduled_at=datetime.now(timezone.utc)
+                )
+                facebook_posts.append(to_document(post))
+            if facebook_posts:
+                await db.posts.insert_many(facebook_posts)
+                data_versions.bump("posts")
+                for post_dict in facebook_posts:
+                    publish_job_event("post.created", job_id, tenant, post=post_summary(post_dict))
+            published = await publish_facebook_queue(config_doc)
+            progress(stage="facebook", queued=len(facebook_posts), published=published)
         
         # Update analytics
         today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-        analytics_doc = await db.analytics.find_one({"date": today}, {"_id": 0})
+        total_posts = len(selected_products) + len(facebook_posts)
+        counters = {
+            "total_posts": total_posts,
+            "instagram_posts": len(selected_products),
+            "facebook_posts": len(facebook_posts)
+        }
+        # One atomic upsert: tenants run concurrently and must not each insert the day's document
+        defaults = {
+            k: v for k, v in analytics_defaults(today, tenant).items()
+            if k not in counters and k not in ("date", "admin_username")
+        }
+        await db.analytics.update_one(
+            {"date": today, "admin_username": tenant},
+            {"$inc": counters, "$setOnInsert": defaults},
+            upsert=True
+        )
+        data_versions.bump("analytics")
         
-        if analytics_doc:
-            await db.analytics.update_one(
-                {"date": today},
-                {"$inc": {"total_posts": len(selected_products), "instagram_posts": len(selected_products)}}
-            )
-        else:
-            analytics = Analytics(
-                date=today,
-                total_posts=len(selected_products),
-                instagram_posts=len(selected_products)
-            )
-            analytics_dict = analytics.model_dump()
-            analytics_dict['created_at'] = analytics_dict['created_at'].isoformat()
-            await db.analytics.insert_one(analytics_dict)
+        logging.info("Successfully processed %s products for tenant %r", len(selected_products), tenant)
+        progress(stage="done", posts=total_posts)
         
-        logging.info(f"Successfully processed {len(selected_products)} products")
+    except Exception as e:
+        logging.error("Error processing products for tenant %r: %s", tenant, e)
+        progress(stage="failed", error=str(e))
+
+def short_link_url(code: str) -> Optional[str]:
+    """Public URL of a tracked short link, if the public base URL is known"""
+    return f"{PUBLIC_BASE_URL}/api/r/{code}" if PUBLIC_BASE_URL else None
+
+def build_caption(product: Product, hashtags: str, link: Optional[str] = None) -> str:
+    """Compose a post caption; platforms with clickable captions get the tracked link"""
+    caption = f"{product.title}\n\n"
+    if product.description:
+        caption += f"{product.description[:100]}...\n\n"
+    if link:
+        caption += f"Shop now: {link} 🛒\n\n"
+    else:
+        caption += f"Link in bio! 🛒\n\n"
+    
+    caption += hashtags
+    return caption
+
+def analytics_defaults(date: str, tenant: Optional[str] = None) -> dict:
+    """Serialized zero-valued analytics document for a tenant's day, used when upserting counters"""
+    return to_document(Analytics(date=date, admin_username=tenant))
+
+async def select_products(count: int, weights: SelectionWeights, platform: str = "instagram",
+                          cooldown_days: float = 7, tenant: Optional[str] = None,
+                          catalog: Optional[Catalog] = None) -> List[Product]:
+    """Pick the best of the tenant's stored products to post, skipping cooldowns"""
+    if catalog is None:
+        catalog = await catalog_cache.get(db, data_versions.get("products"), {"media_error": None})
+    exclude = ~catalog.candidates(tenant)
+    if cooldown_days:
+        exclude |= post_history.cooldown_mask(catalog.asins, platform, cooldown_days, tenant=tenant)
+    asins = select_top_k(catalog, count, weights, exclude=exclude)
+    if not asins:
+        return []
+    
+    docs = await db.products.find({"asin": {"$in": asins}}, {"_id": 0}).to_list(len(asins))
+    by_asin = {doc['asin']: doc for doc in docs}
+    # One adapter call, which also parses the stored ISO timestamps
+    selected = PRODUCT_LIST_ADAPTER.validate_python([by_asin[asin] for asin in asins if asin in by_asin])
+    
+    # Products stored before the media stage existed are validated on first use
+    await attach_media([product for product in selected if not product.media_hash])
+    return [product for product in selected if product.media_hash]
+
+async def attach_media(products: List[Product]):
+    """Download, validate and cache product images, recording the outcome on each product"""
+    if not products:
+        return
+    results = await media_cache.fetch_many(product.image_url for product in products)
+    for product in products:
+        result = results.get(product.image_url)
+        product.media_hash = result.media_hash if result else None
+        # Transient failures are not stored, so the product stays selectable and is retried on use
+        if result is None:
+            product.media_error = "Missing image URL"
+        else:
+            product.media_error = None if result.transient else result.error
+
+# Runs a queued Facebook post may be retried after transient batch failures before it fails
+FACEBOOK_MAX_PUBLISH_ATTEMPTS = int(os.environ.get('FACEBOOK_MAX_PUBLISH_ATTEMPTS', 5))
+
+async def publish_facebook_queue(config_doc: dict, limit: int = 500) -> int:
+    """Publish pending Facebook posts in Graph API batches and update each post record"""
+    from pymongo import UpdateOne
+    from facebook import publish_page_posts as facebook_publish_page_posts
+    access_token = config_doc.get('facebook_access_token')
+    page_id = config_doc.get('facebook_page_id')
+    if not access_token or not page_id:
+        return 0
+    
+    tenant = config_doc.get('admin_username')
+    pending = await db.posts.find(
+        {"platform": "facebook", "status": "pending", "admin_username": tenant},
+        {"_id": 0, "id": 1, "product_asin": 1, "product_image": 1, "media_url": 1, "caption": 1,
+         "publish_attempts": 1}
+    ).sort("created_at", 1).limit(limit).to_list(limit)
+    if not pending:
+        return 0
+    
+    outcomes = await facebook_publish_page_posts(
+        access_token,
+        page_id,
+        [(post['id'], post.get('media_url') or post['product_image'], post['caption']) for post in pending]
+    )
+    
+    now = datetime.now(timezone.utc)
+    updates = []
+    published = retried = 0
+    for post in pending:
+        outcome = outcomes.get(post['id'], {"success": False, "error": "No result returned"})
+        attempts = post.get('publish_attempts', 0) + 1
+        if outcome.get('retry') and attempts < FACEBOOK_MAX_PUBLISH_ATTEMPTS:
+            # The batch request failed transiently as a whole: stay pending for the next run
+            retried += 1
+            updates.append(UpdateOne({"id": post['id']}, {"$set": {
+                "publish_attempts": attempts,
+                "error_message": outcome.get('error')
+            }}))
+            continue
+        if outcome.get('success'):
+            published += 1
+            post_history.record(post.get('product_asin'), "facebook", now, tenant)
+            updates.append(UpdateOne({"id": post['id']}, {"$set": {
+                "status": "posted",
+                "platform_post_id": outcome.get('post_id'),
+                "posted_at": now.isoformat(),
+                "error_message": None
+            }}))
+        else:
+            updates.append(UpdateOne({"id": post['id']}, {"$set": {
+                "status": "failed",
+                "publish_attempts": attempts,
+                "error_message": outcome.get('error')
+            }}))
+    await db.posts.bulk_write(updates, ordered=False)
+    data_versions.bump("posts")
+    
+    logging.info("Published %s of %s queued Facebook posts for tenant %r (%s left queued after request errors)",
+                 published, len(pending), tenant, retried)
+    return published
+
+async def collect_post_insights():
+    """Background job to pull clicks and impressions for recently published posts"""
+    from insights import collect_insights
+    try:
+        config_docs = await db.integration_configs.find({}, {"_id": 0}).to_list(None)
+        if not config_docs:
+            return
         
+        today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        runner = FairScheduler()
+        for config_doc in config_docs:
+            tenant = config_doc.get('admin_username')
+            runner.submit(
+                tenant,
+                partial(collect_insights, db, config_doc, analytics_defaults(today, tenant),
+                        posts_filter={"admin_username": tenant}),
+                name="insights"
+            )
+        await runner.run()
+        data_versions.bump("posts", "analytics")
     except Exception as e:
-        logging.error(f"Error in process_and_post_products: {str(e)}")
+        logging.error("Error in collect_post_insights: %s", e)
 
-def run_async_job():
+def run_async_job(job_id: Optional[str] = None, tenant: Optional[str] = None):
     """Wrapper to run async job in sync scheduler"""
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
-    loop.run_until_complete(process_and_post_products())
-    loop.close()
+    try:
+        loop.run_until_complete(process_and_post_products(job_id, tenant))
+    finally:
+        loop.close()
+
+def run_insights_job(job_id: Optional[str] = None):
+    """Wrapper to run the insights collector in sync scheduler"""
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        loop.run_until_complete(collect_post_insights())
+    finally:
+        loop.close()
+
+async def apply_retention():
+    """Background job to archive posts and products past their hot window"""
+    archived = await archiver.run(db)
+    archived_asins = [key['asin'] for key in archived.get('products', [])]
+    product_search.remove(archived_asins)
+    catalog_refresher.queue.remove(archived_asins)
+    data_versions.bump("posts", "products")
+
+def run_retention_job(job_id: Optional[str] = None):
+    """Wrapper to run the archiver in sync scheduler"""
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        loop.run_until_complete(apply_retention())
+    finally:
+        loop.close()
+
+def on_products_refreshed(docs: List[dict]):
+    hashtag_index.add_products((doc['asin'], doc.get('title', ''), doc.get('category')) for doc in docs)
+    product_search.add_documents(docs)
+    data_versions.bump("products")
+
+async def refresh_catalog():
+    """Background job to refresh the stalest known products within the request budget"""
+    # Products are shared across tenants; the lookups use the first active tenant's key
+    tenants = await load_active_tenants()
+    config_doc = next((config for _, config, _ in tenants if config.get('rapidapi_key')), None)
+    if config_doc is None:
+        logging.info("Catalog refresh skipped: no active tenant with a RapidAPI key")
+        return
+    lookup = partial(
+        lookup_amazon_products,
+        config_doc['rapidapi_key'],
+        config_doc.get('rapidapi_host', 'amazon23.p.rapidapi.com')
+    )
+    await catalog_refresher.tick(
+        db, lookup, REFRESH_REQUESTS_PER_TICK, RAPIDAPI_LOOKUP_BATCH, on_refresh=on_products_refreshed
+    )
+
+def run_refresh_job(job_id: Optional[str] = None):
+    """Wrapper to run the catalog refresh in sync scheduler"""
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        loop.run_until_complete(refresh_catalog())
+    finally:
+        loop.close()
+
+def trigger_job(job: str, target, trigger: str = "manual", tenant: Optional[str] = None):
+    """Start a job run or attach to the active one; raises 429 when the queue is full"""
+    try:
+        run, created = job_runner.trigger(job, target, trigger, tenant)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "60"})
+    return {
+        "message": "Job started successfully" if created else "Job already in progress",
+        "job_id": run.id,
+        "state": run.state
+    }
+
+def scheduled_posting_job():
+    try:
+        job_runner.trigger("posting", run_async_job, "schedule")
+    except JobQueueFull as e:
+        logging.warning("Skipped scheduled posting run: %s", e)
+
+def scheduled_insights_job():
+    try:
+        job_runner.trigger("insights", run_insights_job, "schedule")
+    except JobQueueFull as e:
+        logging.warning("Skipped scheduled insights run: %s", e)
+
+def scheduled_retention_job():
+    try:
+        job_runner.trigger("retention", run_retention_job, "schedule")
+    except JobQueueFull as e:
+        logging.warning("Skipped scheduled retention run: %s", e)
+
+def scheduled_refresh_job():
+    try:
+        job_runner.trigger("refresh", run_refresh_job, "schedule")
+    except JobQueueFull as e:
+        logging.warning("Skipped scheduled catalog refresh: %s", e)
+
+def scheduler_job_defaults() -> Dict[str, Any]:
+    return {
+        "misfire_grace_time": SCHEDULER_MISFIRE_GRACE_SECONDS,
+        "coalesce": SCHEDULER_COALESCE,
+        "max_instances": 1
+    }
+
+# job id -> (function, interval trigger arguments)
+SCHEDULED_JOBS = {
+    'product_posting_job': (scheduled_posting_job, {"hours": 4}),
+    'insights_job': (scheduled_insights_job, {"hours": 1}),
+    'retention_job': (scheduled_retention_job, {"days": 1}),
+    'catalog_refresh_job': (scheduled_refresh_job, {"minutes": REFRESH_INTERVAL_MINUTES}),
+}
+
+def schedule_jobs():
+    """Register the recurring jobs, keeping the persisted next run time of unchanged ones"""
+    from apscheduler.triggers.interval import IntervalTrigger
+    defaults = scheduler_job_defaults()
+    for job_id, (func, interval) in SCHEDULED_JOBS.items():
+        trigger = IntervalTrigger(**interval)
+        job = scheduler.get_job(job_id)
+        if job is None:
+            scheduler.add_job(func, trigger, id=job_id, replace_existing=True, **defaults)
+            continue
+        if not isinstance(job.trigger, IntervalTrigger) or job.trigger.interval != trigger.interval:
+            # Only a changed interval restarts the timer
+            scheduler.reschedule_job(job_id, trigger=trigger)
+        changes = {key: value for key, value in defaults.items() if getattr(job, key) != value}
+        if changes:
+            scheduler.modify_job(job_id, **changes)
+        logging.info("Resuming %s, next run at %s", job_id, scheduler.get_job(job_id).next_run_time)
+
+def start_scheduler():
+    """Start the scheduler (loading persisted jobs) and make sure the recurring jobs exist"""
+    if not scheduler.running:
+        scheduler.start()
+    schedule_jobs()
+
+def stop_scheduled_jobs():
+    if scheduler.running:
+        scheduler.remove_all_jobs()
+
+async def ensure_indexes():
+    """Create the indexes the background jobs rely on"""
+    # Insights pass: posted posts inside their metrics window
+    await db.posts.create_index([("status", 1), ("posted_at", 1)])
+    await db.short_links.create_index("code", unique=True)
+    # Per-tenant configs and the Facebook publishing queue
+    await db.integration_configs.create_index("admin_username")
+    await db.scheduler_configs.create_index([("is_active", 1), ("admin_username", 1)])
+    await db.posts.create_index([("platform", 1), ("status", 1), ("admin_username", 1), ("created_at", 1)])
+    # Upserts by ASIN and search result hydration
+    await db.products.create_index("asin")
+    # Tenant-scoped lists, counts and exports
+    await db.products.create_index("tenants")
+    await db.posts.create_index([("admin_username", 1), ("created_at", -1)])
+    await db.analytics.create_index([("admin_username", 1), ("date", 1)])
+    # Retention scans by date, plus the TTL on the archiver's run log
+    await archiver.ensure_indexes(db)
 
 # ============= Routes =============
 
+# Affiliate short-link redirect (public, hot path: no database write per click)
+@api_router.get("/r/{code}")
+async def redirect_short_link(code: str):
+    target_url = short_links.resolve(code) or await short_links.load(db, code)
+    if not target_url:
+        raise HTTPException(status_code=404, detail="Link not found")
+    short_links.record_click(code)
+    return Response(status_code=302, headers={"Location": target_url, "Cache-Control": "no-store"})
+
 # Health check route
 @api_router.get("/")
 async def root():
@@ -400,8 +1156,7 @@ async def register(admin_data: AdminCreate):
         password_hash=password_hash
     )
     
-    admin_dict = admin.model_dump()
-    admin_dict['created_at'] = admin_dict['created_at'].isoformat()
+    admin_dict = to_document(admin)
     
     await db.admins.insert_one(admin_dict)
     
@@ -452,102 +1207,176 @@ async def verify_token(username: str = Depends(get_current_admin)):
         "email": admin_doc['email']
     }
 
+async def tenant_config_filter(username: str) -> dict:
+    """Filter for an admin's config documents, adopting the pre-multi-tenant configs on first use"""
+    # Both collections at once: a tenant whose scheduler config was adopted without its
+    # integration config would be skipped by load_active_tenants
+    for collection in (db.integration_configs, db.scheduler_configs):
+        if not await collection.find_one({"admin_username": username}, {"_id": 1}):
+            await collection.update_one(
+                {"admin_username": {"$exists": False}},
+                {"$set": {"admin_username": username}}
+            )
+    return {"admin_username": username}
+
 @api_router.get("/integrations", response_model=IntegrationConfig)
 async def get_integrations(username: str = Depends(get_current_admin)):
     """Get integration configurations"""
-    config = await db.integration_configs.find_one({}, {"_id": 0})
+    config_filter = await tenant_config_filter(username)
+    config = await db.integration_configs.find_one(config_filter, {"_id": 0})
     
     if not config:
         # Create default config
-        default_config = IntegrationConfig()
-        config_dict = default_config.model_dump()
-        config_dict['updated_at'] = config_dict['updated_at'].isoformat()
+        default_config = IntegrationConfig(admin_username=username)
+        config_dict = to_document(default_config)
         await db.integration_configs.insert_one(config_dict)
         return default_config
     
-    if isinstance(config.get('updated_at'), str):
-        config['updated_at'] = datetime.fromisoformat(config['updated_at'])
-    
-    return IntegrationConfig(**config)
+    # Our own document: response_model validates it once on the way out
+    return config
 
 @api_router.put("/integrations")
 async def update_integrations(config: IntegrationConfig, username: str = Depends(get_current_admin)):
     """Update integration configurations"""
+    config_filter = await tenant_config_filter(username)
+    config.admin_username = username
     config.updated_at = datetime.now(timezone.utc)
-    config_dict = config.model_dump()
-    config_dict['updated_at'] = config_dict['updated_at'].isoformat()
+    config_dict = to_document(config)
     
     await db.integration_configs.update_one(
-        {},
+        config_filter,
         {"$set": config_dict},
         upsert=True
     )
+    data_versions.bump("integrations")
     
     return {"message": "Integration config updated successfully"}
 
 @api_router.get("/scheduler", response_model=SchedulerConfig)
 async def get_scheduler(username: str = Depends(get_current_admin)):
     """Get scheduler configuration"""
-    config = await db.scheduler_configs.find_one({}, {"_id": 0})
+    config_filter = await tenant_config_filter(username)
+    config = await db.scheduler_configs.find_one(config_filter, {"_id": 0})
     
     if not config:
-        default_config = SchedulerConfig()
-        config_dict = default_config.model_dump()
-        config_dict['updated_at'] = config_dict['updated_at'].isoformat()
+        default_config = SchedulerConfig(admin_username=username)
+        config_dict = to_document(default_config)
         await db.scheduler_configs.insert_one(config_dict)
         return default_config
     
-    if isinstance(config.get('updated_at'), str):
-        config['updated_at'] = datetime.fromisoformat(config['updated_at'])
-    
-    return SchedulerConfig(**config)
+    # Our own document: response_model validates it once on the way out
+    return config
 
 @api_router.put("/scheduler")
 async def update_scheduler(config: SchedulerConfig, username: str = Depends(get_current_admin)):
     """Update scheduler configuration"""
+    config_filter = await tenant_config_filter(username)
+    config.admin_username = username
     config.updated_at = datetime.now(timezone.utc)
-    config_dict = config.model_dump()
-    config_dict['updated_at'] = config_dict['updated_at'].isoformat()
+    config_dict = to_document(config)
     
     await db.scheduler_configs.update_one(
-        {},
+        config_filter,
         {"$set": config_dict},
         upsert=True
     )
     
-    # Restart scheduler if active
-    if config.is_active:
-        if scheduler.running:
-            scheduler.remove_all_jobs()
-        else:
-            scheduler.start()
-        
-        # Schedule job every 4 hours
-        scheduler.add_job(
-            run_async_job,
-            'interval',
-            hours=4,
-            id='product_posting_job',
-            replace_existing=True
-        )
+    # The shared jobs run while any tenant's scheduler is active
+    # Job store calls are blocking Mongo round trips, so they run off the event loop
+    any_active = config.is_active or await db.scheduler_configs.find_one({"is_active": True}, {"_id": 1})
+    if any_active:
+        await asyncio.to_thread(start_scheduler)
         logging.info("Scheduler activated")
     else:
-        if scheduler.running:
-            scheduler.remove_all_jobs()
+        await asyncio.to_thread(stop_scheduled_jobs)
         logging.info("Scheduler deactivated")
     
     return {"message": "Scheduler config updated successfully"}
 
 @api_router.post("/scheduler/run-now")
 async def run_scheduler_now(username: str = Depends(get_current_admin)):
-    """Manually trigger the product fetching and posting job"""
-    executor.submit(run_async_job)
-    return {"message": "Job started successfully"}
+    """Manually trigger the product fetching and posting job for the caller's tenant"""
+    return trigger_job("posting", partial(run_async_job, tenant=username), tenant=username)
+
+def run_visible_to(run, username: str) -> bool:
+    # Runs for every tenant (scheduled and system jobs) are shared; tenant runs are private
+    return run.tenant is None or run.tenant == username
+
+@api_router.get("/jobs")
+async def get_job_runs(username: str = Depends(get_current_admin)):
+    """Active and recently finished job runs"""
+    return {
+        "active": [run.as_dict() for run in job_runner.active() if run_visible_to(run, username)],
+        "runs": [run.as_dict() for run in job_runner.runs() if run_visible_to(run, username)]
+    }
+
+@api_router.get("/jobs/{run_id}")
+async def get_job_run(run_id: str, username: str = Depends(get_current_admin)):
+    """State of one job run"""
+    run = job_runner.get(run_id)
+    if not run or not run_visible_to(run, username):
+        raise HTTPException(status_code=404, detail="Job run not found")
+    return run.as_dict()
+
+@api_router.post("/events/ticket")
+async def issue_stream_ticket(username: str = Depends(get_current_admin)):
+    """Single-use ticket for opening the event stream from an EventSource"""
+    return {"ticket": stream_tickets.issue(username), "expires_in": stream_tickets.ttl}
+
+@api_router.get("/events")
+async def stream_events(request: Request, ticket: Optional[str] = None,
+                        credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False))):
+    """Server-sent events: job lifecycle, per-stage progress and newly created posts"""
+    # EventSource cannot set headers; it sends a ticket from /events/ticket instead of the JWT
+    if credentials is not None:
+        username = decode_admin_token(credentials.credentials)
+    elif ticket is not None:
+        username = stream_tickets.redeem(ticket)
+        if username is None:
+            raise HTTPException(status_code=401, detail="Invalid or expired stream ticket")
+    else:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    subscription = events.subscribe(username)
+    
+    async def frames():
+        try:
+            yield b"retry: 5000\n\n"
+            while not await request.is_disconnected():
+                yield await subscription.next_frame()
+        finally:
+            events.unsubscribe(subscription)
+    
+    return StreamingResponse(frames(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
 
 @api_router.get("/products")
-async def get_products(limit: int = 50, username: str = Depends(get_current_admin)):
-    """Get all products"""
-    products = await db.products.find({}, {"_id": 0}).sort("fetched_at", -1).limit(limit).to_list(limit)
+async def get_products(limit: int = 50, fields: Optional[str] = None,
+                       etag: str = conditional_get("products", "integrations"),
+                       username: str = Depends(get_current_admin)):
+    """Get the tenant's products, with affiliate URLs carrying the tenant's tag"""
+    projection = list_projection(fields, PRODUCT_FIELDS)
+    with_affiliate_url = not fields or "affiliate_url" in projection
+    if not fields:
+        # Which other tenants share a product is not theirs to see
+        projection["tenants"] = 0
+    elif with_affiliate_url:
+        projection["product_url"] = 1
+    with query_budget("list"):
+        products = await reporting_db.products.find(
+            tenant_filter("products", username), projection
+        ).sort("fetched_at", -1).limit(limit).to_list(limit)
+        config_doc = await reporting_db.integration_configs.find_one(
+            {"admin_username": username}, {"_id": 0, "amazon_affiliate_tag": 1}
+        ) if with_affiliate_url else None
+    if with_affiliate_url:
+        affiliate_tag = (config_doc or {}).get('amazon_affiliate_tag')
+        for product in products:
+            if product.get('product_url'):
+                product['affiliate_url'] = affiliate_url(product['product_url'], affiliate_tag)
+    if FAST_JSON:
+        return ORJSONResponse(products, headers=etag_headers(etag))
     
     for product in products:
         if isinstance(product.get('fetched_at'), str):
@@ -555,10 +1384,70 @@ async def get_products(limit: int = 50, username: str = Depends(get_current_admi
     
     return products
 
+@api_router.get("/products/search")
+async def search_products(
+    q: Optional[str] = None,
+    category: Optional[str] = None,
+    min_rating: Optional[float] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    sort: str = "newest",
+    page: int = 1,
+    page_size: int = 20,
+    fields: Optional[str] = None,
+    etag: str = conditional_get("products")
+):
+    """Search products by title keywords, category, rating and price range"""
+    if sort not in SEARCH_SORTS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of: {', '.join(SEARCH_SORTS)}")
+    page = max(page, 1)
+    page_size = min(max(page_size, 1), 100)
+    total, asins = product_search.search(
+        q, category, min_rating, min_price, max_price, sort, (page - 1) * page_size, page_size
+    )
+    
+    projection = list_projection(fields, PRODUCT_FIELDS)
+    projection["asin"] = 1
+    docs = []
+    if asins:
+        with query_budget("search"):
+            docs = await reporting_db.products.find({"asin": {"$in": asins}}, projection).to_list(len(asins))
+    by_asin = {doc['asin']: doc for doc in docs}
+    return ORJSONResponse({
+        "total": total,
+        "page": page,
+        "page_size": page_size,
+        "items": [by_asin[asin] for asin in asins if asin in by_asin]
+    }, headers=etag_headers(etag))
+
+async def index_imported_products(docs: List[dict]):
+    await archiver.forget_products(db, [doc['asin'] for doc in docs])
+    hashtag_index.add_products((doc['asin'], doc.get('title', ''), doc.get('category')) for doc in docs)
+    product_search.add_documents(docs)
+    catalog_refresher.queue.touch_many(docs)
+    data_versions.bump("products")
+
+@api_router.post("/products/import")
+async def import_products_upload(request: Request, format: Optional[str] = None,
+                                 username: str = Depends(get_current_admin)):
+    """Bulk upsert products from a CSV or JSON Lines request body, streamed as it arrives"""
+    if format is None:
+        format = "jsonl" if "json" in request.headers.get("content-type", "") else "csv"
+    if format not in IMPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {format}")
+    report = await import_products(db, request.stream(), format, Product, on_batch=index_imported_products,
+                                   tenant=username)
+    return report.as_dict()
+
 @api_router.get("/posts")
-async def get_posts(limit: int = 100, username: str = Depends(get_current_admin)):
-    """Get all posts"""
-    posts = await db.posts.find({}, {"_id": 0}).sort("created_at", -1).limit(limit).to_list(limit)
+async def get_posts(limit: int = 100, fields: Optional[str] = None, etag: str = conditional_get("posts"),
+                    username: str = Depends(get_current_admin)):
+    """Get the tenant's posts"""
+    projection = list_projection(fields, POST_FIELDS)
+    with query_budget("list"):
+        posts = await reporting_db.posts.find(tenant_filter("posts", username), projection).sort("created_at", -1).limit(limit).to_list(limit)
+    if FAST_JSON:
+        return ORJSONResponse(posts, headers=etag_headers(etag))
     
     for post in posts:
         if isinstance(post.get('scheduled_at'), str):
@@ -571,42 +1460,190 @@ async def get_posts(limit: int = 100, username: str = Depends(get_current_admin)
     return posts
 
 @api_router.get("/analytics/overview")
-async def get_analytics_overview(username: str = Depends(get_current_admin)):
-    """Get analytics overview"""
-    # Get today's stats
-    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-    today_analytics = await db.analytics.find_one({"date": today}, {"_id": 0})
-    
-    # Get total posts
-    total_posts = await db.posts.count_documents({})
-    successful_posts = await db.posts.count_documents({"status": "posted"})
-    failed_posts = await db.posts.count_documents({"status": "failed"})
-    pending_posts = await db.posts.count_documents({"status": "pending"})
-    
-    # Get posts by platform
-    instagram_posts = await db.posts.count_documents({"platform": "instagram"})
-    facebook_posts = await db.posts.count_documents({"platform": "facebook"})
-    pinterest_posts = await db.posts.count_documents({"platform": "pinterest"})
-    
-    # Get total products
-    total_products = await db.products.count_documents({})
-    
+async def get_analytics_overview(etag: str = conditional_get("posts", "products", "analytics", daily=True),
+                                 username: str = Depends(get_current_admin)):
+    """Get the tenant's analytics overview"""
+    posts_filter = tenant_filter("posts", username)
+    with query_budget("analytics"):
+        # Get today's stats
+        today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        today_analytics = await reporting_db.analytics.find_one(
+            {"date": today, **tenant_filter("analytics", username)}, {"_id": 0}
+        )
+        
+        # Get total posts
+        total_posts = await reporting_db.posts.count_documents(posts_filter)
+        successful_posts = await reporting_db.posts.count_documents({**posts_filter, "status": "posted"})
+        failed_posts = await reporting_db.posts.count_documents({**posts_filter, "status": "failed"})
+        pending_posts = await reporting_db.posts.count_documents({**posts_filter, "status": "pending"})
+        
+        # Get posts by platform
+        instagram_posts = await reporting_db.posts.count_documents({**posts_filter, "platform": "instagram"})
+        facebook_posts = await reporting_db.posts.count_documents({**posts_filter, "platform": "facebook"})
+        pinterest_posts = await reporting_db.posts.count_documents({**posts_filter, "platform": "pinterest"})
+        
+        # Get total products
+        total_products = await reporting_db.products.count_documents(tenant_filter("products", username))
+        
+        # Add what the retention job has moved to the archive
+        archived = {doc['collection']: doc async for doc in reporting_db.archive_stats.find({"tenant": username})}
+        archived_posts = archived.get('posts', {})
+        archived_status = archived_posts.get('status', {})
+        archived_platform = archived_posts.get('platform', {})
+        
     return {
         "today": today_analytics or {},
-        "total_posts": total_posts,
-        "successful_posts": successful_posts,
-        "failed_posts": failed_posts,
+        "total_posts": total_posts + archived_posts.get('total', 0),
+        "successful_posts": successful_posts + archived_status.get('posted', 0),
+        "failed_posts": failed_posts + archived_status.get('failed', 0),
         "pending_posts": pending_posts,
-        "instagram_posts": instagram_posts,
-        "facebook_posts": facebook_posts,
-        "pinterest_posts": pinterest_posts,
-        "total_products": total_products
+        "instagram_posts": instagram_posts + archived_platform.get('instagram', 0),
+        "facebook_posts": facebook_posts + archived_platform.get('facebook', 0),
+        "pinterest_posts": pinterest_posts + archived_platform.get('pinterest', 0),
+        "total_products": total_products + archived.get('products', {}).get('total', 0)
+    }
+
+@api_router.get("/retention")
+async def get_retention_status(username: str = Depends(get_current_admin)):
+    """Hot windows, archived document counts and archive size"""
+    return {
+        "policies": [policy.as_dict() for policy in archiver.policies],
+        "archived": {doc.pop('_id'): doc async for doc in db.archive_stats.find({"tenant": {"$exists": False}})},
+        "archive": await asyncio.to_thread(archiver.usage)
+    }
+
+@api_router.post("/retention/run")
+async def run_retention_now(username: str = Depends(get_current_admin)):
+    """Manually trigger the archiver"""
+    return trigger_job("retention", run_retention_job)
+
+@api_router.get("/catalog/refresh")
+async def get_catalog_refresh_status(username: str = Depends(get_current_admin)):
+    """Refresh budget, catalog staleness and the last refresh tick"""
+    return {
+        "requests_per_tick": REFRESH_REQUESTS_PER_TICK,
+        "lookup_batch": RAPIDAPI_LOOKUP_BATCH,
+        "interval_minutes": REFRESH_INTERVAL_MINUTES,
+        "queue": await asyncio.to_thread(catalog_refresher.queue.stats),
+        "last_tick": catalog_refresher.last_tick
+    }
+
+@api_router.post("/catalog/refresh/run")
+async def run_catalog_refresh_now(username: str = Depends(get_current_admin)):
+    """Manually trigger a catalog refresh tick"""
+    return trigger_job("refresh", run_refresh_job)
+
+@api_router.get("/export/{collection}")
+async def export_collection(
+    collection: str,
+    format: str = "csv",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    status: Optional[str] = None,
+    username: str = Depends(get_current_admin)
+):
+    """Stream posts, products or analytics as CSV, NDJSON or Parquet"""
+    if collection not in EXPORTS:
+        raise HTTPException(status_code=404, detail=f"Unknown export: {collection}")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {format}")
+    if status and collection != "posts":
+        raise HTTPException(status_code=400, detail="status filter only applies to posts")
+    
+    columns, date_field = EXPORTS[collection]
+    query = {**date_range_filter(date_field, start, end), **tenant_filter(collection, username)}
+    if status:
+        query["status"] = status
+    # The stream outlives this handler, so the budget is enforced by the server per cursor
+    cursor = reporting_db.get_collection(collection).find(
+        query, {"_id": 0, **{name: 1 for name, _ in columns}}
+    ).batch_size(2000).max_time_ms(QUERY_BUDGETS_MS["export"])
+    
+    media_type, extension = EXPORT_FORMATS[format]
+    filename = f"{collection}-{datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')}.{extension}"
+    return StreamingResponse(
+        stream_export(cursor, format, columns, collection),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@api_router.get("/system/startup-profile")
+async def get_startup_profile(username: str = Depends(get_current_admin)):
+    """Report startup step timings and which deferred subsystems have been created"""
+    return {
+        "startup_mode": STARTUP_MODE,
+        "steps_ms": {name: round(seconds * 1000, 1) for name, seconds in startup_profile.items()},
+        "initialized": {
+            resource._name: resource.initialized
+            for resource in (client, pwd_context, scheduler, executor, media_cache)
+        }
     }
 
+@api_router.get("/system/mongo-pool")
+async def get_mongo_pool(username: str = Depends(get_current_admin)):
+    """Report pool settings, per-server connection usage and the query budgets"""
+    return {
+        "initialized": client.initialized,
+        "options": pool_monitor.options,
+        "reporting_read_preference": os.environ.get('MONGO_REPORTING_READ_PREFERENCE', 'primary'),
+        "query_budgets_ms": QUERY_BUDGETS_MS,
+        "pools": pool_monitor.snapshot() if pool_monitor.initialized else {}
+    }
+
+# Jobs that can be armed for profiling
+PROFILED_JOBS = ("posting", "insights", "retention", "refresh")
+
+@api_router.get("/profiling")
+async def get_profiling_status(username: str = Depends(get_current_admin)):
+    """Armed routes and jobs, the slow-request threshold and the stored profiles"""
+    return profiler.status()
+
+@api_router.post("/profiling/requests")
+async def arm_request_profiling(path: str, count: int = 1, username: str = Depends(get_current_admin)):
+    """Profile the next count requests to path (e.g. /api/analytics/overview); 0 disarms"""
+    if not path.startswith("/api/"):
+        raise HTTPException(status_code=400, detail="path must start with /api/")
+    profiler.arm_path(path, min(count, 100))
+    return profiler.status()
+
+@api_router.post("/profiling/jobs/{job}")
+async def arm_job_profiling(job: str, count: int = 1, username: str = Depends(get_current_admin)):
+    """Profile the next count runs of a job; 0 disarms"""
+    if job not in PROFILED_JOBS:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job}")
+    profiler.arm_job(job, min(count, 10))
+    return profiler.status()
+
+@api_router.put("/profiling/slow-requests")
+async def set_slow_request_threshold(threshold_ms: float, username: str = Depends(get_current_admin)):
+    """Capture a profile of every request slower than threshold_ms; 0 disables"""
+    profiler.slow_request_ms = max(threshold_ms, 0)
+    return profiler.status()
+
+@api_router.get("/profiling/profiles/{profile_id}")
+async def download_profile(profile_id: str, username: str = Depends(get_current_admin)):
+    """Download a profile as folded stacks (flamegraph.pl, inferno, speedscope)"""
+    profile = profiler.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    filename = f"{profile.kind}-{profile.label.strip('/').replace('/', '_')}-{profile.id}.folded"
+    return Response(
+        profile.folded(),
+        media_type="text/plain",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@api_router.post("/analytics/insights/collect")
+async def run_insights_now(username: str = Depends(get_current_admin)):
+    """Manually trigger the clicks/impressions collector"""
+    return trigger_job("insights", run_insights_job)
+
 @api_router.get("/analytics/chart")
-async def get_analytics_chart(days: int = 7, username: str = Depends(get_current_admin)):
-    """Get analytics data for charts"""
-    analytics_list = await db.analytics.find({}, {"_id": 0}).sort("date", -1).limit(days).to_list(days)
+async def get_analytics_chart(days: int = 7, etag: str = conditional_get("analytics"),
+                              username: str = Depends(get_current_admin)):
+    """Get the tenant's analytics data for charts"""
+    with query_budget("analytics"):
+        analytics_list = await reporting_db.analytics.find(tenant_filter("analytics", username), {"_id": 0}).sort("date", -1).limit(days).to_list(days)
     
     for item in analytics_list:
         if isinstance(item.get('created_at'), str):
@@ -616,6 +1653,17 @@ async def get_analytics_chart(days: int = 7, username: str = Depends(get_current
 
 # Include router
 app.include_router(api_router)
+app.mount("/api/media", StaticFiles(directory=MEDIA_CACHE_DIR, check_dir=False), name="media")
+
+class GZipExceptStreamsMiddleware(GZipMiddleware):
+    """GZip that leaves the event stream alone, since gzip would buffer its frames"""
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] == "/api/events":
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+app.add_middleware(GZipExceptStreamsMiddleware, minimum_size=GZIP_MINIMUM_SIZE)
 
 app.add_middleware(
     CORSMiddleware,
@@ -625,33 +1673,82 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+app.add_middleware(ProfilingMiddleware, profiler=profiler)
+
+# Tag every request's log records with its id; outermost so it covers the other middleware
+app.add_middleware(RequestIdMiddleware)
+
+# Configure logging (JSON through a background writer; see logs.py)
+configure_logging()
 logger = logging.getLogger(__name__)
 
+# Seconds spent in each startup step, reported once warm-up completes
+startup_profile: Dict[str, float] = {}
+warmup_task: Optional[asyncio.Task] = None
+
+@contextmanager
+def startup_step(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        startup_profile[name] = time.perf_counter() - started
+
+async def warm_up():
+    """Create indexes, warm in-memory caches from Mongo and resume the scheduler"""
+    started = time.perf_counter()
+    with startup_step("ensure_indexes"):
+        await ensure_indexes()
+    with startup_step("hashtag_index"):
+        await warm_hashtag_index()
+    with startup_step("product_search"):
+        logger.info("Search index warmed with %s products", await product_search.warm(db))
+    with startup_step("post_history"):
+        warmed_posts = await post_history.warm(db)
+        logger.info("Post history warmed from %s recent posts", warmed_posts)
+    with startup_step("short_links"):
+        logger.info("Loaded %s short links", await short_links.warm(db))
+    with startup_step("catalog_refresh"):
+        logger.info("Catalog refresh queue warmed with %s products", await catalog_refresher.warm(db))
+    with startup_step("scheduler"):
+        scheduler_config = await db.scheduler_configs.find_one({"is_active": True}, {"_id": 0})
+        if scheduler_config:
+            await asyncio.to_thread(start_scheduler)
+            logger.info("Scheduler started")
+    startup_profile["warm_up_total"] = time.perf_counter() - started
+    logger.info(
+        "Startup profile: %s",
+        ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in startup_profile.items())
+    )
+
+async def warm_up_in_background():
+    try:
+        await warm_up()
+    except Exception as e:
+        logger.error("Background warm-up failed: %s", e)
+
 @app.on_event("startup")
 async def startup_event():
-    logger.info("Starting AutoAffiliatePublisher backend...")
-    # Start scheduler
-    scheduler_config = await db.scheduler_configs.find_one({}, {"_id": 0})
-    if scheduler_config and scheduler_config.get('is_active'):
-        scheduler.start()
-        scheduler.add_job(
-            run_async_job,
-            'interval',
-            hours=4,
-            id='product_posting_job',
-            replace_existing=True
-        )
-        logger.info("Scheduler started")
+    global warmup_task
+    logger.info("Starting AutoAffiliatePublisher backend (%s startup)...", STARTUP_MODE)
+    MEDIA_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    events.bind(asyncio.get_running_loop())
+    short_links.start(db, analytics_defaults)
+    if STARTUP_MODE == "lazy":
+        warmup_task = asyncio.create_task(warm_up_in_background())
+    else:
+        await warm_up()
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    client.close()
-    if scheduler.running:
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+    await short_links.stop(db, analytics_defaults)
+    # The scheduler's job store shares the Mongo client, so stop it first
+    if scheduler.initialized and scheduler.running:
         scheduler.shutdown()
-    executor.shutdown(wait=False)
-    logger.info("Shutdown complete")
\ No newline at end of file
+    if client.initialized:
+        client.close()
+    if executor.initialized:
+        executor.shutdown(wait=False)
+    logger.info("Shutdown complete")
@@ -0,0 +1,130 @@
+"""Fan-out of background jobs across tenants (one tenant per admin account).
+
+``FairScheduler`` keeps a FIFO queue per tenant and dispatches them
+round-robin under a global concurrency limit, running at most one task per
+tenant at a time and bounding every task with a timeout, so a slow or
+misbehaving tenant can never hold up the others. ``SharedFetchCache``
+de-duplicates identical upstream fetches (e.g. the same RapidAPI search)
+issued by several tenants during one run.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Optional, Tuple
+
+from logs import log_context
+
+TENANT_CONCURRENCY = 8
+TENANT_TIMEOUT = 600.0
+FETCH_CACHE_TTL = 900.0
+# Resolves a shared fetch whose owner failed; waiters then fetch for themselves
+_FAILED = object()
+
+
+class FairScheduler:
+    """Round-robin dispatcher over per-tenant task queues"""
+
+    def __init__(self, max_concurrency: int = TENANT_CONCURRENCY, task_timeout: Optional[float] = TENANT_TIMEOUT):
+        self.max_concurrency = max_concurrency
+        self.task_timeout = task_timeout
+        self._queues: "OrderedDict[Hashable, Deque[Tuple[str, Callable[[], Awaitable[Any]]]]]" = OrderedDict()
+        self.results: Dict[Hashable, list] = {}
+
+    def submit(self, tenant: Hashable, factory: Callable[[], Awaitable[Any]], name: str = "task"):
+        """Queue a coroutine factory for a tenant"""
+        self._queues.setdefault(tenant, deque()).append((name, factory))
+
+    def _next(self, running: set) -> Optional[Tuple[Hashable, str, Callable[[], Awaitable[Any]]]]:
+        # Rotate through tenants; a tenant with a running task waits for its next turn
+        for _ in range(len(self._queues)):
+            tenant, queue = next(iter(self._queues.items()))
+            self._queues.move_to_end(tenant)
+            if tenant in running or not queue:
+                continue
+            name, factory = queue.popleft()
+            return tenant, name, factory
+        return None
+
+    async def _run_one(self, tenant: Hashable, name: str, factory: Callable[[], Awaitable[Any]]):
+        started = time.monotonic()
+        try:
+            if self.task_timeout:
+                result = await asyncio.wait_for(factory(), self.task_timeout)
+            else:
+                result = await factory()
+        except asyncio.TimeoutError:
+            logging.error("Tenant %r %s timed out after %gs", tenant, name, self.task_timeout)
+            result = None
+        except Exception as e:
+            logging.error("Tenant %r %s failed: %s", tenant, name, e)
+            result = None
+        self.results.setdefault(tenant, []).append(result)
+        logging.info("Tenant %r %s finished in %.1fs", tenant, name, time.monotonic() - started)
+
+    async def run(self) -> Dict[Hashable, list]:
+        """Run every queued task; returns per-tenant results (None for failures)"""
+        running_tenants: set = set()
+        tasks: Dict[asyncio.Task, Hashable] = {}
+        while True:
+            while len(tasks) < self.max_concurrency:
+                picked = self._next(running_tenants)
+                if picked is None:
+                    break
+                tenant, name, factory = picked
+                running_tenants.add(tenant)
+                # The task copies the context here, so its log records carry the tenant
+                with log_context(tenant=str(tenant)):
+                    tasks[asyncio.create_task(self._run_one(tenant, name, factory))] = tenant
+            if not tasks:
+                break
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                running_tenants.discard(tasks.pop(task))
+        self._queues.clear()
+        return self.results
+
+
+class SharedFetchCache:
+    """Single-flight, short-lived cache for upstream fetches shared by tenants
+
+    Only successes are shared. Callers waiting on a fetch that raised (e.g. one tenant's
+    rejected or rate-limited key) fetch again themselves, and empty results are not kept
+    for later callers.
+    """
+
+    def __init__(self, ttl: float = FETCH_CACHE_TTL):
+        self.ttl = ttl
+        self._entries: Dict[Hashable, Tuple[float, asyncio.Future]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the cached or in-flight result for key, calling fetch only once"""
+        while True:
+            entry = self._entries.get(key)
+            if not entry or time.monotonic() - entry[0] >= self.ttl:
+                break
+            result = await asyncio.shield(entry[1])
+            if result is not _FAILED:
+                self.hits += 1
+                return result
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._entries[key] = (time.monotonic(), future)
+        try:
+            result = await fetch()
+        except BaseException:
+            self._forget(key, future)
+            future.set_result(_FAILED)
+            raise
+        if not result:
+            self._forget(key, future)
+        future.set_result(result)
+        return result
+
+    def _forget(self, key: Hashable, future: asyncio.Future):
+        entry = self._entries.get(key)
+        if entry and entry[1] is future:
+            del self._entries[key]
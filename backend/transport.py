@@ -0,0 +1,227 @@
+"""Record/replay HTTP transport for the external integrations.
+
+Every integration builds its httpx client through ``http_client``. With
+``HTTP_CASSETTE`` unset that is a plain client. With ``HTTP_CASSETTE`` set to
+a file path:
+
+* ``HTTP_CASSETTE_MODE=record`` sends requests for real and appends each
+  request/response pair (raw response bytes, headers, status and elapsed
+  time) to the cassette, one JSON object per line;
+* ``HTTP_CASSETTE_MODE=replay`` (the default) answers from the cassette with
+  no network access, sleeping for the recorded latency multiplied by
+  ``HTTP_REPLAY_TIME_SCALE`` (``0`` replays as fast as possible).
+
+Response bodies are stored decoded (gzip/deflate/br removed, along with the
+``content-encoding`` and ``content-length`` headers) so that access tokens
+and API keys can be redacted before anything is written, and
+requests are matched on the redacted method, URL and body, so a cassette
+recorded with one set of credentials replays with any other. Identical
+requests replay their recorded responses in order; a status poll whose exact
+URL was never recorded gets the latest response recorded for the same
+endpoint.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import httpx
+
+SECRET_PARAMS = {"access_token", "client_secret", "input_token", "appsecret_proof"}
+RECORDED_REQUEST_HEADERS = {"content-type", "accept"}
+# Describe the encoded body on the wire, not the decoded one that is stored
+DROPPED_RESPONSE_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+REDACTED = "REDACTED"
+# Tokens handed back in JSON responses (e.g. page access tokens); replaced in place so
+# the rest of the body stays byte-identical
+SECRET_JSON_RE = re.compile(rb'("(?:access_token|refresh_token)"\s*:\s*")[^"]*(")')
+
+
+class CassetteMiss(httpx.TransportError):
+    """No recorded response matches the request"""
+
+
+def _redact_query(query: str) -> str:
+    pairs = parse_qsl(query, keep_blank_values=True)
+    return urlencode([(key, REDACTED if key in SECRET_PARAMS else value) for key, value in pairs])
+
+
+def redact_url(url: httpx.URL) -> str:
+    parts = urlsplit(str(url))
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, _redact_query(parts.query), ""))
+
+
+def redact_body(content: bytes, content_type: str) -> str:
+    if "application/x-www-form-urlencoded" in content_type:
+        return _redact_query(content.decode("utf-8", "replace"))
+    return content.decode("utf-8", "replace")
+
+
+def decode_response(raw: bytes, headers: httpx.Headers) -> Tuple[bytes, List[Tuple[str, str]]]:
+    """Decoded body and the headers that still describe it"""
+    body = httpx.Response(200, headers=headers, content=raw).content
+    return body, [(k, v) for k, v in headers.multi_items() if k.lower() not in DROPPED_RESPONSE_HEADERS]
+
+
+def redact_response(body: bytes) -> bytes:
+    return SECRET_JSON_RE.sub(rb"\g<1>" + REDACTED.encode() + rb"\g<2>", body)
+
+
+def request_key(method: str, url: str, body: str) -> str:
+    return f"{method} {url} {hashlib.sha256(body.encode()).hexdigest()[:16]}"
+
+
+def endpoint_key(method: str, url: str) -> str:
+    parts = urlsplit(url)
+    return f"{method} {parts.netloc}{parts.path}"
+
+
+class Cassette:
+    """Recorded interactions in a JSON Lines file; safe to share across threads and loops"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._exact: Dict[str, Deque[Dict]] = {}
+        self._last_exact: Dict[str, Dict] = {}
+        self._by_endpoint: Dict[str, Dict] = {}
+        self.recorded = 0
+        self.replayed = 0
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as handle:
+                for line in handle:
+                    if line.strip():
+                        self._index(json.loads(line))
+
+    def __len__(self) -> int:
+        return sum(len(queue) for queue in self._exact.values())
+
+    def _index(self, interaction: Dict):
+        request = interaction["request"]
+        self._exact.setdefault(request["key"], deque()).append(interaction)
+        self._by_endpoint[endpoint_key(request["method"], request["url"])] = interaction
+
+    def record(self, interaction: Dict):
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as handle:
+                handle.write(json.dumps(interaction, separators=(",", ":")) + "\n")
+            self.recorded += 1
+
+    def match(self, method: str, url: str, key: str) -> Optional[Dict]:
+        """Next recorded interaction for key; repeats the last one once a key is exhausted"""
+        with self._lock:
+            queue = self._exact.get(key)
+            if queue:
+                interaction = queue.popleft()
+                self._last_exact[key] = interaction
+            else:
+                interaction = self._last_exact.get(key) or self._by_endpoint.get(endpoint_key(method, url))
+            if interaction is not None:
+                self.replayed += 1
+            return interaction
+
+
+class CassetteTransport(httpx.AsyncBaseTransport):
+    """Records through an inner transport, or replays from the cassette alone"""
+
+    def __init__(self, cassette: Cassette, mode: str = "replay", time_scale: float = 1.0,
+                 inner: Optional[httpx.AsyncBaseTransport] = None):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.cassette = cassette
+        self.mode = mode
+        self.time_scale = time_scale
+        self.inner = inner or (httpx.AsyncHTTPTransport() if mode == "record" else None)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        content = await request.aread()
+        url = redact_url(request.url)
+        body = redact_body(content, request.headers.get("content-type", ""))
+        key = request_key(request.method, url, body)
+        if self.mode == "record":
+            return await self._record(request, url, body, key)
+        return await self._replay(request, url, key)
+
+    async def _record(self, request: httpx.Request, url: str, body: str, key: str) -> httpx.Response:
+        started = time.perf_counter()
+        response = await self.inner.handle_async_request(request)
+        try:
+            raw = b"".join([chunk async for chunk in response.stream])
+        finally:
+            await response.aclose()
+        elapsed = time.perf_counter() - started
+        body_bytes, headers = decode_response(raw, response.headers)
+        self.cassette.record({
+            "request": {
+                "method": request.method,
+                "url": url,
+                "headers": {k: v for k, v in request.headers.items() if k.lower() in RECORDED_REQUEST_HEADERS},
+                "body": body,
+                "key": key,
+            },
+            "response": {
+                "status": response.status_code,
+                "headers": headers,
+                "body": base64.b64encode(redact_response(body_bytes)).decode(),
+            },
+            "elapsed": elapsed,
+        })
+        return httpx.Response(response.status_code, headers=response.headers.multi_items(), content=raw,
+                              request=request, extensions=response.extensions)
+
+    async def _replay(self, request: httpx.Request, url: str, key: str) -> httpx.Response:
+        interaction = self.cassette.match(request.method, url, key)
+        if interaction is None:
+            raise CassetteMiss(f"No recorded response for {request.method} {url}", request=request)
+        if self.time_scale > 0:
+            await asyncio.sleep(interaction["elapsed"] * self.time_scale)
+        recorded = interaction["response"]
+        return httpx.Response(
+            recorded["status"],
+            headers=[tuple(header) for header in recorded["headers"]],
+            content=base64.b64decode(recorded["body"]),
+            request=request,
+        )
+
+    async def aclose(self):
+        if self.inner is not None:
+            await self.inner.aclose()
+
+
+_cassettes: Dict[str, Cassette] = {}
+_cassettes_lock = threading.Lock()
+
+
+def get_cassette(path: str) -> Cassette:
+    """One shared Cassette per path, so replay order is kept across clients"""
+    with _cassettes_lock:
+        if path not in _cassettes:
+            _cassettes[path] = Cassette(path)
+        return _cassettes[path]
+
+
+def default_transport() -> Optional[httpx.AsyncBaseTransport]:
+    """Transport selected by the HTTP_CASSETTE* environment variables, or None for the network"""
+    path = os.environ.get('HTTP_CASSETTE')
+    if not path:
+        return None
+    return CassetteTransport(
+        get_cassette(path),
+        mode=os.environ.get('HTTP_CASSETTE_MODE', 'replay').lower(),
+        time_scale=float(os.environ.get('HTTP_REPLAY_TIME_SCALE', '1.0')),
+    )
+
+
+def http_client(**kwargs) -> httpx.AsyncClient:
+    """httpx.AsyncClient for an integration, recording or replaying when configured"""
+    return httpx.AsyncClient(transport=default_transport(), **kwargs)
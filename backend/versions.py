@@ -0,0 +1,46 @@
+"""Per-collection change counters for conditional GETs.
+
+Writers call ``DataVersions.bump`` after changing a collection, and read
+endpoints derive a strong ETag from the versions of the collections they
+read plus the request's query string. A poll whose ``If-None-Match`` still
+matches can then be answered with ``304 Not Modified`` without touching
+Mongo. Counters live in process memory, so the ETag also carries a random
+epoch that changes on restart; writes made by other processes are not seen.
+"""
+import hashlib
+import threading
+import uuid
+from typing import Dict, Iterable
+
+
+class DataVersions:
+    """Monotonic change counters keyed by collection name"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions: Dict[str, int] = {}
+        self.epoch = uuid.uuid4().hex[:8]
+
+    def bump(self, *collections: str):
+        """Record that each collection has changed"""
+        with self._lock:
+            for collection in collections:
+                self._versions[collection] = self._versions.get(collection, 0) + 1
+
+    def get(self, collection: str) -> int:
+        return self._versions.get(collection, 0)
+
+    def etag(self, collections: Iterable[str], variant: str = "") -> str:
+        """Strong ETag for a response built from collections; variant covers query parameters"""
+        versions = ".".join(str(self.get(collection)) for collection in collections)
+        digest = hashlib.blake2b(variant.encode(), digest_size=6).hexdigest()
+        return f'"{self.epoch}-{versions}-{digest}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Does an If-None-Match header value match etag?"""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    # GZipMiddleware leaves ETags alone, but proxies may weaken them
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
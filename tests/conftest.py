@@ -0,0 +1,12 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# The backend modules import each other as top-level modules
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+# Enough configuration for `import server`; nothing connects until a resource is used
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:1")
+os.environ.setdefault("DB_NAME", "test")
+os.environ.setdefault("MEDIA_CACHE_DIR", tempfile.mkdtemp(prefix="media-cache-"))
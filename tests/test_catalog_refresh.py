@@ -0,0 +1,168 @@
+import asyncio
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+import catalog_refresh
+from catalog_refresh import (REFRESH_BACKOFF_SECONDS, REFRESH_MAX_BACKOFF_SECONDS, RETRY_FRACTION,
+                             CatalogRefresher, RefreshQueue)
+from server import Product
+
+HOUR = 3600
+START = 1_800_000_000.0
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [START]
+    monkeypatch.setattr(catalog_refresh.time, "time", lambda: now[0])
+    return now
+
+
+def test_queue_pops_stalest_relative_to_importance():
+    queue = RefreshQueue(base_hours=10, min_hours=1)
+    queue.touch("OLD", START - 9 * HOUR)
+    queue.touch("HOT", START - 4 * HOUR)
+    queue.touch("NEW", START - 1 * HOUR)
+    assert queue.pop_due(10, now=START) == []
+
+    # Importance 4 shortens HOT's interval to 2.5h, making it overdue
+    queue.set_importance({"HOT": 4.0})
+    assert queue.pop_due(10, now=START + HOUR) == ["HOT", "OLD"]
+    assert queue.pop_due(10, now=START + 20 * HOUR) == ["NEW"]
+    # A large importance is capped by the minimum interval
+    queue.set_importance({"NEW": 1000.0})
+    assert queue.interval("NEW") == HOUR
+
+
+def test_retry_later_and_requeue():
+    queue = RefreshQueue(base_hours=8, min_hours=1)
+    queue.touch_many([{"asin": "A", "fetched_at": START - 10 * HOUR}, {"asin": "B", "fetched_at": START - 9 * HOUR},
+                      {"asin": None}])
+    assert len(queue) == 2
+    taken = queue.pop_due(10, now=START)
+    assert taken == ["A", "B"]
+
+    queue.retry_later(["A"], now=START)
+    queue.requeue(["B"])
+    # B goes back at its old due time; A waits a fraction of its interval
+    assert queue.pop_due(10, now=START) == ["B"]
+    assert queue.pop_due(10, now=START + 8 * HOUR * RETRY_FRACTION) == ["A"]
+
+    queue.remove(["A", "B"])
+    queue.requeue(["A"])
+    assert len(queue) == 0 and queue.pop_due(10, now=START + 100 * HOUR) == []
+
+
+class Products:
+    def __init__(self):
+        self.operations = []
+
+    async def bulk_write(self, operations, ordered=True):
+        self.operations.extend(operations)
+
+
+class Posts:
+    def aggregate(self, pipeline):
+        return self._rows()
+
+    async def _rows(self):
+        for row in ():
+            yield row
+
+
+def make_db():
+    return SimpleNamespace(products=Products(), posts=Posts())
+
+
+def product(asin):
+    return Product(asin=asin, title=f"New {asin}", product_url=f"https://www.amazon.com/dp/{asin}",
+                   image_url=f"https://img/{asin}.jpg", fetched_at=datetime.fromtimestamp(START, timezone.utc))
+
+
+def refresher_with(asins):
+    refresher = CatalogRefresher(RefreshQueue(base_hours=1, min_hours=1))
+    refresher.queue.touch_many({"asin": asin, "fetched_at": START - 2 * HOUR} for asin in asins)
+    return refresher
+
+
+def test_tick_writes_upstream_fields_and_retries_missing(clock):
+    db = make_db()
+    refresher = refresher_with(["A", "B", "C"])
+    calls = []
+
+    async def lookup(batch):
+        calls.append(batch)
+        return [product(asin) for asin in batch if asin != "B"]
+
+    refreshed = []
+    tick = asyncio.run(refresher.tick(db, lookup, budget=5, batch_size=2, on_refresh=refreshed.extend))
+    assert calls == [["A", "B"], ["C"]]
+    assert (tick["requests"], tick["refreshed"], tick["missing"], tick["error"]) == (2, 2, 1, None)
+    assert [doc["asin"] for doc in refreshed] == ["A", "C"]
+    assert set(refreshed[0]) == set(catalog_refresh.UPSTREAM_FIELDS) | {"asin"}
+
+    # Each refreshed product clears stale media before setting the new fields
+    unset, update = db.products.operations[:2]
+    assert unset._filter == {"asin": "A", "image_url": {"$ne": "https://img/A.jpg"}}
+    assert update._doc["$set"]["title"] == "New A" and "id" not in update._doc["$set"]
+
+    # A and C are fresh again; B comes back after a quarter interval
+    assert refresher.queue.pop_due(10, now=START + 0.5 * HOUR) == ["B"]
+
+
+def test_budget_caps_the_lookups_per_tick(clock):
+    refresher = refresher_with([f"A{i}" for i in range(10)])
+    calls = []
+
+    async def lookup(batch):
+        calls.append(batch)
+        return []
+
+    asyncio.run(refresher.tick(make_db(), lookup, budget=2, batch_size=3))
+    assert [len(batch) for batch in calls] == [3, 3]
+    assert len(refresher.queue.pop_due(100, now=START)) == 4
+
+
+def test_failed_lookups_back_off_exponentially_until_success(clock):
+    db = make_db()
+    refresher = refresher_with(["A", "B", "C"])
+    calls = []
+    failing = [True]
+
+    async def lookup(batch):
+        calls.append(batch)
+        if failing[0]:
+            raise RuntimeError("RapidAPI error: 429 - Too many requests")
+        return [product(asin) for asin in batch]
+
+    tick = asyncio.run(refresher.tick(db, lookup, budget=5, batch_size=1))
+    # The first failure ends the tick and nothing is lost from the queue
+    assert calls == [["A"]] and tick["error"].startswith("RapidAPI error: 429")
+    assert refresher.failures == 1
+    assert refresher.backoff_until == START + REFRESH_BACKOFF_SECONDS
+    assert db.products.operations == []
+
+    # Ticks inside the back-off are skipped without calling upstream
+    clock[0] += REFRESH_BACKOFF_SECONDS - 1
+    assert asyncio.run(refresher.tick(db, lookup, budget=5, batch_size=1)) is tick
+    assert len(calls) == 1
+
+    clock[0] += 1
+    asyncio.run(refresher.tick(db, lookup, budget=5, batch_size=1))
+    assert refresher.failures == 2
+    assert refresher.backoff_until == clock[0] + 2 * REFRESH_BACKOFF_SECONDS
+
+    # The back-off doubles up to the maximum
+    refresher.failures = 40
+    clock[0] = refresher.backoff_until
+    asyncio.run(refresher.tick(db, lookup, budget=5, batch_size=1))
+    assert refresher.backoff_until == clock[0] + REFRESH_MAX_BACKOFF_SECONDS
+
+    # A successful tick resets it
+    failing[0] = False
+    clock[0] = refresher.backoff_until
+    tick = asyncio.run(refresher.tick(db, lookup, budget=5, batch_size=1))
+    assert tick["refreshed"] == 3 and tick["error"] is None and tick["backoff_until"] is None
+    assert (refresher.failures, refresher.backoff_until) == (0, 0.0)
@@ -0,0 +1,100 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from events import EventBroadcaster, StreamTickets
+
+
+def test_tickets_are_single_use():
+    tickets = StreamTickets(ttl=30)
+    ticket = tickets.issue("alice")
+    assert tickets.redeem(ticket) == "alice"
+    assert tickets.redeem(ticket) is None
+    assert tickets.redeem("made-up") is None
+
+
+def test_tickets_expire():
+    tickets = StreamTickets(ttl=0.01)
+    ticket = tickets.issue("alice")
+    time.sleep(0.02)
+    assert tickets.redeem(ticket) is None
+    # Expired tickets are purged when new ones are issued
+    tickets.issue("bob")
+    assert ticket not in tickets._tickets
+
+
+@pytest.fixture
+def client():
+    return TestClient(server.app)
+
+
+def test_stream_needs_a_ticket_not_a_jwt_in_the_url(client):
+    token = server.create_access_token({"sub": "alice"})
+    assert client.get("/api/events").status_code == 401
+    assert client.get("/api/events", params={"token": token}).status_code == 401
+    assert client.get("/api/events", params={"ticket": "made-up"}).status_code == 401
+
+    response = client.post("/api/events/ticket", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["expires_in"] == server.stream_tickets.ttl
+    assert server.stream_tickets.redeem(body["ticket"]) == "alice"
+
+
+def test_ticket_endpoint_requires_login(client):
+    assert client.post("/api/events/ticket").status_code in (401, 403)
+
+
+def test_events_reach_matching_tenants_in_order():
+    async def scenario():
+        broadcaster = EventBroadcaster()
+        broadcaster.bind(asyncio.get_running_loop())
+        alice, bob = broadcaster.subscribe("alice"), broadcaster.subscribe("bob")
+        broadcaster.publish("job.started", {"job": "posting"}, tenant="alice")
+        broadcaster.publish("post.created", {"id": "p1"})
+        alice_frames = [await alice.next_frame(1), await alice.next_frame(1)]
+        bob_frame = await bob.next_frame(1)
+        broadcaster.unsubscribe(bob)
+        return len(broadcaster), alice_frames, bob_frame
+
+    subscribers, alice_frames, bob_frame = asyncio.run(scenario())
+    assert subscribers == 1
+    assert alice_frames == [
+        b'id: 1\nevent: job.started\ndata: {"job":"posting"}\n\n',
+        b'id: 2\nevent: post.created\ndata: {"id":"p1"}\n\n',
+    ]
+    assert bob_frame == alice_frames[1]
+
+
+def test_events_from_other_threads_are_delivered_on_the_loop():
+    async def scenario():
+        broadcaster = EventBroadcaster()
+        broadcaster.bind(asyncio.get_running_loop())
+        subscription = broadcaster.subscribe()
+        publisher = threading.Thread(target=broadcaster.publish, args=("job.finished", {"state": "succeeded"}))
+        publisher.start()
+        publisher.join()
+        return await subscription.next_frame(1)
+
+    assert asyncio.run(scenario()).endswith(b'data: {"state":"succeeded"}\n\n')
+
+
+def test_slow_subscribers_lose_the_oldest_frames():
+    async def scenario():
+        broadcaster = EventBroadcaster(buffer_size=2)
+        broadcaster.bind(asyncio.get_running_loop())
+        subscription = broadcaster.subscribe()
+        for index in range(5):
+            broadcaster.publish("tick", {"n": index})
+        return [await subscription.next_frame(1), await subscription.next_frame(1),
+                await subscription.next_frame(0.01)]
+
+    lagged, last, keepalive = asyncio.run(scenario())
+    assert lagged.startswith(b'event: stream.lagged\ndata: {"dropped":3}\n\n')
+    assert lagged.endswith(b'data: {"n":3}\n\n')
+    assert last.endswith(b'data: {"n":4}\n\n')
+    assert keepalive == b": keepalive\n\n"
@@ -0,0 +1,96 @@
+import asyncio
+import csv
+import io
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import orjson
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pydantic import BaseModel
+
+from exports import columns_for, date_range_filter, stream_export
+
+
+class Item(BaseModel):
+    name: str
+    count: int = 0
+    price: Optional[float] = None
+    active: bool = True
+    created_at: datetime
+    tags: List[str] = []
+    extra: Dict[str, str] = {}
+
+
+COLUMNS = columns_for(Item, {"clicks": "int64"})
+
+DOCS = [
+    {"name": "a", "count": 3, "price": 9.5, "active": True, "created_at": "2027-03-01T12:00:00+00:00",
+     "tags": ["x", "y"], "clicks": 7},
+    # An older document: missing fields, a datetime object and values stored with the wrong type
+    {"name": 5, "count": "12", "price": "n/a", "created_at": datetime(2027, 3, 2, tzinfo=timezone.utc)},
+]
+
+
+class Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self.docs:
+            yield doc
+
+
+def export(fmt, docs=DOCS, chunk_rows=1):
+    async def collect():
+        return [data async for data in stream_export(Cursor(docs), fmt, COLUMNS, "items", chunk_rows)]
+    return asyncio.run(collect())
+
+
+def test_columns_follow_the_model():
+    assert COLUMNS == [
+        ("name", "string"), ("count", "int64"), ("price", "float64"), ("active", "bool"),
+        ("created_at", "string"), ("tags", "string"), ("extra", "string"), ("clicks", "int64"),
+    ]
+
+
+def test_parquet_schema_is_fixed_across_row_groups():
+    table = pq.read_table(io.BytesIO(b"".join(export("parquet"))))
+    assert table.schema.types == [pa.string(), pa.int64(), pa.float64(), pa.bool_(),
+                                  pa.string(), pa.string(), pa.string(), pa.int64()]
+    assert pq.ParquetFile(io.BytesIO(b"".join(export("parquet")))).num_row_groups == 2
+    assert table.to_pylist() == [
+        {"name": "a", "count": 3, "price": 9.5, "active": True, "created_at": "2027-03-01T12:00:00+00:00",
+         "tags": "['x', 'y']", "extra": None, "clicks": 7},
+        {"name": "5", "count": 12, "price": None, "active": None, "created_at": "2027-03-02T00:00:00+00:00",
+         "tags": None, "extra": None, "clicks": None},
+    ]
+
+
+def test_csv_and_ndjson_use_the_same_columns():
+    rows = list(csv.reader(io.StringIO(b"".join(export("csv")).decode())))
+    assert rows[0] == [name for name, _ in COLUMNS]
+    assert rows[2] == ["5", "12", "", "", "2027-03-02T00:00:00+00:00", "", "", ""]
+
+    lines = b"".join(export("ndjson")).splitlines()
+    assert [list(orjson.loads(line)) for line in lines] == [rows[0], rows[0]]
+    assert orjson.loads(lines[1])["count"] == 12
+
+
+def test_each_chunk_is_yielded_as_it_is_read():
+    assert len(export("ndjson")) == 2
+    assert len(export("ndjson", chunk_rows=10)) == 1
+    assert b"".join(export("csv", docs=[])).decode().strip() == ",".join(name for name, _ in COLUMNS)
+
+
+def test_date_range_end_covers_the_whole_day():
+    bounds = date_range_filter("created_at", "2027-03-01", "2027-03-01")["created_at"]
+    assert bounds["$gte"] <= "2027-03-01T23:59:59+00:00" <= bounds["$lte"]
+    assert bounds["$lte"] < "2027-03-02"
+    assert date_range_filter("created_at", None, "2027-03-01T12:00:00") == {
+        "created_at": {"$lte": "2027-03-01T12:00:00"}
+    }
+    assert date_range_filter("created_at", None, None) == {}
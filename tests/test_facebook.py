@@ -0,0 +1,50 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from facebook import graph_batch, publish_page_posts
+
+OPERATIONS = [{"method": "GET", "relative_url": "me"}, {"method": "GET", "relative_url": "me/accounts"}]
+
+
+def run_batch(handler):
+    async def go():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await graph_batch(client, "token", OPERATIONS)
+    return asyncio.run(go())
+
+
+@pytest.mark.parametrize("status,retry", [(500, True), (503, True), (429, True), (400, False), (401, False)])
+def test_batch_level_failures_retry_only_when_transient(status, retry):
+    results = run_batch(lambda request: httpx.Response(status, text="nope"))
+    assert [result["retry"] for result in results] == [retry, retry]
+    assert all(result["error"] for result in results)
+
+
+def test_transport_errors_are_retried():
+    def handler(request):
+        raise httpx.ConnectError("down", request=request)
+    assert [result["retry"] for result in run_batch(handler)] == [True, True]
+
+
+def test_per_item_results_map_back_to_keys():
+    def handler(request):
+        body = request.content.decode()
+        if "photos" not in body:
+            return httpx.Response(200, json=[{"code": 200, "body": json.dumps({"access_token": "page"})}])
+        return httpx.Response(200, json=[
+            {"code": 200, "body": json.dumps({"id": "photo1", "post_id": "page_post1"})},
+            {"code": 400, "body": json.dumps({"error": {"message": "Invalid image"}})},
+            None,
+        ])
+
+    async def go():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await publish_page_posts("token", "page", [("a", "u1", "c"), ("b", "u2", "c"), ("c", "u3", "c")],
+                                            client=client)
+    outcomes = asyncio.run(go())
+    assert outcomes["a"] == {"success": True, "post_id": "page_post1"}
+    assert outcomes["b"] == {"success": False, "error": "Invalid image", "retry": False}
+    assert outcomes["c"]["success"] is False and outcomes["c"]["retry"] is False
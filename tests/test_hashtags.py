@@ -0,0 +1,48 @@
+import hashtags
+from hashtags import BASE_HASHTAGS, HashtagIndex, tokenize
+
+
+def test_tokenize_drops_stopwords_short_words_and_repeats():
+    assert tokenize("The NEW Wireless headphones, 2 Pack - wireless!") == ["wireless", "headphones"]
+    assert tokenize("") == [] and tokenize(None) == []
+
+
+def test_seed_keywords_rank_first_and_base_tags_fill_up():
+    tags = HashtagIndex().tag("Noise Cancelling Headphones", "Electronics")
+    assert len(tags) == 10 and len(set(tags)) == 10
+    # Category tokens weigh more than title tokens
+    assert tags[:3] == ["#Electronics", "#TechDeals", "#Gadgets"]
+    assert {"#Headphones", "#AudioGear"} <= set(tags)
+    assert tags[-1] in BASE_HASHTAGS
+
+
+def test_untagged_product_gets_the_base_tags():
+    assert HashtagIndex().tag("", None) == BASE_HASHTAGS
+    assert HashtagIndex(max_tags=3).tag("Zzzqx thing") == BASE_HASHTAGS[:3]
+
+
+def test_learns_title_words_from_categories():
+    index = HashtagIndex()
+    assert index.add_products([
+        ("A1", "Silicone Spatula", "Kitchen"),
+        ("A2", "Silicone Baking Mat", "Kitchen"),
+        ("A1", "Silicone Spatula", "Kitchen"),   # already indexed
+    ]) == 2
+    assert len(index) == 2
+    tags = index.tag("Silicone Ladle")
+    # A word first seen in titles gets its own tag plus the tags of the categories it appears in
+    assert set(tags[:3]) == {"#Silicone", "#KitchenGadgets", "#HomeCooking"}
+    assert "#Ladle" not in tags
+
+
+def test_batch_matches_single_and_chunking(monkeypatch):
+    index = HashtagIndex()
+    index.add_products([(f"A{i}", f"Gadget {word} holder", "Office") for i, word in enumerate(
+        ["desk", "pen", "phone", "cable", "laptop", "monitor"]
+    )])
+    items = [("Desk Pen Holder", "Office"), ("Dog Bed", "Pet"), ("", ""), ("Laptop Stand", None)] * 3
+    expected = [index.tag(title, category) for title, category in items]
+    assert index.tag_batch(items) == expected
+    # Tiny score matrices: rows are scored a few at a time with the same result
+    monkeypatch.setattr(hashtags, "SCORE_CELLS", len(index._tags) * 2)
+    assert index.tag_batch(items) == expected
@@ -0,0 +1,152 @@
+import asyncio
+import json
+from datetime import datetime, timezone
+from urllib.parse import parse_qs
+
+import httpx
+import pytest
+
+import insights
+from insights import REFRESH_INTERVAL, collect_insights
+
+NOW = datetime(2027, 3, 1, 12, tzinfo=timezone.utc)
+
+# platform_post_id -> cumulative upstream counters (None: the operation fails)
+UPSTREAM = {
+    "ig-1": {"impressions": 120},
+    "ig-2": None,
+    "fb-1": {"post_impressions": 500, "post_clicks": 40},
+}
+
+
+def reading(post_id, metrics):
+    values = UPSTREAM[post_id]
+    if values is None:
+        return {"code": 400, "body": json.dumps({"error": {"message": "Unsupported get request"}})}
+    data = [{"name": name, "values": [{"value": values[name]}]} for name in metrics.split(",")]
+    return {"code": 200, "body": json.dumps({"data": data})}
+
+
+def handler(request: httpx.Request) -> httpx.Response:
+    form = parse_qs(request.content.decode())
+    entries = []
+    for operation in json.loads(form["batch"][0]):
+        path, _, query = operation["relative_url"].partition("?")
+        if path.endswith("/insights"):
+            entries.append(reading(path.split("/")[0], parse_qs(query)["metric"][0]))
+        else:
+            entries.append({"code": 200, "body": json.dumps({"id": path, "access_token": "page-token"})})
+    return httpx.Response(200, json=entries)
+
+
+class Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def limit(self, count):
+        self.docs = self.docs[:count]
+        return self
+
+    async def to_list(self, length):
+        return [dict(doc) for doc in self.docs]
+
+
+class Posts:
+    def __init__(self, docs):
+        self.docs = docs
+        self.queries = []
+
+    def find(self, query, projection):
+        self.queries.append(query)
+        platforms = query["platform"]["$in"]
+        return Cursor([doc for doc in self.docs if doc["platform"] in platforms])
+
+    async def bulk_write(self, operations, ordered=True):
+        for operation in operations:
+            doc = next(doc for doc in self.docs if doc["id"] == operation._filter["id"])
+            doc.update(operation._doc["$set"])
+
+
+class Analytics:
+    def __init__(self):
+        self.updates = []
+
+    async def update_one(self, query, update, upsert=False):
+        self.updates.append((query, update))
+
+
+class Db:
+    def __init__(self, posts):
+        self.posts = Posts(posts)
+        self.analytics = Analytics()
+
+
+@pytest.fixture(autouse=True)
+def graph(monkeypatch):
+    monkeypatch.setattr(insights, "http_client", lambda **kwargs: httpx.AsyncClient(
+        transport=httpx.MockTransport(handler), **kwargs
+    ))
+
+
+def posts():
+    return [
+        {"id": "p1", "platform": "instagram", "platform_post_id": "ig-1", "insights_impressions": 100},
+        {"id": "p2", "platform": "instagram", "platform_post_id": "ig-2"},
+        {"id": "p3", "platform": "facebook", "platform_post_id": "fb-1"},
+    ]
+
+
+CONFIG = {
+    "admin_username": "alice",
+    "instagram_access_token": "ig-token",
+    "facebook_access_token": "fb-token",
+    "facebook_page_id": "page-1",
+}
+DEFAULTS = {"date": "", "admin_username": None, "clicks": 0, "impressions": 0, "posts_count": 0}
+
+
+def test_only_growth_since_the_last_reading_is_counted():
+    db = Db(posts())
+    totals = asyncio.run(collect_insights(db, CONFIG, DEFAULTS, now=NOW))
+    assert totals == {"clicks": 40, "impressions": 20 + 500, "posts": 2}
+
+    query, update = db.analytics.updates[0]
+    assert query == {"date": "2027-03-01", "admin_username": "alice"}
+    assert update["$inc"] == {"clicks": 40, "impressions": 520}
+    assert update["$setOnInsert"] == {"posts_count": 0}
+
+    by_id = {doc["id"]: doc for doc in db.posts.docs}
+    assert by_id["p1"]["insights_impressions"] == 120
+    assert by_id["p3"]["insights_clicks"] == 40
+    # A failed reading keeps its counters and is retried at the next interval
+    assert "insights_impressions" not in by_id["p2"]
+    next_at = (NOW + REFRESH_INTERVAL).isoformat()
+    assert {doc["insights_next_at"] for doc in db.posts.docs} == {next_at}
+
+    # The same cumulative values read again add nothing
+    totals = asyncio.run(collect_insights(db, CONFIG, DEFAULTS, now=NOW + REFRESH_INTERVAL))
+    assert totals == {"clicks": 0, "impressions": 0, "posts": 2}
+    assert len(db.analytics.updates) == 1
+
+
+def test_counters_never_go_backwards():
+    db = Db([{"id": "p1", "platform": "instagram", "platform_post_id": "ig-1", "insights_impressions": 150}])
+    totals = asyncio.run(collect_insights(db, {"instagram_access_token": "t"}, DEFAULTS, now=NOW))
+    assert totals == {"clicks": 0, "impressions": 0, "posts": 1}
+    assert db.posts.docs[0]["insights_impressions"] == 150
+    assert db.analytics.updates == []
+
+
+def test_pass_is_limited_to_configured_platforms_and_filter():
+    db = Db(posts())
+    config = {"facebook_access_token": "fb-token"}
+    totals = asyncio.run(collect_insights(db, config, DEFAULTS, now=NOW,
+                                          posts_filter={"admin_username": "alice"}))
+    assert totals["posts"] == 1
+    query = db.posts.queries[0]
+    assert query["platform"] == {"$in": ["facebook"]}
+    assert query["admin_username"] == "alice"
+
+    db = Db(posts())
+    assert asyncio.run(collect_insights(db, {}, DEFAULTS, now=NOW)) == {"clicks": 0, "impressions": 0, "posts": 0}
+    assert db.posts.queries == []
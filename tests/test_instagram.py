@@ -0,0 +1,48 @@
+import asyncio
+
+import httpx
+
+from instagram import publish_batch
+
+
+def graph_handler(poll_failures: int):
+    state = {"polls": 0, "created": 0, "published": []}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        if path.endswith("/media"):
+            body = request.content.decode()
+            if "bad.jpg" in body:
+                return httpx.Response(400, json={"error": {"message": "Invalid image"}})
+            state["created"] += 1
+            return httpx.Response(200, json={"id": f"container{state['created']}"})
+        if path.endswith("/media_publish"):
+            state["published"].append(request.content.decode())
+            return httpx.Response(200, json={"id": f"post{len(state['published'])}"})
+        state["polls"] += 1
+        if state["polls"] <= poll_failures:
+            raise httpx.ReadTimeout("timed out", request=request)
+        ids = request.url.params["ids"].split(",")
+        return httpx.Response(200, json={creation_id: {"status_code": "FINISHED"} for creation_id in ids})
+
+    return handler, state
+
+
+async def publish(items, handler):
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        return await publish_batch("token", "user", items, poll_interval=0.001, client=client)
+
+
+def test_transient_poll_errors_back_off_instead_of_failing_the_batch():
+    handler, state = graph_handler(poll_failures=2)
+    results = asyncio.run(publish([("https://img/1.jpg", "one"), ("https://img/2.jpg", "two")], handler))
+    assert [result["success"] for result in results] == [True, True]
+    assert state["polls"] == 3
+    assert len(state["published"]) == 2
+
+
+def test_only_the_failing_item_fails():
+    handler, _ = graph_handler(poll_failures=0)
+    results = asyncio.run(publish([("https://img/bad.jpg", "bad"), ("https://img/2.jpg", "two")], handler))
+    assert results[0]["success"] is False and "Invalid image" in results[0]["error"]
+    assert results[1]["success"] is True
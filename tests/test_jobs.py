@@ -0,0 +1,112 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from jobs import FAILED, RUNNING, SUCCEEDED, JobQueueFull, JobRunner
+
+
+def blocking_target(started: threading.Event, release: threading.Event, calls: list):
+    def target(run_id):
+        calls.append(run_id)
+        started.set()
+        release.wait(5)
+    return target
+
+
+def wait_idle(runner: JobRunner):
+    deadline = time.monotonic() + 5
+    while runner.active() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_trigger_during_run_attaches_to_it():
+    executor = ThreadPoolExecutor(max_workers=2)
+    runner = JobRunner(executor, max_active=2)
+    started, release, calls = threading.Event(), threading.Event(), []
+    try:
+        running, created = runner.trigger("posting", blocking_target(started, release, calls), "schedule")
+        assert created
+        assert started.wait(5)
+        assert running.state == RUNNING
+
+        # A "run now" during the scheduled run gets the running run back, not a second pass
+        attached, created = runner.trigger("posting", blocking_target(threading.Event(), release, calls))
+        assert attached is running and not created
+        assert attached.id == running.id
+        assert running.attached == 1
+    finally:
+        release.set()
+        wait_idle(runner)
+        executor.shutdown(wait=True)
+    assert running.state == SUCCEEDED
+    assert calls == [running.id]
+
+    # Once finished, the next trigger starts a new run
+    executor = ThreadPoolExecutor(max_workers=1)
+    runner.executor = executor
+    rerun, created = runner.trigger("posting", lambda run_id: None)
+    wait_idle(runner)
+    executor.shutdown(wait=True)
+    assert created and rerun.id != running.id and rerun.state == SUCCEEDED
+
+
+def test_tenant_runs_are_scoped():
+    executor = ThreadPoolExecutor(max_workers=3)
+    runner = JobRunner(executor, max_active=3)
+    release, release_alice = threading.Event(), threading.Event()
+    try:
+        alice, created = runner.trigger("posting", blocking_target(threading.Event(), release_alice, []),
+                                        tenant="alice")
+        assert created and alice.tenant == "alice"
+        # Another tenant's run-now does not attach to alice's run
+        bob, created = runner.trigger("posting", blocking_target(threading.Event(), release, []), tenant="bob")
+        assert created and bob is not alice
+        again, created = runner.trigger("posting", lambda run_id: None, tenant="alice")
+        assert again is alice and not created
+
+        # A run for every tenant is separate from tenant runs, and tenant triggers attach to it
+        everyone, created = runner.trigger("posting", blocking_target(threading.Event(), release, []), "schedule")
+        assert created and everyone.tenant is None
+        release_alice.set()
+        deadline = time.monotonic() + 5
+        while alice.active and time.monotonic() < deadline:
+            time.sleep(0.01)
+        attached, created = runner.trigger("posting", lambda run_id: None, tenant="alice")
+        assert attached is everyone and not created
+    finally:
+        release.set()
+        release_alice.set()
+        wait_idle(runner)
+        executor.shutdown(wait=True)
+
+
+def test_new_job_beyond_the_cap_is_rejected():
+    executor = ThreadPoolExecutor(max_workers=1)
+    runner = JobRunner(executor, max_active=1)
+    started, release = threading.Event(), threading.Event()
+    try:
+        runner.trigger("posting", blocking_target(started, release, []))
+        assert started.wait(5)
+        with pytest.raises(JobQueueFull):
+            runner.trigger("insights", lambda run_id: None)
+        assert [run.job for run in runner.runs()] == ["posting"]
+    finally:
+        release.set()
+        wait_idle(runner)
+        executor.shutdown(wait=True)
+
+
+def test_failed_run_is_recorded():
+    executor = ThreadPoolExecutor(max_workers=1)
+    runner = JobRunner(executor)
+
+    def boom(run_id):
+        raise RuntimeError("upstream down")
+
+    run, _ = runner.trigger("insights", boom)
+    wait_idle(runner)
+    executor.shutdown(wait=True)
+    assert run.state == FAILED and run.error == "upstream down"
+    assert runner.get(run.id) is run
@@ -0,0 +1,118 @@
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+import server
+from server import POST_FIELDS, list_projection
+
+
+def test_projection_keeps_id_and_requested_fields():
+    assert list_projection(None, POST_FIELDS) == {"_id": 0}
+    assert list_projection("", POST_FIELDS) == {"_id": 0}
+    assert list_projection(" status, platform ,,", POST_FIELDS) == {"_id": 0, "id": 1, "status": 1, "platform": 1}
+
+
+def test_projection_rejects_unknown_fields():
+    with pytest.raises(HTTPException) as raised:
+        list_projection("status,password,_id", POST_FIELDS)
+    assert raised.value.status_code == 400
+    assert raised.value.detail == "Unknown fields: _id, password"
+
+
+class Cursor:
+    def __init__(self, docs, projection):
+        self.docs = docs
+        self.projection = projection
+
+    def sort(self, field, direction):
+        self.docs = sorted(self.docs, key=lambda doc: doc[field], reverse=direction < 0)
+        return self
+
+    def limit(self, count):
+        self.docs = self.docs[:count]
+        return self
+
+    async def to_list(self, length):
+        if len(self.projection) == 1:
+            return [dict(doc) for doc in self.docs]
+        return [{key: doc[key] for key in self.projection if key in doc} for doc in self.docs]
+
+
+class Posts:
+    def __init__(self, docs):
+        self.docs = docs
+        self.calls = []
+
+    def find(self, query, projection):
+        self.calls.append((query, projection))
+        docs = [doc for doc in self.docs if all(doc.get(key) == value for key, value in query.items())]
+        return Cursor(docs, projection)
+
+
+def post(index, tenant="alice"):
+    return {
+        "id": f"post-{index}",
+        "admin_username": tenant,
+        "product_asin": f"B{index:09d}",
+        "product_title": "A long enough product title to make the list worth compressing " * 2,
+        "caption": "caption",
+        "platform": "instagram",
+        "status": "posted",
+        "scheduled_at": "2027-03-01T12:00:00+00:00",
+        "posted_at": "2027-03-01T12:00:00+00:00",
+        "created_at": f"2027-03-01T12:{index % 60:02d}:00+00:00",
+    }
+
+
+@pytest.fixture
+def posts(monkeypatch):
+    collection = Posts([post(i) for i in range(20)] + [post(99, tenant="bob")])
+    monkeypatch.setattr(server, "reporting_db", type("Db", (), {"posts": collection})())
+    return collection
+
+
+@pytest.fixture
+def client():
+    token = server.create_access_token({"sub": "alice"})
+    return TestClient(server.app, headers={"Authorization": f"Bearer {token}"})
+
+
+@pytest.mark.parametrize("fast_json", [False, True])
+def test_posts_are_scoped_and_projected(client, posts, monkeypatch, fast_json):
+    monkeypatch.setattr(server, "FAST_JSON", fast_json)
+    response = client.get("/api/posts", params={"limit": 5, "fields": "status"})
+    assert response.status_code == 200
+    body = response.json()
+    assert len(body) == 5
+    assert all(item == {"id": item["id"], "status": "posted"} for item in body)
+    query, projection = posts.calls[-1]
+    assert query == {"admin_username": "alice"}
+    assert projection == {"_id": 0, "id": 1, "status": 1}
+
+    assert client.get("/api/posts", params={"fields": "nope"}).status_code == 400
+
+
+def test_fast_json_matches_the_model_path(client, posts, monkeypatch):
+    monkeypatch.setattr(server, "FAST_JSON", False)
+    slow = client.get("/api/posts").json()
+    monkeypatch.setattr(server, "FAST_JSON", True)
+    fast = client.get("/api/posts").json()
+    assert [item["id"] for item in fast] == [item["id"] for item in slow]
+    assert fast[0]["created_at"] == slow[0]["created_at"] == "2027-03-01T12:19:00+00:00"
+    assert "bob" not in {item["admin_username"] for item in fast}
+
+
+def test_large_lists_are_gzipped_and_revalidated(client, posts):
+    response = client.get("/api/posts", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    # The client decodes transparently; the wire body is the compressed one
+    assert int(response.headers["content-length"]) < len(response.content)
+
+    etag = response.headers["etag"]
+    calls = len(posts.calls)
+    again = client.get("/api/posts", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert len(posts.calls) == calls
+
+    small = client.get("/api/posts", params={"limit": 1, "fields": "status"}, headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
@@ -0,0 +1,90 @@
+import json
+import logging
+import queue
+import sys
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+import logs
+from logs import DroppingQueueHandler, JsonFormatter, RateLimitFilter, RequestIdMiddleware, log_context, truncate
+
+
+def record(msg="hello %s", args=("world",), level=logging.WARNING, lineno=10, exc_info=None):
+    return logging.LogRecord("app", level, "app.py", lineno, msg, args, exc_info)
+
+
+def test_truncate_reports_what_was_cut():
+    assert truncate("short", 10) == "short"
+    assert truncate("x" * 15, 10) == "x" * 10 + "... [5 more chars]"
+
+
+def test_context_fields_nest_and_reset():
+    with log_context(request_id="r1"):
+        with log_context(tenant="alice"):
+            assert logs._fields.get() == {"request_id": "r1", "tenant": "alice"}
+        assert logs._fields.get() == {"request_id": "r1"}
+    assert logs._fields.get() == {}
+
+
+def test_prepared_records_are_formatted_in_the_caller():
+    handler = DroppingQueueHandler(queue.Queue())
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        exc_info = sys.exc_info()
+    with log_context(run_id="run-1"):
+        prepared = handler.prepare(record(msg="%s", args=("y" * 5000,), exc_info=exc_info))
+    assert prepared.args is None and prepared.exc_info is None
+    assert prepared.msg.endswith(f"... [{5000 - logs.MAX_MESSAGE_CHARS} more chars]")
+    assert "ValueError: boom" in prepared.exc_text
+    assert prepared.run_id == "run-1"
+
+    entry = json.loads(JsonFormatter().format(prepared))
+    assert entry["level"] == "WARNING" and entry["logger"] == "app"
+    assert entry["run_id"] == "run-1" and "ValueError" in entry["exc"]
+    assert entry["ts"].endswith("+00:00")
+
+
+def test_full_queue_drops_and_reports_the_loss():
+    handler = DroppingQueueHandler(queue.Queue(maxsize=1))
+    handler.enqueue(record())
+    handler.enqueue(record())
+    handler.enqueue(record())
+    assert handler.dropped == 2
+
+    first = handler.queue.get_nowait()
+    assert not hasattr(first, "dropped")
+    handler.enqueue(record())
+    assert handler.queue.get_nowait().dropped == 2
+    assert handler.dropped == 0
+
+
+def test_warnings_are_rate_limited_per_call_site(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(logs.time, "monotonic", lambda: clock[0])
+    limiter = RateLimitFilter(limit=2, window=60)
+    assert [limiter.filter(record()) for _ in range(4)] == [True, True, False, False]
+    # Another call site and lower levels are not affected
+    assert limiter.filter(record(lineno=11))
+    assert all(limiter.filter(record(level=logging.INFO)) for _ in range(5))
+
+    clock[0] += 60
+    next_window = record()
+    assert limiter.filter(next_window) and next_window.suppressed == 2
+
+
+def test_request_id_is_bound_and_echoed():
+    async def endpoint(request):
+        return JSONResponse(logs._fields.get())
+
+    client = TestClient(RequestIdMiddleware(Starlette(routes=[Route("/", endpoint)])))
+    response = client.get("/", headers={"X-Request-ID": "abc"})
+    assert response.json() == {"request_id": "abc"}
+    assert response.headers["x-request-id"] == "abc"
+
+    generated = client.get("/")
+    assert len(generated.headers["x-request-id"]) == 32
+    assert generated.json()["request_id"] == generated.headers["x-request-id"]
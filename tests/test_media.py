@@ -0,0 +1,65 @@
+import asyncio
+import io
+
+import httpx
+import pytest
+from PIL import Image
+
+import media
+from media import MediaCache
+
+
+def png(width=600, height=600) -> bytes:
+    output = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 30, 30)).save(output, format="PNG")
+    return output.getvalue()
+
+
+def handler(request: httpx.Request) -> httpx.Response:
+    name = request.url.path.rsplit("/", 1)[-1]
+    if name == "good.png":
+        return httpx.Response(200, content=png())
+    if name == "tiny.png":
+        return httpx.Response(200, content=png(50, 50))
+    if name == "missing.png":
+        return httpx.Response(404)
+    if name == "busy.png":
+        return httpx.Response(503)
+    if name == "slow.png":
+        raise httpx.ReadTimeout("timed out", request=request)
+    raise RuntimeError("handler bug")
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(media, "http_client", lambda **kwargs: httpx.AsyncClient(
+        transport=httpx.MockTransport(handler), **kwargs
+    ))
+    return MediaCache(tmp_path, "https://cdn.example")
+
+
+def test_images_are_normalized_and_cached(cache):
+    results = asyncio.run(cache.fetch_many(["https://img/good.png", "https://img/good.png", None]))
+    result = results["https://img/good.png"]
+    assert result.ok and not result.error
+    assert cache.path_for(result.media_hash).exists()
+    assert cache.lookup("https://img/good.png") == result.media_hash
+    assert cache.public_url(result.media_hash).startswith("https://cdn.example/")
+
+
+def test_every_url_gets_a_result_and_only_lasting_failures_are_permanent(cache):
+    urls = [
+        "https://img/good.png", "https://img/tiny.png", "https://img/missing.png",
+        "https://img/busy.png", "https://img/slow.png", "https://img/boom.png", "ftp://img/x.png", "https://[::1", "not a url",
+    ]
+    results = asyncio.run(cache.fetch_many(urls))
+    assert set(results) == set(urls)
+    assert results["https://img/good.png"].ok
+
+    permanent = {url for url, result in results.items() if result.error and not result.transient}
+    transient = {url for url, result in results.items() if result.transient}
+    assert permanent == {
+        "https://img/tiny.png", "https://img/missing.png", "ftp://img/x.png", "https://[::1", "not a url"
+    }
+    assert transient == {"https://img/busy.png", "https://img/slow.png", "https://img/boom.png"}
+    assert all(not results[url].ok for url in transient)
@@ -0,0 +1,68 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from pymongo.errors import ExecutionTimeout, OperationFailure
+from pymongo.monitoring import ConnectionCheckOutFailedReason
+from pymongo.read_preferences import Primary, SecondaryPreferred
+
+import server
+from mongo_pool import PoolMonitor, pool_options, reporting_read_preference
+
+
+def test_pool_options_come_from_the_environment(monkeypatch):
+    assert pool_options() == {"maxPoolSize": 100, "minPoolSize": 0, "waitQueueTimeoutMS": 2000}
+    monkeypatch.setenv("MONGO_MAX_POOL_SIZE", "20")
+    monkeypatch.setenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "500")
+    assert pool_options() == {"maxPoolSize": 20, "minPoolSize": 0, "waitQueueTimeoutMS": 500}
+
+
+def test_reporting_read_preference(monkeypatch):
+    assert reporting_read_preference() == Primary()
+    monkeypatch.setenv("MONGO_REPORTING_READ_PREFERENCE", "secondaryPreferred")
+    monkeypatch.setenv("MONGO_REPORTING_MAX_STALENESS_S", "120")
+    assert reporting_read_preference() == SecondaryPreferred(max_staleness=120)
+    monkeypatch.setenv("MONGO_REPORTING_READ_PREFERENCE", "closest")
+    with pytest.raises(ValueError):
+        reporting_read_preference()
+
+
+def event(**fields):
+    return SimpleNamespace(address=("db", 27017), **fields)
+
+
+def test_monitor_tracks_checkouts_waiters_and_timeouts():
+    monitor = PoolMonitor({"maxPoolSize": 4, "minPoolSize": 0, "waitQueueTimeoutMS": 100})
+    monitor.pool_created(event(options={"maxPoolSize": 2}))
+    for _ in range(3):
+        monitor.connection_check_out_started(event())
+    monitor.connection_created(event())
+    monitor.connection_checked_out(event())
+    monitor.connection_checked_out(event())
+    monitor.connection_check_out_failed(event(reason=ConnectionCheckOutFailedReason.TIMEOUT))
+    monitor.connection_checked_in(event())
+
+    stats = monitor.snapshot()["db:27017"]
+    assert (stats["max_size"], stats["in_use"], stats["waiting"]) == (2, 1, 0)
+    assert (stats["peak_in_use"], stats["peak_waiting"], stats["checkouts"]) == (2, 3, 2)
+    assert (stats["wait_timeouts"], stats["checkout_errors"], stats["open"]) == (1, 0, 1)
+    assert stats["utilization"] == 0.5
+
+    monitor.connection_check_out_failed(event(reason=ConnectionCheckOutFailedReason.CONN_ERROR))
+    assert monitor.snapshot()["db:27017"]["checkout_errors"] == 1
+    monitor.pool_closed(event())
+    assert monitor.snapshot() == {}
+
+
+def test_query_budget_turns_timeouts_into_503(monkeypatch):
+    monkeypatch.setitem(server.QUERY_BUDGETS_MS, "list", 250)
+    with pytest.raises(HTTPException) as raised:
+        with server.query_budget("list"):
+            raise ExecutionTimeout("operation exceeded time limit", 50)
+    assert raised.value.status_code == 503
+    assert raised.value.headers == {"Retry-After": str(server.QUERY_RETRY_AFTER_SECONDS)}
+
+    # Other database errors are not budget overruns
+    with pytest.raises(OperationFailure):
+        with server.query_budget("list"):
+            raise OperationFailure("bad query", 2)
@@ -0,0 +1,93 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from post_history import PostHistory
+
+NOW = datetime(2027, 3, 1, 12, tzinfo=timezone.utc)
+DAY = 86400
+
+
+def ago(days: float) -> str:
+    return (NOW - timedelta(days=days)).isoformat()
+
+
+def test_cooldown_is_per_platform_and_tenant():
+    history = PostHistory()
+    history.record("A", "instagram", ago(2), tenant="alice")
+    now = NOW.timestamp()
+    assert history.in_cooldown("A", "instagram", 7, now, tenant="alice")
+    assert not history.in_cooldown("A", "instagram", 1, now, tenant="alice")
+    assert not history.in_cooldown("A", "facebook", 7, now, tenant="alice")
+    assert not history.in_cooldown("A", "instagram", 7, now, tenant="bob")
+    assert not history.in_cooldown("B", "instagram", 7, now, tenant="alice")
+
+
+def test_older_records_do_not_move_the_last_post_back():
+    history = PostHistory()
+    history.record("A", "instagram", ago(1))
+    history.record("A", "instagram", ago(30))
+    assert history.last_posted("A", "instagram") == (NOW - timedelta(days=1)).timestamp()
+
+    # Unparseable timestamps count as posted now
+    before = datetime.now(timezone.utc).timestamp()
+    history.record("B", "instagram", "not a date")
+    assert history.last_posted("B", "instagram") >= before
+    history.record("", "instagram")
+    assert len(history) == 2
+
+
+def test_cooldown_mask_matches_in_cooldown():
+    history = PostHistory()
+    history.record("A", "instagram", ago(1))
+    history.record("B", "instagram", ago(10))
+    history.record("C", "facebook", ago(1))
+    now = NOW.timestamp()
+    asins = ["A", "B", "C", "D"]
+    mask = history.cooldown_mask(asins, "instagram", 7, now)
+    assert mask.tolist() == [True, False, False, False]
+    assert mask.tolist() == [history.in_cooldown(asin, "instagram", 7, now) for asin in asins]
+    assert history.cooldown_mask([], "instagram", 7, now).tolist() == []
+
+
+class Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self.docs:
+            yield doc
+
+
+class Collection:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query, projection):
+        if "id" in query:
+            return Cursor([doc for doc in self.docs if doc["id"] in query["id"]["$in"]])
+        cutoff, statuses = query["created_at"]["$gte"], query["status"]["$in"]
+        return Cursor([doc for doc in self.docs if doc["created_at"] >= cutoff and doc["status"] in statuses])
+
+
+def test_warm_reads_recent_posts_and_resolves_legacy_product_ids():
+    recent = datetime.now(timezone.utc) - timedelta(days=1)
+    db = type("Db", (), {})()
+    db.posts = Collection([
+        {"product_asin": "A", "platform": "instagram", "status": "posted", "admin_username": "alice",
+         "posted_at": recent.isoformat(), "created_at": recent.isoformat()},
+        {"product_id": "p-2", "platform": "facebook", "status": "pending", "created_at": recent.isoformat()},
+        {"product_asin": "F", "platform": "instagram", "status": "failed", "created_at": recent.isoformat()},
+        {"product_asin": "O", "platform": "instagram", "status": "posted",
+         "created_at": (recent - timedelta(days=200)).isoformat()},
+    ])
+    db.products = Collection([{"id": "p-2", "asin": "B"}])
+
+    history = PostHistory()
+    assert asyncio.run(history.warm(db)) == 2
+    assert history.in_cooldown("A", "instagram", 7, tenant="alice")
+    assert history.in_cooldown("B", "facebook", 7)
+    assert not history.in_cooldown("F", "instagram", 7)
+    assert not history.in_cooldown("O", "instagram", 365)
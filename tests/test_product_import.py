@@ -0,0 +1,119 @@
+import asyncio
+from types import SimpleNamespace
+
+from product_import import _clean, import_products, iter_csv_rows, iter_jsonl_rows
+from server import Product
+
+
+async def chunked(data: bytes, size: int):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def rows(parser, data: bytes, size: int = 7):
+    async def collect():
+        return [row async for batch in parser(chunked(data, size)) for row in batch]
+    return asyncio.run(collect())
+
+
+CSV = (
+    '\ufeffasin,title,price\n'
+    'A1,"Kettle, steel","$1,299.99"\n'
+    '\n'
+    'A2,"Lamp ""Nova""\nwith a second line",12\n'
+    'A3,Café mug,\n'
+).encode()
+
+
+def test_csv_records_survive_any_chunking():
+    expected = [
+        (1, {"asin": "A1", "title": "Kettle, steel", "price": "$1,299.99"}),
+        (2, {"asin": "A2", "title": 'Lamp "Nova"\nwith a second line', "price": "12"}),
+        (3, {"asin": "A3", "title": "Café mug", "price": ""}),
+    ]
+    # Chunk boundaries fall inside quotes, multibyte characters and the BOM
+    for size in (1, 2, 5, len(CSV)):
+        assert rows(iter_csv_rows, CSV, size) == expected
+
+
+def test_unterminated_csv_quote_is_reported():
+    parsed = rows(iter_csv_rows, b'asin,title\nA1,ok\nA2,"never closed\n')
+    assert parsed == [(1, {"asin": "A1", "title": "ok"}), (2, {"_error": "Unterminated quoted field"})]
+
+
+def test_jsonl_rows_keep_line_numbers():
+    data = b'{"asin": "A1"}\n\nnot json\n[1, 2]\n{"asin": "A2"}'
+    parsed = rows(iter_jsonl_rows, data, 3)
+    assert [number for number, _ in parsed] == [1, 3, 4, 5]
+    assert parsed[0][1] == {"asin": "A1"} and parsed[3][1] == {"asin": "A2"}
+    assert parsed[1][1]["_error"].startswith("Invalid JSON")
+    assert parsed[2][1] == {"_error": "Expected a JSON object"}
+
+
+def test_clean_fills_derivable_fields():
+    assert _clean({"asin": "A1", "title": "t", "price": "$1,299.99", "rating": "", "": "x"}) == {
+        "asin": "A1", "title": "t", "price": "$1,299.99", "price_value": 1299.99,
+        "product_url": "https://www.amazon.com/dp/A1",
+    }
+    cleaned = _clean({"asin": "A1", "price": 5, "product_url": "https://example.com/a1"})
+    assert cleaned["price"] == "$5.00" and cleaned["price_value"] == 5.0
+    assert cleaned["product_url"] == "https://example.com/a1"
+
+
+class Products:
+    def __init__(self):
+        self.docs = {}
+        self.writes = []
+
+    async def bulk_write(self, operations, ordered=True):
+        self.writes.append(len(operations))
+        inserted = matched = 0
+        for operation in operations:
+            asin = operation._filter["asin"]
+            update = operation._doc
+            if asin in self.docs:
+                matched += 1
+            else:
+                inserted += 1
+                self.docs[asin] = {"asin": asin, **update["$setOnInsert"], "tenants": []}
+            doc = self.docs[asin]
+            doc.update(update["$set"])
+            if update["$addToSet"]["tenants"] not in doc["tenants"]:
+                doc["tenants"].append(update["$addToSet"]["tenants"])
+        return SimpleNamespace(upserted_count=inserted, matched_count=matched)
+
+    def find(self, query, projection):
+        docs = [dict(self.docs[asin]) for asin in query["asin"]["$in"]]
+        return SimpleNamespace(to_list=lambda length: asyncio.sleep(0, docs))
+
+
+def test_import_upserts_in_batches_and_reports_rejects():
+    db = SimpleNamespace(products=Products())
+    db.products.docs["A1"] = {"asin": "A1", "id": "kept", "title": "Old", "rating": 4.5, "tenants": ["bob"]}
+    seen = []
+
+    async def on_batch(docs):
+        seen.append(docs)
+
+    data = (
+        b'{"asin": "A1", "title": "Kettle"}\n'
+        b'{"asin": "A2"}\n'
+        b'{"asin": "A3", "title": "Lamp", "price": "$12"}\n'
+        b'{"asin": "A4", "title": "Mug", "rating": "great"}\n'
+        b'{"asin": "A5", "title": "Pan"}\n'
+    )
+    report = asyncio.run(import_products(db, chunked(data, 10), "jsonl", Product, on_batch=on_batch,
+                                         batch_rows=2, tenant="alice"))
+    summary = report.as_dict()
+    assert (summary["rows"], summary["inserted"], summary["updated"], summary["rejected"]) == (5, 2, 1, 2)
+    assert [error["row"] for error in summary["errors"]] == [2, 4]
+    assert summary["errors"][0]["error"].startswith("title:")
+    assert db.products.writes == [2, 1]
+
+    # Only the fields a row carries are overwritten; the stored document is what on_batch sees
+    kettle = db.products.docs["A1"]
+    assert (kettle["id"], kettle["title"], kettle["rating"]) == ("kept", "Kettle", 4.5)
+    assert kettle["tenants"] == ["bob", "alice"]
+    assert seen[0][0] is not kettle and seen[0][0]["id"] == "kept"
+    assert db.products.docs["A3"]["price_value"] == 12.0
+    assert [doc["asin"] for batch in seen for doc in batch] == ["A1", "A3", "A5"]
@@ -0,0 +1,46 @@
+import asyncio
+import sys
+import threading
+
+from profiling import Capture
+
+
+async def waiting_in_sleep():
+    await asyncio.sleep(10)
+
+
+def test_suspended_task_records_its_await_chain():
+    async def main():
+        task = asyncio.create_task(waiting_in_sleep())
+        await asyncio.sleep(0)
+        capture = Capture("request", "GET /x", "armed", threading.get_ident(), asyncio.get_running_loop(), task)
+        # Sampled from another thread, as the sampler does
+        sampler = threading.Thread(target=capture.sample, args=(sys._current_frames(),))
+        sampler.start()
+        sampler.join()
+        task.cancel()
+        return capture
+
+    capture = asyncio.run(main())
+    (stack, count), = capture.samples.items()
+    assert count == 1
+    assert stack.startswith("waiting_in_sleep") and "sleep (tasks.py" in stack
+
+
+def test_running_task_records_the_thread_stack():
+    async def busy(capture_box):
+        capture = capture_box[0]
+        capture.sample(sys._current_frames())
+
+    async def main():
+        box = []
+        task = asyncio.create_task(busy(box))
+        box.append(Capture("request", "GET /x", "armed", threading.get_ident(), asyncio.get_running_loop(), task))
+        await task
+        return box[0]
+
+    capture = asyncio.run(main())
+    (stack, _), = capture.samples.items()
+    # The loop thread's own frames lead into the running coroutine
+    assert "run_until_complete" in stack
+    assert stack.split(";")[-1].startswith("busy (test_profiling.py")
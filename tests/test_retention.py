@@ -0,0 +1,167 @@
+import asyncio
+import itertools
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from retention import Archiver, RetentionPolicy
+
+NOW = datetime.now(timezone.utc)
+_ids = itertools.count()
+
+
+def matches(doc, query):
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(matches(doc, option) for option in condition):
+                return False
+            continue
+        value = doc.get(key)
+        if isinstance(condition, dict):
+            for op, operand in condition.items():
+                if op == "$lt" and not (value is not None and value < operand):
+                    return False
+                if op == "$in" and value not in operand:
+                    return False
+        elif isinstance(value, list):
+            if condition not in value:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+def apply_update(doc, update, inserting):
+    for key, value in update.get("$setOnInsert", {}).items() if inserting else ():
+        doc[key] = value
+    for path, amount in update.get("$inc", {}).items():
+        *parents, leaf = path.split(".")
+        target = doc
+        for parent in parents:
+            target = target.setdefault(parent, {})
+        target[leaf] = target.get(leaf, 0) + amount
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, field, direction):
+        self.docs = sorted(self.docs, key=lambda doc: doc.get(field), reverse=direction < 0)
+        return self
+
+    def limit(self, count):
+        self.docs = self.docs[:count]
+        return self
+
+    async def to_list(self, length):
+        return [dict(doc) for doc in self.docs]
+
+
+class FakeCollection:
+    def __init__(self):
+        self.docs = []
+
+    def find(self, query=None):
+        return FakeCursor([doc for doc in self.docs if matches(doc, query or {})])
+
+    async def insert_one(self, doc):
+        self.docs.append({"_id": next(_ids), **doc})
+
+    async def delete_many(self, query):
+        self.docs = [doc for doc in self.docs if not matches(doc, query)]
+
+    async def find_one_and_delete(self, query):
+        for doc in self.docs:
+            if matches(doc, query):
+                self.docs.remove(doc)
+                return doc
+        return None
+
+    async def update_one(self, query, update, upsert=False):
+        return self._update(query, update, upsert)
+
+    def _update(self, query, update, upsert):
+        for doc in self.docs:
+            if matches(doc, query):
+                apply_update(doc, update, inserting=False)
+                return None
+        if upsert:
+            doc = {"_id": next(_ids), **{k: v for k, v in query.items() if not isinstance(v, dict)}}
+            apply_update(doc, update, inserting=True)
+            self.docs.append(doc)
+            return doc["_id"]
+        return None
+
+    async def bulk_write(self, operations, ordered=True):
+        upserted = {}
+        for index, operation in enumerate(operations):
+            new_id = self._update(operation._filter, operation._doc, operation._upsert)
+            if new_id is not None:
+                upserted[index] = new_id
+        return SimpleNamespace(upserted_ids=upserted)
+
+
+class FakeDb:
+    def __init__(self):
+        self.collections = {}
+
+    def get_collection(self, name):
+        return self.collections.setdefault(name, FakeCollection())
+
+    __getattr__ = get_collection
+
+    def stats(self, tenant=...):
+        docs = self.get_collection("archive_stats").docs
+        if tenant is ...:
+            return next((doc for doc in docs if doc["_id"] == "products"), {}).get("total", 0)
+        return next((doc for doc in docs if doc.get("tenant") == tenant), {}).get("total", 0)
+
+
+def product(asin, days_old, tenants=("alice",)):
+    return {"_id": next(_ids), "asin": asin, "title": asin, "tenants": list(tenants),
+            "fetched_at": (NOW - timedelta(days=days_old)).isoformat()}
+
+
+def make_archiver(tmp_path):
+    return Archiver(tmp_path, [RetentionPolicy("products", "fetched_at", 90)])
+
+
+def test_restored_documents_stay_hot_for_the_hold_period(tmp_path):
+    db = FakeDb()
+    archiver = make_archiver(tmp_path)
+    db.products.docs = [product("OLD", 200), product("NEW", 1)]
+
+    archived = asyncio.run(archiver.run(db, NOW))
+    assert [key["asin"] for key in archived["products"]] == ["OLD"]
+    assert [doc["asin"] for doc in db.products.docs] == ["NEW"]
+
+    assert asyncio.run(archiver.restore(db, "products")) == 1
+    restored = next(doc for doc in db.products.docs if doc["asin"] == "OLD")
+    assert restored["restored_at"]
+
+    # Still past its hot window, but restored on purpose
+    assert asyncio.run(archiver.run(db, NOW + timedelta(days=1)))["products"] == []
+    # Once the hold is over it is archived again
+    later = datetime.fromisoformat(restored["restored_at"]) + timedelta(days=31)
+    assert [key["asin"] for key in asyncio.run(archiver.run(db, later))["products"]] == ["OLD"]
+
+
+def test_refetched_products_are_counted_once(tmp_path):
+    db = FakeDb()
+    archiver = make_archiver(tmp_path)
+    db.products.docs = [product("A", 200), product("B", 200, tenants=("alice", "bob"))]
+    asyncio.run(archiver.run(db, NOW))
+    assert db.stats() == 2 and db.stats("alice") == 2 and db.stats("bob") == 1
+
+    # B comes back from a search: it is hot again and no longer counted as archived
+    db.products.docs.append(product("B", 0))
+    assert asyncio.run(archiver.forget_products(db, ["B", "C"])) == 1
+    assert db.stats() == 1 and db.stats("alice") == 1 and db.stats("bob") == 0
+    assert asyncio.run(archiver.forget_products(db, ["B"])) == 0
+
+    # Archiving the same ASIN again counts it again, but only once
+    db.products.docs = [product("B", 200)]
+    asyncio.run(archiver.run(db, NOW))
+    db.products.docs = [product("B", 200)]
+    asyncio.run(archiver.run(db, NOW))
+    assert db.stats() == 2
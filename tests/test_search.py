@@ -0,0 +1,73 @@
+from search import ProductSearchIndex
+
+
+def make_index(docs):
+    index = ProductSearchIndex()
+    index.add_documents(docs)
+    return index
+
+
+def test_pages_with_tied_keys_cover_every_product_once():
+    # One import batch: every product shares fetched_at, ratings repeat
+    docs = [
+        {"asin": f"A{i:05d}", "title": f"Product {i}", "price_value": 10 + i % 7, "rating": 4.0 + (i % 3) / 2,
+         "fetched_at": "2026-01-01T00:00:00+00:00"}
+        for i in range(5000)
+    ]
+    index = make_index(docs)
+    for sort in ("newest", "rating", "price", "-price"):
+        seen = []
+        for page in range(250):
+            total, asins = index.search(sort=sort, offset=page * 20, limit=20)
+            assert total == 5000
+            seen.extend(asins)
+        assert len(seen) == len(set(seen)) == 5000, sort
+
+
+def test_paging_is_deterministic_and_sorted():
+    index = make_index([
+        {"asin": "A", "title": "Mug", "price_value": 5, "rating": 4.5, "fetched_at": 3},
+        {"asin": "B", "title": "Mug", "price_value": 9, "rating": 4.5, "fetched_at": 1},
+        {"asin": "C", "title": "Mug", "price_value": 5, "rating": 3.0, "fetched_at": 2},
+        {"asin": "D", "title": "Mug", "price_value": None, "rating": 5.0, "fetched_at": 2},
+    ])
+    assert index.search(sort="newest")[1] == ["A", "C", "D", "B"]
+    assert index.search(sort="price")[1] == ["A", "C", "B", "D"]
+    assert index.search(sort="rating")[1] == ["D", "A", "B", "C"]
+    first = index.search(sort="price", limit=2)[1]
+    second = index.search(sort="price", offset=2, limit=2)[1]
+    assert first + second == ["A", "C", "B", "D"]
+
+
+def test_short_and_common_words_are_searchable():
+    index = make_index([
+        {"asin": "TV", "title": "Samsung 55 inch TV Pro Black", "price_value": 500, "rating": 4, "fetched_at": 1},
+        {"asin": "KN", "title": "Chef knife", "price_value": 20, "rating": 4, "fetched_at": 2},
+    ])
+    for q in ("tv", "pro", "black", "55", "TV PRO"):
+        assert index.search(q) == (1, ["TV"]), q
+    assert index.search("tv knife") == (0, [])
+
+
+def test_punctuation_only_query_matches_nothing():
+    index = make_index([{"asin": "A", "title": "Mug", "price_value": 5, "rating": 4, "fetched_at": 1}])
+    assert index.search("!!!") == (0, [])
+    assert index.search("") == (1, ["A"])
+
+
+def test_filters_and_updates():
+    index = make_index([
+        {"asin": "A", "title": "Desk lamp", "category": "Home", "price_value": 30, "rating": 4.6, "fetched_at": 1},
+        {"asin": "B", "title": "Desk fan", "category": "Home", "price_value": 60, "rating": 3.9, "fetched_at": 2},
+        {"asin": "C", "title": "Desk mat", "category": "Office", "price_value": 15, "rating": 4.8, "fetched_at": 3},
+    ])
+    assert index.search("desk", category="home")[1] == ["B", "A"]
+    assert index.search("desk", min_rating=4.5, max_price=20)[1] == ["C"]
+    assert index.search(category="Garden") == (0, [])
+
+    index.add_documents([{"asin": "B", "title": "Floor fan", "category": "Home", "price_value": 60,
+                          "rating": 3.9, "fetched_at": 2}])
+    assert index.search("desk")[1] == ["C", "A"]
+    assert index.search("fan")[1] == ["B"]
+    index.remove(["A"])
+    assert index.search("desk")[1] == ["C"]
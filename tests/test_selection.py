@@ -0,0 +1,146 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from selection import Catalog, CatalogCache, SelectionWeights, parse_price, select_top_k
+
+NOW = 1_800_000_000.0
+
+
+class FakeProducts:
+    def __init__(self, docs):
+        self.docs = docs
+        self.finds = 0
+
+    def find(self, query, projection):
+        self.finds += 1
+        return FakeCursor([
+            doc for doc in self.docs if all(doc.get(key) == value for key, value in query.items())
+        ])
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def batch_size(self, size):
+        return self
+
+    async def __aiter__(self):
+        for doc in self.docs:
+            yield dict(doc)
+
+
+class FakeDb:
+    def __init__(self, docs):
+        self.products = FakeProducts(docs)
+
+
+def doc(asin, rating=4.0, reviews=100, price=30.0, category="Kitchen", age_days=0.0, **extra):
+    return {"asin": asin, "rating": rating, "reviews_count": reviews, "price_value": price,
+            "category": category, "fetched_at": NOW - age_days * 86400, **extra}
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("$1,299.99", 1299.99), ("EUR 12", 12.0), (19.5, 19.5), ("Free", None), (None, None),
+])
+def test_parse_price(raw, expected):
+    assert parse_price(raw) == expected
+
+
+def test_from_documents_parses_stored_fields():
+    catalog = Catalog.from_documents([
+        {"asin": "A", "price": "$12.50", "fetched_at": "2027-01-15T08:00:00+00:00", "category": "Toys"},
+        {"asin": "B", "price_value": 3, "fetched_at": "not a date"},
+        {"title": "no asin"},
+    ])
+    assert catalog.asins == ["A", "B"]
+    assert catalog.price[0] == pytest.approx(12.5)
+    assert catalog.price[1] == 3
+    assert not np.isnan(catalog.fetched_at[0]) and np.isnan(catalog.fetched_at[1])
+    assert catalog.categories[catalog.category[0]] == "Toys"
+
+
+def test_better_products_rank_first():
+    catalog = Catalog.from_documents([
+        doc("worse", rating=3.0, reviews=5, category="A"),
+        doc("best", rating=5.0, reviews=5000, category="B"),
+        doc("stale", rating=5.0, reviews=5000, category="C", age_days=120),
+    ])
+    assert select_top_k(catalog, 3, now=NOW) == ["best", "stale", "worse"]
+
+
+def test_diversity_spreads_categories():
+    catalog = Catalog.from_documents(
+        [doc(f"K{i}", rating=5.0 - i * 0.01) for i in range(3)] + [doc("T0", rating=4.5, category="Toys")]
+    )
+    assert select_top_k(catalog, 2, SelectionWeights(diversity=0.0), now=NOW) == ["K0", "K1"]
+    assert select_top_k(catalog, 2, SelectionWeights(diversity=1.0), now=NOW) == ["K0", "T0"]
+
+
+def test_excluded_products_are_never_picked():
+    catalog = Catalog.from_documents([doc("A"), doc("B"), doc("C")])
+    exclude = np.array([True, False, True])
+    assert select_top_k(catalog, 3, exclude=exclude, now=NOW) == ["B"]
+    assert select_top_k(catalog, 3, exclude=np.ones(3, dtype=bool), now=NOW) == []
+    assert select_top_k(Catalog.from_documents([]), 3) == []
+    assert select_top_k(catalog, 0) == []
+
+
+def test_candidates_are_the_tenants_products():
+    catalog = Catalog.from_documents([
+        doc("A", tenants=["alice"]), doc("B", tenants=["alice", "bob"]), doc("C"), doc("D", tenants=["bob"]),
+    ])
+    assert catalog.candidates("alice").tolist() == [True, True, False, False]
+    assert catalog.candidates("bob").tolist() == [False, True, False, True]
+    # Products stored before tenants were recorded belong to the None tenant
+    assert catalog.candidates(None).tolist() == [False, False, True, False]
+    assert not catalog.candidates("carol").any()
+    assert select_top_k(catalog, 5, exclude=~catalog.candidates("bob"), now=NOW) == ["B", "D"]
+
+
+def test_merged_adds_fresh_products_without_touching_the_shared_catalog():
+    catalog = Catalog.from_documents([doc("A", rating=3.0, tenants=["bob"]), doc("B", tenants=["bob"])])
+    merged = catalog.merged([doc("A", rating=5.0), doc("N", category="Garden")], "alice")
+
+    assert merged.asins == ["A", "B", "N"]
+    assert merged.rating.tolist() == [5.0, 4.0, 4.0]
+    assert merged.categories[merged.category[2]] == "Garden"
+    assert merged.categories[merged.category[0]] == "Kitchen"
+    assert merged.candidates("alice").tolist() == [True, False, True]
+    assert merged.candidates("bob").tolist() == [True, True, False]
+
+    assert catalog.asins == ["A", "B"] and catalog.rating.tolist() == [3.0, 4.0]
+    assert not catalog.candidates("alice").any()
+    assert catalog.merged([], "alice") is catalog
+
+
+def test_catalog_cache_reloads_only_after_a_new_version():
+    db = FakeDb([doc("A"), doc("B", media_error="Not an image")])
+    cache = CatalogCache(ttl=3600)
+
+    first = asyncio.run(cache.get(db, 1, {"media_error": None}))
+    again = asyncio.run(cache.get(db, 1, {"media_error": None}))
+    assert again is first and first.asins == ["A"]
+    assert db.products.finds == 1
+
+    db.products.docs.append(doc("C"))
+    reloaded = asyncio.run(cache.get(db, 2, {"media_error": None}))
+    assert reloaded.asins == ["A", "C"] and db.products.finds == 2
+
+    # A different query is a different catalog
+    asyncio.run(cache.get(db, 2))
+    assert db.products.finds == 3
+
+    cache.invalidate()
+    asyncio.run(cache.get(db, 2))
+    assert db.products.finds == 4
+
+
+def test_catalog_cache_expires():
+    db = FakeDb([doc("A")])
+    cache = CatalogCache(ttl=0)
+    asyncio.run(cache.get(db, 1))
+    asyncio.run(cache.get(db, 1))
+    assert db.products.finds == 2
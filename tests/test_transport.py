@@ -0,0 +1,138 @@
+import asyncio
+import base64
+import gzip
+import json
+
+import httpx
+import pytest
+
+import transport
+from transport import Cassette, CassetteMiss, CassetteTransport
+
+TOKEN_BODY = b'{"id":"123","name":"Page","access_token":"SECRET-PAGE-TOKEN"}'
+
+
+def gzip_handler(request):
+    return httpx.Response(
+        200,
+        headers={"content-type": "application/json", "content-encoding": "gzip"},
+        content=gzip.compress(TOKEN_BODY),
+    )
+
+
+async def fetch(transport, url="https://graph.facebook.com/v18.0/123?fields=access_token&access_token=USER"):
+    async with httpx.AsyncClient(transport=transport) as client:
+        return await client.get(url)
+
+
+def test_record_redacts_gzipped_token_response(tmp_path):
+    path = tmp_path / "cassette.jsonl"
+    recorder = CassetteTransport(Cassette(str(path)), mode="record", inner=httpx.MockTransport(gzip_handler))
+    response = asyncio.run(fetch(recorder))
+    # The caller still sees the real response
+    assert response.json()["access_token"] == "SECRET-PAGE-TOKEN"
+
+    text = path.read_text()
+    assert "SECRET" not in text and "USER" not in text
+    interaction = json.loads(text)
+    stored = base64.b64decode(interaction["response"]["body"])
+    assert json.loads(stored) == {"id": "123", "name": "Page", "access_token": "REDACTED"}
+    header_names = {name.lower() for name, _ in interaction["response"]["headers"]}
+    assert "content-encoding" not in header_names and "content-length" not in header_names
+
+
+def test_replay_matches_with_other_credentials(tmp_path):
+    path = tmp_path / "cassette.jsonl"
+    asyncio.run(fetch(CassetteTransport(Cassette(str(path)), mode="record", inner=httpx.MockTransport(gzip_handler))))
+
+    replayer = CassetteTransport(Cassette(str(path)), mode="replay", time_scale=0)
+    response = asyncio.run(fetch(replayer, "https://graph.facebook.com/v18.0/123?fields=access_token&access_token=OTHER"))
+    assert response.status_code == 200
+    assert response.json()["access_token"] == "REDACTED"
+
+
+def test_replay_without_recording_raises(tmp_path):
+    replayer = CassetteTransport(Cassette(str(tmp_path / "empty.jsonl")), mode="replay", time_scale=0)
+    with pytest.raises(CassetteMiss):
+        asyncio.run(fetch(replayer))
+
+
+def counter_handler():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(200, json={"status": f"step-{len(calls)}"})
+    return handler, calls
+
+
+def test_identical_requests_replay_in_order_then_repeat(tmp_path):
+    path = tmp_path / "cassette.jsonl"
+    handler, _ = counter_handler()
+    recorder = CassetteTransport(Cassette(str(path)), mode="record", inner=httpx.MockTransport(handler))
+    status_url = "https://graph.facebook.com/v18.0/container-1?fields=status_code&access_token=USER"
+    for _ in range(3):
+        asyncio.run(fetch(recorder, status_url))
+
+    cassette = Cassette(str(path))
+    assert len(cassette) == 3
+    replayer = CassetteTransport(cassette, mode="replay", time_scale=0)
+    statuses = [asyncio.run(fetch(replayer, status_url)).json()["status"] for _ in range(4)]
+    assert statuses == ["step-1", "step-2", "step-3", "step-3"]
+
+    # A poll for a container that was never recorded gets the endpoint's latest response
+    other = "https://graph.facebook.com/v18.0/container-1?fields=status&access_token=USER"
+    assert asyncio.run(fetch(replayer, other)).json()["status"] == "step-3"
+    assert cassette.replayed == 5
+
+
+def test_form_bodies_are_redacted_and_matched(tmp_path):
+    path = tmp_path / "cassette.jsonl"
+    handler, calls = counter_handler()
+    recorder = CassetteTransport(Cassette(str(path)), mode="record", inner=httpx.MockTransport(handler))
+
+    async def post(transport, token, message):
+        async with httpx.AsyncClient(transport=transport) as client:
+            return await client.post("https://graph.facebook.com/v18.0/page/feed",
+                                     data={"message": message, "access_token": token})
+
+    asyncio.run(post(recorder, "SECRET", "first"))
+    asyncio.run(post(recorder, "SECRET", "second"))
+    assert b"SECRET" in calls[0].content
+    assert "SECRET" not in path.read_text()
+
+    replayer = CassetteTransport(Cassette(str(path)), mode="replay", time_scale=0)
+    assert asyncio.run(post(replayer, "OTHER", "second")).json()["status"] == "step-2"
+    assert asyncio.run(post(replayer, "OTHER", "first")).json()["status"] == "step-1"
+
+
+def test_replay_sleeps_for_the_scaled_latency(tmp_path, monkeypatch):
+    path = tmp_path / "cassette.jsonl"
+    asyncio.run(fetch(CassetteTransport(Cassette(str(path)), mode="record", inner=httpx.MockTransport(gzip_handler))))
+    interaction = json.loads(path.read_text())
+    interaction["elapsed"] = 0.4
+    path.write_text(json.dumps(interaction) + "\n")
+
+    sleeps = []
+
+    async def fake_sleep(seconds):
+        sleeps.append(seconds)
+    monkeypatch.setattr(transport.asyncio, "sleep", fake_sleep)
+    asyncio.run(fetch(CassetteTransport(Cassette(str(path)), mode="replay", time_scale=0.5)))
+    assert sleeps == [0.2]
+
+
+def test_transport_follows_the_environment(tmp_path, monkeypatch):
+    monkeypatch.delenv("HTTP_CASSETTE", raising=False)
+    assert transport.default_transport() is None
+
+    monkeypatch.setenv("HTTP_CASSETTE", str(tmp_path / "shared.jsonl"))
+    monkeypatch.setenv("HTTP_REPLAY_TIME_SCALE", "0")
+    first, second = transport.default_transport(), transport.default_transport()
+    assert first.mode == "replay" and first.time_scale == 0
+    # Clients share one cassette so replay order holds across them
+    assert first.cassette is second.cassette
+
+    monkeypatch.setenv("HTTP_CASSETTE_MODE", "live")
+    with pytest.raises(ValueError):
+        transport.default_transport()
@@ -0,0 +1,48 @@
+import uuid
+from datetime import datetime
+
+from server import Product, new_ids, product_documents, rapidapi_product_row, to_document, validate_products
+
+
+def row(asin, **fields):
+    return {"asin": asin, "title": f"Product {asin}", "product_url": f"https://www.amazon.com/dp/{asin}", **fields}
+
+
+def test_invalid_rows_are_dropped_not_the_batch(caplog):
+    rows = [row("A1"), {"asin": "A2"}, row("A3", rating="great"), row("A4", price="$5")]
+    products = validate_products(rows)
+    assert [product.asin for product in products] == ["A1", "A4"]
+    assert "Dropped 2 invalid products" in caplog.text
+
+
+def test_batch_shares_fetched_at_and_gets_distinct_ids():
+    products = validate_products([row("A1"), row("A2"), row("A3", id="kept")])
+    assert products[0].fetched_at == products[1].fetched_at
+    assert products[0].fetched_at.tzinfo is not None
+    ids = [product.id for product in products]
+    assert ids[2] == "kept" and len(set(ids)) == 3
+    assert uuid.UUID(ids[0]).version == 4
+    assert validate_products([]) == []
+
+
+def test_new_ids_are_unique_uuid4_strings():
+    ids = new_ids(100)
+    assert len(set(ids)) == 100
+    assert all(uuid.UUID(value).version == 4 for value in ids)
+
+
+def test_documents_match_single_model_dumps():
+    products = validate_products([row("A1", price="$1,299.99", price_value=1299.99), row("A2")])
+    docs = product_documents(products)
+    assert docs == [to_document(product) for product in products]
+    assert isinstance(docs[0]["fetched_at"], str)
+    assert datetime.fromisoformat(docs[0]["fetched_at"]) == products[0].fetched_at
+
+
+def test_rapidapi_rows_validate():
+    item = {"asin": "A1", "title": "Kettle", "price": {"raw": "$19.99"}, "image": "https://img/a1.jpg",
+            "url": "https://www.amazon.com/dp/A1", "rating": 4.5, "reviews_count": 12}
+    product = validate_products([rapidapi_product_row(item)])[0]
+    assert isinstance(product, Product)
+    assert (product.price, product.price_value, product.image_url) == ("$19.99", 19.99, "https://img/a1.jpg")
+    assert validate_products([rapidapi_product_row({"asin": "A2"})])[0].price_value is None